@@ -120,9 +120,9 @@ CREATE TABLE identificador (
     FOREIGN KEY (estado) REFERENCES tmstatus(cods) ON UPDATE CASCADE ON DELETE RESTRICT
 );
 
--- Tabla acceso (CON HORA_SALIDA)
+-- Tabla acceso (CON HORA_SALIDA) - Particionada por mes (ver 2.1 y core/db/particiones.py)
 CREATE TABLE acceso (
-    id_acceso SERIAL PRIMARY KEY,
+    id_acceso SERIAL,
     fecha_hora TIMESTAMP NOT NULL DEFAULT NOW(),
     resultado VARCHAR(50) NOT NULL, 
     observaciones TEXT,
@@ -130,9 +130,18 @@ CREATE TABLE acceso (
     id_punto INTEGER NOT NULL,
     id_vigilante INTEGER NOT NULL,
     hora_salida TIMESTAMP DEFAULT NULL, -- Nueva columna
+    PRIMARY KEY (id_acceso, fecha_hora), -- La llave de partición debe estar en la PK
     FOREIGN KEY (id_vehiculo) REFERENCES vehiculo(id_vehiculo) ON UPDATE CASCADE ON DELETE RESTRICT,
     FOREIGN KEY (id_punto) REFERENCES punto_de_control(id_punto) ON UPDATE CASCADE ON DELETE RESTRICT,
     FOREIGN KEY (id_vigilante) REFERENCES vigilante(id_vigilante) ON UPDATE CASCADE ON DELETE RESTRICT
+) PARTITION BY RANGE (fecha_hora);
+CREATE TABLE acceso_pdefault PARTITION OF acceso DEFAULT;
+
+-- Visita abierta por vehículo (a lo sumo una): la mantiene el trigger trg_acceso_abierto
+CREATE TABLE acceso_abierto (
+    id_vehiculo INTEGER PRIMARY KEY,
+    id_acceso INTEGER NOT NULL UNIQUE,
+    fecha_hora TIMESTAMP NOT NULL
 );
 
 -- Tabla tarifa
@@ -153,12 +162,10 @@ CREATE TABLE pago (
     medio VARCHAR(50),
     ref_transaccion VARCHAR(100) UNIQUE,
     estado INTEGER NOT NULL DEFAULT 1,
-    id_acceso_entrada INTEGER,
+    id_acceso_entrada INTEGER, -- Sin FK: acceso está particionado y sus meses viejos se archivan
     id_acceso_salida INTEGER,
     id_tarifa INTEGER NOT NULL,
     id_vigilante INTEGER NOT NULL,
-    FOREIGN KEY (id_acceso_entrada) REFERENCES acceso(id_acceso) ON UPDATE CASCADE ON DELETE RESTRICT,
-    FOREIGN KEY (id_acceso_salida) REFERENCES acceso(id_acceso) ON UPDATE CASCADE ON DELETE RESTRICT,
     FOREIGN KEY (id_tarifa) REFERENCES tarifa(id_tarifa) ON UPDATE CASCADE ON DELETE RESTRICT,
     FOREIGN KEY (id_vigilante) REFERENCES vigilante(id_vigilante) ON UPDATE CASCADE ON DELETE RESTRICT,
     FOREIGN KEY (estado) REFERENCES tmstatus(cods) ON UPDATE CASCADE ON DELETE RESTRICT
@@ -196,15 +203,14 @@ CREATE TABLE alerta (
     tipo VARCHAR(50) NOT NULL,
     detalle TEXT,
     severidad VARCHAR(50),
-    id_acceso INTEGER NOT NULL,
+    id_acceso INTEGER NOT NULL, -- Sin FK: acceso está particionado y sus meses viejos se archivan
     id_vigilante INTEGER NOT NULL, 
-    FOREIGN KEY (id_acceso) REFERENCES acceso(id_acceso) ON UPDATE CASCADE ON DELETE RESTRICT,
     FOREIGN KEY (id_vigilante) REFERENCES tmusuarios(nu) ON UPDATE CASCADE ON DELETE RESTRICT
 );
 
--- Tabla auditoria
+-- Tabla auditoria - Particionada por mes
 CREATE TABLE auditoria (
-    id_auditoria SERIAL PRIMARY KEY,
+    id_auditoria SERIAL,
     fecha_hora TIMESTAMP NOT NULL DEFAULT NOW(),
     entidad VARCHAR(50) NOT NULL,
     id_entidad INTEGER NOT NULL,
@@ -212,8 +218,10 @@ CREATE TABLE auditoria (
     id_usuario INTEGER NOT NULL, 
     datos_previos TEXT,
     datos_nuevos TEXT,
+    PRIMARY KEY (id_auditoria, fecha_hora),
     FOREIGN KEY (id_usuario) REFERENCES tmusuarios(nu) ON UPDATE CASCADE ON DELETE RESTRICT
-);
+) PARTITION BY RANGE (fecha_hora);
+CREATE TABLE auditoria_pdefault PARTITION OF auditoria DEFAULT;
 
 -- Tabla NOVEDAD (FALTABA EN TU SCRIPT)
 CREATE TABLE novedad (
@@ -225,6 +233,200 @@ CREATE TABLE novedad (
     FOREIGN KEY (id_usuario) REFERENCES tmusuarios(nu) ON UPDATE CASCADE ON DELETE RESTRICT
 );
 
+-- Estado de los trabajos de validación asíncrona, compartido entre workers (core/cola_validaciones.py)
+CREATE UNLOGGED TABLE validacion_trabajo (
+    id_trabajo CHAR(32) PRIMARY KEY,
+    estado VARCHAR(20) NOT NULL,
+    prioridad INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    resultado JSONB,
+    status INTEGER,
+    creado TIMESTAMPTZ NOT NULL,
+    terminado TIMESTAMPTZ
+);
+CREATE INDEX ix_validacion_trabajo_vence ON validacion_trabajo ((COALESCE(terminado, creado)));
+
+-- 2.1 FUNCIONES (Ver migraciones/ para aplicarlas sobre una BD existente)
+-- Este script ya incluye todas las migraciones: tras instalar, python migraciones/migrar.py --base
+-- ====================================================================
+
+-- Particiones mensuales de acceso y auditoria
+-- Crea <tabla>_pAAAA_MM para el mes de p_mes. Si la partición por defecto ya recibió filas
+-- de ese mes (no se creó a tiempo), las mueve antes de adjuntarla. Retorna TRUE si la creó.
+CREATE OR REPLACE FUNCTION crear_particion_mensual(p_tabla TEXT, p_mes DATE)
+RETURNS BOOLEAN
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_inicio DATE := date_trunc('month', p_mes)::DATE;
+    v_fin DATE := (date_trunc('month', p_mes) + INTERVAL '1 month')::DATE;
+    v_nombre TEXT := p_tabla || '_p' || to_char(p_mes, 'YYYY_MM');
+    v_defecto TEXT := p_tabla || '_pdefault';
+BEGIN
+    IF to_regclass(v_nombre) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_nombre, p_tabla);
+    IF to_regclass(v_defecto) IS NOT NULL THEN
+        EXECUTE format('WITH movidas AS (DELETE FROM %I WHERE fecha_hora >= %L AND fecha_hora < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM movidas', v_defecto, v_inicio, v_fin, v_nombre);
+    END IF;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', p_tabla, v_nombre, v_inicio, v_fin);
+    -- Las visitas abiertas movidas desde la partición por defecto vuelven a acceso_abierto
+    IF p_tabla = 'acceso' THEN
+        EXECUTE format('INSERT INTO acceso_abierto (id_vehiculo, id_acceso, fecha_hora) '
+                       'SELECT id_vehiculo, id_acceso, fecha_hora FROM %I '
+                       'WHERE hora_salida IS NULL AND id_vehiculo IS NOT NULL ON CONFLICT DO NOTHING', v_nombre);
+    END IF;
+    RETURN TRUE;
+END;
+$$;
+
+-- Visita abierta única por vehículo
+-- Una segunda entrada abierta del mismo vehículo choca con la PK (unique_violation)
+CREATE OR REPLACE FUNCTION sincronizar_acceso_abierto()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        IF OLD.hora_salida IS NULL THEN
+            DELETE FROM acceso_abierto WHERE id_acceso = OLD.id_acceso;
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        IF NEW.hora_salida IS NULL AND NEW.id_vehiculo IS NOT NULL THEN
+            INSERT INTO acceso_abierto (id_vehiculo, id_acceso, fecha_hora)
+            VALUES (NEW.id_vehiculo, NEW.id_acceso, NEW.fecha_hora);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_acceso_abierto
+AFTER INSERT OR DELETE OR UPDATE OF hora_salida, id_vehiculo, fecha_hora ON acceso
+FOR EACH ROW EXECUTE FUNCTION sincronizar_acceso_abierto();
+
+-- Particiones del mes actual y los 3 siguientes (después: core/db/particiones.py, a diario)
+SELECT crear_particion_mensual(t.tabla, m::DATE)
+FROM (VALUES ('acceso'), ('auditoria')) AS t(tabla),
+     generate_series(date_trunc('month', NOW()), date_trunc('month', NOW()) + INTERVAL '3 months', INTERVAL '1 month') AS m;
+
+-- Transacción de garita en un solo viaje: vehículo, visita abierta, invitado, entrada/salida y auditoría
+CREATE OR REPLACE FUNCTION registrar_paso_garita(
+    p_placa VARCHAR,
+    p_tipo VARCHAR,               -- 'entrada' | 'salida'
+    p_id_vigilante INTEGER,
+    p_id_punto INTEGER,           -- Punto de control de la entrada
+    p_id_usuario INTEGER,         -- Usuario auditado (NULL = sin auditoría)
+    p_permitir_invitado BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (resultado VARCHAR, detalle VARCHAR, id_acceso INTEGER, invitado BOOLEAN)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_id_vehiculo INTEGER;
+    v_id_acceso INTEGER;
+    v_fecha_entrada TIMESTAMP;
+    v_invitado BOOLEAN := FALSE;
+    v_datos TEXT := json_build_object('placa', p_placa)::TEXT;
+BEGIN
+    -- 1. Vehículo (bloqueado: otra garita con la misma placa espera a que terminemos)
+    SELECT v.id_vehiculo INTO v_id_vehiculo
+    FROM vehiculo v WHERE v.placa = p_placa
+    FOR UPDATE;
+
+    IF v_id_vehiculo IS NULL THEN
+        IF p_tipo = 'salida' THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'No tiene entrada'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        -- Sin registro: solo pasa como invitado si hay un evento activo
+        IF NOT p_permitir_invitado
+           OR NOT EXISTS (SELECT 1 FROM evento e WHERE NOW() BETWEEN e.fecha_inicio AND e.fecha_fin) THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'Vehículo no registrado'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        -- ID 9999 es el usuario 'INVITADO EVENTO'. ON CONFLICT: otra garita lo acaba de crear
+        INSERT INTO vehiculo (placa, tipo, color, id_persona)
+        VALUES (p_placa, 'Invitado', 'Sin especificar', 9999)
+        ON CONFLICT (placa) DO UPDATE SET placa = EXCLUDED.placa
+        RETURNING vehiculo.id_vehiculo INTO v_id_vehiculo;
+        v_invitado := TRUE;
+    END IF;
+
+    -- 2. Salida: cierra la visita abierta (acceso_abierto tiene a lo sumo una por vehículo)
+    IF p_tipo = 'salida' THEN
+        SELECT ab.id_acceso, ab.fecha_hora INTO v_id_acceso, v_fecha_entrada
+        FROM acceso_abierto ab
+        WHERE ab.id_vehiculo = v_id_vehiculo
+        FOR UPDATE;
+        IF v_id_acceso IS NULL THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'No tiene entrada'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        UPDATE acceso
+        SET hora_salida = CURRENT_TIMESTAMP, resultado = 'Salida Exitosa'
+        WHERE acceso.id_acceso = v_id_acceso AND acceso.fecha_hora = v_fecha_entrada;   -- fecha_hora: un solo mes
+        IF p_id_usuario IS NOT NULL THEN
+            INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+            VALUES (p_id_usuario, 'ACCESO', v_id_acceso, 'SALIDA', NULL, v_datos, CURRENT_TIMESTAMP);
+        END IF;
+        RETURN QUERY SELECT 'Autorizado'::VARCHAR, 'Salida Exitosa'::VARCHAR, v_id_acceso, FALSE;
+        RETURN;
+    END IF;
+
+    -- 3. Entrada: inserción directa, sin consulta previa. Si ya hay visita abierta, el
+    --    trigger trg_acceso_abierto choca con la PK de acceso_abierto (= ya está dentro)
+    BEGIN
+        INSERT INTO acceso (id_vehiculo, id_punto, id_vigilante, fecha_hora, resultado, hora_salida)
+        VALUES (v_id_vehiculo, p_id_punto, p_id_vigilante, CURRENT_TIMESTAMP, 'Acceso Concedido - Entrada', NULL)
+        RETURNING acceso.id_acceso INTO v_id_acceso;
+    EXCEPTION WHEN unique_violation THEN
+        SELECT ab.id_acceso INTO v_id_acceso FROM acceso_abierto ab WHERE ab.id_vehiculo = v_id_vehiculo;
+        RETURN QUERY SELECT 'Denegado'::VARCHAR, 'Ya está dentro'::VARCHAR, v_id_acceso, FALSE;
+        RETURN;
+    END;
+    IF p_id_usuario IS NOT NULL THEN
+        INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+        VALUES (p_id_usuario, 'ACCESO', v_id_acceso, CASE WHEN v_invitado THEN 'INVITADO' ELSE 'ENTRADA' END,
+                NULL, v_datos, CURRENT_TIMESTAMP);
+    END IF;
+    RETURN QUERY SELECT 'Autorizado'::VARCHAR,
+                        (CASE WHEN v_invitado THEN 'INVITADO EVENTO' ELSE 'Entrada Registrada' END)::VARCHAR,
+                        v_id_acceso, v_invitado;
+END;
+$$;
+
+-- 2.2 ÍNDICES (Ver migraciones/002_indices.sql para crearlos sin bloquear una BD existente)
+-- ====================================================================
+
+-- Acceso: visitas abiertas (índice parcial), historial por fecha y por vehículo, FKs
+-- (en una tabla particionada se crean en cada partición, también en las futuras)
+CREATE INDEX ix_acceso_abierto ON acceso (id_vehiculo) WHERE hora_salida IS NULL;
+CREATE INDEX ix_acceso_fecha ON acceso (fecha_hora DESC, id_acceso DESC);
+CREATE INDEX ix_acceso_vehiculo_fecha ON acceso (id_vehiculo, fecha_hora DESC);
+CREATE INDEX ix_acceso_vigilante ON acceso (id_vigilante);
+CREATE INDEX ix_acceso_punto ON acceso (id_punto);
+
+-- Auditoría y novedades: reportes por rango de fechas
+CREATE INDEX ix_auditoria_entidad_accion_fecha ON auditoria (entidad, accion, fecha_hora DESC);
+CREATE INDEX ix_auditoria_fecha ON auditoria (fecha_hora DESC, id_auditoria DESC);
+CREATE INDEX ix_auditoria_usuario ON auditoria (id_usuario);
+CREATE INDEX ix_novedad_fecha ON novedad (fecha_hora DESC, id_novedad DESC);
+CREATE INDEX ix_novedad_usuario ON novedad (id_usuario);
+
+-- Evento activo y resto de FKs
+CREATE INDEX ix_evento_rango ON evento (fecha_inicio, fecha_fin);
+CREATE INDEX ix_vehiculo_persona ON vehiculo (id_persona);
+CREATE INDEX ix_alerta_acceso ON alerta (id_acceso);
+CREATE INDEX ix_alerta_vigilante ON alerta (id_vigilante);
+CREATE INDEX ix_pago_acceso_entrada ON pago (id_acceso_entrada);
+CREATE INDEX ix_pago_acceso_salida ON pago (id_acceso_salida);
+CREATE INDEX ix_pase_temporal_persona ON pase_temporal (id_persona);
+CREATE INDEX ix_pase_temporal_vehiculo ON pase_temporal (id_vehiculo);
+CREATE INDEX ix_identificador_vehiculo ON identificador (id_vehiculo);
+CREATE INDEX ix_turno_vigilante ON turno (id_vigilante);
+
 -- 3. INSERCIÓN DE DATOS (DATA SEEDING)
 -- ====================================================================
 
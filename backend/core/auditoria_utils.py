@@ -1,33 +1,297 @@
 # backend/core/auditoria_utils.py
+# Sumidero único de auditoría: los eventos se encolan en memoria y un hilo los escribe
+# en lotes multi-fila (por tamaño o por tiempo). Si la BD no responde, el lote va a un
+# archivo de respaldo JSONL (uno por proceso) que se reinserta cuando la BD vuelve.
+# La petición no espera.
+import os
+import re
+import glob
 import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
 from core.db.connection import get_connection
 
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# Filas por INSERT multi-fila
+AUDITORIA_LOTE = int(os.getenv("AUDITORIA_LOTE", "100"))
+# Segundos máximos que un evento espera en memoria antes de escribirse
+AUDITORIA_INTERVALO = float(os.getenv("AUDITORIA_INTERVALO", "1.0"))
+# Eventos en memoria; por encima se escriben directo al respaldo (no se pierden)
+AUDITORIA_COLA_MAX = int(os.getenv("AUDITORIA_COLA_MAX", "10000"))
+# Archivo de respaldo cuando la BD está caída (base del nombre: cada proceso escribe
+# en <nombre>.<pid>.jsonl para que varios workers de gunicorn no se pisen)
+AUDITORIA_RESPALDO = os.getenv("AUDITORIA_RESPALDO", os.path.join(os.path.dirname(__file__), "..", "auditoria_pendiente.jsonl"))
+# Segundos entre intentos de reinsertar el respaldo
+AUDITORIA_REINTENTO = float(os.getenv("AUDITORIA_REINTENTO", "30"))
+
+SQL_INSERTAR = """
+    INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+    VALUES %s
+"""
+# fecha_hora viaja con zona (momento del evento, no de la escritura); la sesión la pasa a hora de Colombia
+PLANTILLA = "(%s, %s, %s, %s, %s, %s, %s::timestamptz)"
+
+# ==============================================================================
+# 2. ESCRITOR EN SEGUNDO PLANO
+# ==============================================================================
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+class EscritorAuditoria:
+    def __init__(self, respaldo=AUDITORIA_RESPALDO):
+        base = os.path.abspath(respaldo)
+        self._prefijo = base[:-len(".jsonl")] if base.endswith(".jsonl") else base
+        self._cola = queue.Queue(maxsize=AUDITORIA_COLA_MAX)
+        self._hilo = None
+        self._hilo_pid = None
+        self._hilo_lock = threading.Lock()
+        self._archivo_lock = threading.Lock()
+        self._ultimo_reintento = 0.0
+        self.contadores = {"encolados": 0, "escritos": 0, "lotes": 0, "al_respaldo": 0,
+                           "reinsertados": 0, "rechazados": 0, "lineas_invalidas": 0, "errores_hilo": 0}
+
+    @property
+    def respaldo(self):
+        """Respaldo de ESTE proceso (el pid se lee en cada uso: tras un fork cambia)."""
+        return f"{self._prefijo}.{os.getpid()}.jsonl"
+
+    def encolar(self, id_usuario, entidad, id_entidad, accion, datos_previos=None, datos_nuevos=None):
+        """Registra el evento sin tocar la BD (los datos se serializan ya: pueden cambiar después)."""
+        fila = (
+            id_usuario, entidad, id_entidad, accion,
+            json.dumps(datos_previos, default=str) if datos_previos else None,
+            json.dumps(datos_nuevos, default=str) if datos_nuevos else None,
+            datetime.now(timezone.utc).isoformat(),
+        )
+        self._iniciar_hilo()
+        self.contadores["encolados"] += 1
+        try:
+            self._cola.put_nowait(fila)
+        except queue.Full:
+            self._a_respaldo([fila])
+
+    # --- Hilo ---
+    def _iniciar_hilo(self):
+        with self._hilo_lock:
+            # Tras un fork el hilo no existe en el hijo: se arranca uno nuevo
+            if self._hilo is None or self._hilo_pid != os.getpid():
+                self._hilo = threading.Thread(target=self._bucle, name="auditoria", daemon=True)
+                self._hilo_pid = os.getpid()
+                self._hilo.start()
+
+    def _bucle(self):
+        # Ningún error puede matar el hilo: sin él, la auditoría solo iría al respaldo
+        while True:
+            try:
+                lote = self._tomar_lote()
+                if lote:
+                    self._escribir(lote)
+                self._reinsertar_respaldo()
+            except Exception as e:
+                self.contadores["errores_hilo"] += 1
+                print(f"❌ Error en el escritor de auditoría (continúa): {e}")
+                time.sleep(1)
+
+    def _tomar_lote(self):
+        """Bloquea hasta el primer evento y junta más hasta AUDITORIA_LOTE o AUDITORIA_INTERVALO."""
+        try:
+            lote = [self._cola.get(timeout=AUDITORIA_REINTENTO)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + AUDITORIA_INTERVALO
+        while len(lote) < AUDITORIA_LOTE:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def vaciar(self):
+        """Escribe todo lo pendiente en memoria (al apagar el proceso)."""
+        lote = []
+        while True:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(lote), AUDITORIA_LOTE):
+            self._escribir(lote[i:i + AUDITORIA_LOTE])
+
+    # --- Escritura ---
+    def _insertar(self, filas):
+        """INSERT multi-fila. Retorna True, False (BD caída) o lanza el error de datos."""
+        conn = get_connection()
+        if conn is None:
+            return False
+        try:
+            cur = conn.cursor()
+            execute_values(cur, SQL_INSERTAR, filas, template=PLANTILLA, page_size=AUDITORIA_LOTE)
+            conn.commit()
+            cur.close()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            print(f"❌ BD no disponible para auditoría: {e}")
+            return False
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _escribir(self, filas):
+        try:
+            if self._insertar(filas):
+                self.contadores["escritos"] += len(filas)
+                self.contadores["lotes"] += 1
+            else:
+                self._a_respaldo(filas)
+        except Exception as e:
+            print(f"⚠️ Lote de auditoría rechazado ({e}), reintentando fila por fila")
+            self._fila_por_fila(filas)
+
+    def _fila_por_fila(self, filas):
+        """Un evento inválido (ej. usuario inexistente) no debe tumbar a los demás del lote."""
+        for fila in filas:
+            try:
+                if self._insertar([fila]):
+                    self.contadores["escritos"] += 1
+                else:
+                    self._a_respaldo([fila])
+            except Exception as e:
+                self.contadores["rechazados"] += 1
+                print(f"❌ Auditoría descartada {fila[3]} en {fila[1]} ({fila[2]}): {e}")
+
+    # --- Respaldo durable ---
+    def _a_respaldo(self, filas, contar=True):
+        try:
+            with self._archivo_lock, open(self.respaldo, "a", encoding="utf-8") as f:
+                for fila in filas:
+                    f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if contar:
+                self.contadores["al_respaldo"] += len(filas)
+            print(f"💾 {len(filas)} evento(s) de auditoría guardados en respaldo")
+        except OSError as e:
+            print(f"❌ No se pudo escribir el respaldo de auditoría: {e}")
+
+    def _respaldos_huerfanos(self):
+        """
+        Respaldos a reinsertar: el de este proceso y los de procesos que ya no existen
+        (incluye el archivo sin pid de versiones anteriores). Los de otro worker vivo no
+        se tocan: ese worker sigue escribiendo en ellos y los reinserta él mismo.
+        """
+        propio_procesando = self.respaldo + ".procesando"
+        rutas = []
+        for ruta in sorted(glob.glob(glob.escape(self._prefijo) + "*.jsonl*")):
+            if ruta == propio_procesando:
+                continue
+            m = re.fullmatch(re.escape(self._prefijo) + r"(?:\.(\d+))?\.jsonl(?:\.procesando)?", ruta)
+            if not m:
+                continue
+            pid = int(m.group(1)) if m.group(1) else None
+            if pid == os.getpid() or pid is None or not _proceso_vivo(pid):
+                rutas.append(ruta)
+        return rutas
+
+    def _reinsertar_respaldo(self):
+        """
+        Reinserta los respaldos cuando la BD responde. Cada archivo se "reclama" con un
+        rename atómico a <propio>.procesando: si dos workers van por el mismo huérfano,
+        solo uno gana (el otro recibe FileNotFoundError). Si el proceso muere a mitad, su
+        '.procesando' queda huérfano y lo retoma otro proceso (entrega al menos una vez).
+        """
+        if time.monotonic() - self._ultimo_reintento < AUDITORIA_REINTENTO:
+            return
+        self._ultimo_reintento = time.monotonic()
+        procesando = self.respaldo + ".procesando"
+        while True:
+            if not os.path.exists(procesando):
+                candidatos = self._respaldos_huerfanos()
+                if not candidatos:
+                    return
+                try:
+                    with self._archivo_lock:
+                        os.rename(candidatos[0], procesando)
+                except FileNotFoundError:
+                    continue   # Otro proceso lo reclamó primero
+            if not self._reinsertar_archivo(procesando):
+                return         # La BD sigue caída: se reintenta en AUDITORIA_REINTENTO
+
+    def _leer_respaldo(self, ruta):
+        """Filas del archivo; una línea dañada (escritura cortada) se salta, no aborta el resto."""
+        filas = []
+        with open(ruta, encoding="utf-8") as f:
+            for n, linea in enumerate(f, 1):
+                if not linea.strip():
+                    continue
+                try:
+                    fila = tuple(json.loads(linea))
+                    if len(fila) != 7:
+                        raise ValueError(f"{len(fila)} columnas")
+                    filas.append(fila)
+                except ValueError as e:
+                    self.contadores["lineas_invalidas"] += 1
+                    print(f"⚠️ Línea {n} inválida en {os.path.basename(ruta)}, se omite: {e}")
+        return filas
+
+    def _reinsertar_archivo(self, ruta):
+        """Retorna False si la BD no respondió (lo que falta vuelve al respaldo propio)."""
+        filas = self._leer_respaldo(ruta)
+        reinsertados = 0
+        completo = True
+        for i in range(0, len(filas), AUDITORIA_LOTE):
+            lote = filas[i:i + AUDITORIA_LOTE]
+            try:
+                escrito = self._insertar(lote)
+            except Exception:
+                self._fila_por_fila(lote)
+                escrito = True
+            if not escrito:
+                self._a_respaldo(filas[i:], contar=False)
+                completo = False
+                break
+            reinsertados += len(lote)
+        os.remove(ruta)
+        self.contadores["reinsertados"] += reinsertados
+        if reinsertados:
+            print(f"♻️ {reinsertados} evento(s) de auditoría reinsertados desde el respaldo")
+        return completo
+
+    def metricas(self):
+        return {"en_cola": self._cola.qsize(), "lote": AUDITORIA_LOTE, "intervalo_s": AUDITORIA_INTERVALO,
+                "respaldo_pendiente": bool(glob.glob(glob.escape(self._prefijo) + "*.jsonl*")),
+                **self.contadores}
+
+# Instancia compartida por el proceso web
+escritor_auditoria = EscritorAuditoria()
+atexit.register(escritor_auditoria.vaciar)
+
+# ==============================================================================
+# 3. API PÚBLICA
+# ==============================================================================
 def registrar_auditoria_global(id_usuario, entidad, id_entidad, accion, datos_previos=None, datos_nuevos=None):
     """
-    Registra la auditoría usando la hora de la base de datos (que ya está configurada en Colombia).
+    Registra la auditoría de forma asíncrona (ver EscritorAuditoria). La hora es la del
+    evento; la sesión de la BD (hora de Colombia) la convierte al guardarla.
     """
     if not id_usuario:
         return
-
-    conn = None
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
-        
-        # Usamos CURRENT_TIMESTAMP. Al tener la conexión con 'SET TIME ZONE', guardará la hora correcta.
-        query = """
-            INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
-            VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-        """
-        
-        val_ant = json.dumps(datos_previos, default=str) if datos_previos else None
-        val_nue = json.dumps(datos_nuevos, default=str) if datos_nuevos else None
-        
-        cur.execute(query, (id_usuario, entidad, id_entidad, accion, val_ant, val_nue))
-        conn.commit()
-
-    except Exception as e:
-        print(f"❌ Error guardando auditoría: {e}")
-        if conn: conn.rollback()
-    finally:
-        if conn: conn.close()
\ No newline at end of file
+    escritor_auditoria.encolar(id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos)
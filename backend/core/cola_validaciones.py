@@ -0,0 +1,293 @@
+# backend/core/cola_validaciones.py
+# Trabajos asíncronos de validación: cola con prioridad y profundidad acotada,
+# atendida por hilos despachadores. El resultado se consulta por sondeo o por SSE.
+# El trabajo corre en el proceso que recibió el POST; un hilo escritor copia su estado a la
+# tabla validacion_trabajo (migraciones/006) para que con varios workers de gunicorn la
+# consulta o el SSE funcionen aunque caigan en otro proceso. El POST no espera a la BD.
+import os
+import json
+import time
+import uuid
+import queue
+import itertools
+import threading
+
+import psycopg2.errors
+from psycopg2.extras import execute_values
+
+from core.db.connection import get_connection
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# Trabajos en espera permitidos; por encima el endpoint responde 429
+VALIDACION_COLA_MAX = int(os.getenv("VALIDACION_COLA_MAX", "32"))
+# Hilos que sacan trabajos de la cola (el OCR pesado corre en el pool de procesos)
+VALIDACION_HILOS = max(1, int(os.getenv("VALIDACION_HILOS", os.getenv("OCR_WORKERS", "2"))))
+# Segundos que se conserva un trabajo terminado para ser consultado
+VALIDACION_TTL = float(os.getenv("VALIDACION_TTL", "300"))
+# Segundos entre lecturas de la BD al seguir (SSE) un trabajo de otro proceso
+VALIDACION_SONDEO = float(os.getenv("VALIDACION_SONDEO", "0.5"))
+# Segundos entre purgas de validacion_trabajo (las lecturas ya ignoran los vencidos)
+VALIDACION_PURGA = float(os.getenv("VALIDACION_PURGA", "60"))
+# Prioridad por punto de control, ej: "2:0,1:1" (menor = antes). Sin entrada: salida 0, entrada 1
+PRIORIDAD_PUNTOS = {
+    p.split(":")[0].strip(): int(p.split(":")[1])
+    for p in os.getenv("VALIDACION_PRIORIDAD_PUNTOS", "").split(",") if ":" in p
+}
+
+ESTADOS_FINALES = ("terminado", "error")
+
+_cola = queue.PriorityQueue()
+_secuencia = itertools.count()        # Desempate FIFO dentro de la misma prioridad
+_trabajos = {}                        # id -> dict del trabajo
+_cambios = threading.Condition()      # Notifica a los streams SSE cada cambio de estado
+_hilos = []
+_hilos_lock = threading.Lock()
+_contadores = {"encolados": 0, "rechazados": 0, "terminados": 0, "errores": 0}
+_compartido = {"activo": True}        # Se apaga si la BD no tiene la tabla (falta migraciones/006)
+_pendientes_bd = queue.Queue()        # Copias de estado que el hilo escritor lleva a la BD
+_escritor = []
+
+# ==============================================================================
+# 2. PRIORIDAD
+# ==============================================================================
+def prioridad_para(tipo_acceso, id_punto=None):
+    """El carril de salida va primero: un carro esperando salir bloquea la vía."""
+    if id_punto is not None and str(id_punto) in PRIORIDAD_PUNTOS:
+        return PRIORIDAD_PUNTOS[str(id_punto)]
+    return 0 if tipo_acceso == 'salida' else 1
+
+# ==============================================================================
+# 3. ENCOLADO Y CONSULTA
+# ==============================================================================
+def encolar_validacion(funcion, args, prioridad):
+    """
+    Registra un trabajo que ejecutará funcion(*args) -> (respuesta, status_http).
+    Retorna la vista pública del trabajo, o None si la cola está llena.
+    """
+    _iniciar_hilos()
+    with _cambios:
+        _purgar_vencidos()
+        en_espera = sum(1 for t in _trabajos.values() if t["estado"] == "en_cola")
+        if en_espera >= VALIDACION_COLA_MAX:
+            _contadores["rechazados"] += 1
+            return None
+        id_trabajo = uuid.uuid4().hex
+        trabajo = {
+            "id": id_trabajo, "estado": "en_cola", "prioridad": prioridad,
+            "secuencia": next(_secuencia), "version": 0,
+            "creado": time.time(), "iniciado": None, "terminado": None,
+            "resultado": None, "status": None,
+        }
+        _trabajos[id_trabajo] = trabajo
+        _contadores["encolados"] += 1
+        _cola.put((prioridad, trabajo["secuencia"], id_trabajo, funcion, args))
+        vista, copia = _vista(trabajo), dict(trabajo)
+    _guardar_compartido(copia)
+    return vista
+
+def obtener_trabajo(id_trabajo):
+    """
+    Vista pública del trabajo (con posición en la cola si sigue esperando en este
+    proceso) o None. Si lo encoló otro proceso se lee de la BD (sin 'posicion').
+    """
+    with _cambios:
+        trabajo = _trabajos.get(id_trabajo)
+        if trabajo:
+            return _vista(trabajo)
+    return _leer_compartido(id_trabajo)
+
+def esperar_cambio(id_trabajo, version, timeout=15):
+    """
+    Bloquea hasta que el trabajo pase de 'version' o venza 'timeout'.
+    Retorna la vista actual (igual versión = sin cambios) o None si no existe.
+    """
+    limite = time.monotonic() + timeout
+    with _cambios:
+        while id_trabajo in _trabajos:
+            trabajo = _trabajos[id_trabajo]
+            if trabajo["version"] != version:
+                return _vista(trabajo)
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return _vista(trabajo)
+            _cambios.wait(restante)
+    # Trabajo de otro proceso: sondeo a la BD
+    while True:
+        vista = _leer_compartido(id_trabajo)
+        if vista is None or vista["version"] != version:
+            return vista
+        if time.monotonic() + VALIDACION_SONDEO > limite:
+            return vista
+        time.sleep(VALIDACION_SONDEO)
+
+def _vista(trabajo):
+    vista = {k: trabajo[k] for k in ("id", "estado", "prioridad", "version", "resultado", "status")}
+    if trabajo["estado"] == "en_cola":
+        clave = (trabajo["prioridad"], trabajo["secuencia"])
+        vista["posicion"] = 1 + sum(1 for t in _trabajos.values()
+                                    if t["estado"] == "en_cola" and (t["prioridad"], t["secuencia"]) < clave)
+    if trabajo["terminado"]:
+        vista["duracion_ms"] = round((trabajo["terminado"] - trabajo["creado"]) * 1000, 1)
+    return vista
+
+def _actualizar(id_trabajo, **cambios):
+    with _cambios:
+        trabajo = _trabajos.get(id_trabajo)
+        if trabajo is None: return
+        trabajo.update(cambios)
+        trabajo["version"] += 1
+        _cambios.notify_all()
+        copia = dict(trabajo)
+    _guardar_compartido(copia)
+
+def _purgar_vencidos():
+    """Elimina trabajos terminados hace más de VALIDACION_TTL (se llama con el lock tomado)."""
+    limite = time.time() - VALIDACION_TTL
+    for id_trabajo in [k for k, t in _trabajos.items() if t["terminado"] and t["terminado"] < limite]:
+        del _trabajos[id_trabajo]
+
+# ==============================================================================
+# 4. ESTADO COMPARTIDO ENTRE PROCESOS (tabla validacion_trabajo)
+# ==============================================================================
+def _guardar_compartido(trabajo):
+    """Encola la copia del estado para el hilo escritor (sin E/S en el hilo que llama)."""
+    if not _compartido["activo"]:
+        return
+    _iniciar_escritor()
+    _pendientes_bd.put(trabajo)
+
+def _iniciar_escritor():
+    with _hilos_lock:
+        if _escritor: return
+        hilo = threading.Thread(target=_escribir_compartido, name="validacion-bd", daemon=True)
+        hilo.start()
+        _escritor.append(hilo)
+
+def _escribir_compartido():
+    """
+    Hilo escritor: junta lo pendiente, deja la última versión de cada trabajo y la
+    escribe en un solo upsert. Cada VALIDACION_PURGA segundos borra los vencidos.
+    Un error se registra y el hilo sigue (el trabajo sigue visible en este proceso).
+    """
+    ultima_purga = 0.0
+    while _compartido["activo"]:
+        try:
+            lote = [_pendientes_bd.get()]
+            while True:
+                try:
+                    lote.append(_pendientes_bd.get_nowait())
+                except queue.Empty:
+                    break
+            ultimos = {}
+            for trabajo in lote:
+                if trabajo["id"] not in ultimos or ultimos[trabajo["id"]]["version"] < trabajo["version"]:
+                    ultimos[trabajo["id"]] = trabajo
+            purgar = time.monotonic() - ultima_purga >= VALIDACION_PURGA
+            if _upsert_compartido(list(ultimos.values()), purgar) and purgar:
+                ultima_purga = time.monotonic()
+        except Exception as e:
+            print(f"❌ Error en el escritor de trabajos de validación (continúa): {e}")
+            time.sleep(1)
+
+def _upsert_compartido(trabajos, purgar):
+    """Retorna True si se escribió. El upsert ignora versiones viejas (orden de llegada irrelevante)."""
+    conn = get_connection()
+    if conn is None:
+        return False
+    try:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO validacion_trabajo (id_trabajo, estado, prioridad, version, resultado, status, creado, terminado)
+            VALUES %s
+            ON CONFLICT (id_trabajo) DO UPDATE
+            SET estado = EXCLUDED.estado, version = EXCLUDED.version, resultado = EXCLUDED.resultado,
+                status = EXCLUDED.status, terminado = EXCLUDED.terminado
+            WHERE validacion_trabajo.version < EXCLUDED.version
+        """, [(t["id"], t["estado"], t["prioridad"], t["version"],
+               json.dumps(t["resultado"], ensure_ascii=False, default=str) if t["resultado"] is not None else None,
+               t["status"], t["creado"], t["terminado"]) for t in trabajos],
+           template="(%s, %s, %s, %s, %s::jsonb, %s, to_timestamp(%s), to_timestamp(%s))")
+        if purgar:
+            # Usa ix_validacion_trabajo_vence (expresión idéntica)
+            cur.execute("DELETE FROM validacion_trabajo WHERE COALESCE(terminado, creado) < NOW() - make_interval(secs => %s)",
+                        (VALIDACION_TTL,))
+        conn.commit()
+        cur.close()
+        return True
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        _compartido["activo"] = False
+        print("⚠️ Falta la tabla validacion_trabajo (migraciones/006): los trabajos solo se consultan en el proceso que los encoló")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error guardando {len(trabajos)} trabajo(s) de validación en la BD: {e}")
+    finally:
+        conn.close()
+    return False
+
+def _leer_compartido(id_trabajo):
+    """Vista de un trabajo encolado por otro proceso, o None."""
+    if not _compartido["activo"] or len(id_trabajo) != 32:
+        return None
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT estado, prioridad, version, resultado, status, EXTRACT(EPOCH FROM terminado - creado)
+            FROM validacion_trabajo
+            WHERE id_trabajo = %s AND COALESCE(terminado, creado) >= NOW() - make_interval(secs => %s)
+        """, (id_trabajo, VALIDACION_TTL))
+        fila = cur.fetchone()
+        cur.close()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error leyendo el trabajo {id_trabajo} de la BD: {e}")
+        return None
+    finally:
+        conn.close()
+    if fila is None:
+        return None
+    estado, prioridad, version, resultado, status, duracion = fila
+    vista = {"id": id_trabajo, "estado": estado, "prioridad": prioridad, "version": version,
+             "resultado": resultado, "status": status}
+    if duracion is not None:
+        vista["duracion_ms"] = round(float(duracion) * 1000, 1)
+    return vista
+
+# ==============================================================================
+# 5. HILOS DESPACHADORES
+# ==============================================================================
+def _despachar():
+    while True:
+        _prioridad, _seq, id_trabajo, funcion, args = _cola.get()
+        _actualizar(id_trabajo, estado="procesando", iniciado=time.time())
+        try:
+            respuesta, status = funcion(*args)
+            _actualizar(id_trabajo, estado="terminado", resultado=respuesta, status=status, terminado=time.time())
+            _contadores["terminados"] += 1
+        except Exception as e:
+            print(f"❌ Error en trabajo de validación {id_trabajo}: {e}")
+            _actualizar(id_trabajo, estado="error", resultado={"error": str(e)}, status=500, terminado=time.time())
+            _contadores["errores"] += 1
+        finally:
+            _cola.task_done()
+
+def _iniciar_hilos():
+    with _hilos_lock:
+        if _hilos: return
+        for i in range(VALIDACION_HILOS):
+            hilo = threading.Thread(target=_despachar, name=f"validacion-{i}", daemon=True)
+            hilo.start()
+            _hilos.append(hilo)
+
+def metricas_cola():
+    with _cambios:
+        por_estado = {}
+        for t in _trabajos.values():
+            por_estado[t["estado"]] = por_estado.get(t["estado"], 0) + 1
+        return {"max_en_cola": VALIDACION_COLA_MAX, "hilos": VALIDACION_HILOS,
+                "por_estado": por_estado, "compartido": _compartido["activo"], **_contadores}
@@ -4,13 +4,24 @@ from core.db.connection import get_connection
 from models.acceso import (
     verificar_vehiculo_dentro, 
     registrar_salida_db, 
-    registrar_entrada_db
+    registrar_entrada_db,
+    registrar_paso_garita
 )
-from ocr.detector import detectar_placa 
+from ocr.servicio import analizar_imagen, analizar_rafaga
 from core.auditoria_utils import registrar_auditoria_global
+from core.cola_validaciones import encolar_validacion, obtener_trabajo, prioridad_para
+from core.indice_placas import resolver_placa, indice_placas
+from core.paginacion import tamano_pagina, clausula_keyset, clausula_limite, cortar_pagina
+from ocr.calidad import mensaje_motivo
 
-def obtener_historial_accesos(filtros=None):
+def obtener_historial_accesos(filtros=None, llave=None, limite=None):
+    """
+    Una página del historial (ver core/paginacion.py), o todo si 'limite' es None.
+    'llave' viene del cursor de la página anterior. Retorna (historial, cursor_siguiente o None).
+    """
     if filtros is None: filtros = {}
+    limite = tamano_pagina(limite)
+    conn = None
     try:
         conn = get_connection()
         cur = conn.cursor()
@@ -18,30 +29,38 @@ def obtener_historial_accesos(filtros=None):
             SELECT 
                 a.id_acceso, v.placa, TO_CHAR(a.fecha_hora, 'HH24:MI:SS') as entrada,
                 TO_CHAR(a.hora_salida, 'HH24:MI:SS') as salida, TO_CHAR(a.fecha_hora, 'YYYY-MM-DD') as fecha,
-                a.resultado, v.tipo 
+                a.resultado, v.tipo, a.fecha_hora
             FROM acceso a JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo WHERE 1=1
         """
         params = []
         if filtros.get('placa'): sql += " AND v.placa ILIKE %s"; params.append(f"%{filtros['placa']}%")
         if filtros.get('tipo'): sql += " AND v.tipo = %s"; params.append(filtros['tipo'])
-        if filtros.get('desde'): sql += " AND DATE(a.fecha_hora) >= %s"; params.append(filtros['desde'])
-        if filtros.get('hasta'): sql += " AND DATE(a.fecha_hora) <= %s"; params.append(filtros['hasta'])
-        sql += " ORDER BY a.fecha_hora DESC"
+        if filtros.get('desde'): sql += " AND a.fecha_hora >= %s::date"; params.append(filtros['desde'])
+        if filtros.get('hasta'): sql += " AND a.fecha_hora < %s::date + 1"; params.append(filtros['hasta'])
+        sql += clausula_keyset("a.fecha_hora", "a.id_acceso", llave, params)
+        sql += " ORDER BY a.fecha_hora DESC, a.id_acceso DESC"
+        sql += clausula_limite(limite, params)
         cur.execute(sql, tuple(params))
-        data = cur.fetchall()
-        cur.close(); conn.close()
+        data, siguiente = cortar_pagina(cur.fetchall(), limite, lambda row: (row[7], row[0]))
+        cur.close()
         historial = []
         for row in data:
             historial.append({
                 "id": row[0], "placa": row[1], "entrada": row[2], "salida": row[3] if row[3] else "--",
                 "fecha": row[4], "estado": row[5], "tipo": row[6]
             })
-        return historial
+        return historial, siguiente
     except Exception as e:
         print(f"❌ Error historial: {e}")
-        return []
+        return [], None
+    finally:
+        if conn: conn.close()
 
 def procesar_validacion_acceso(data_input, vigilante_id):
+    """
+    Contrato JSON (clientes antiguos): {'image_base64': 'data:image/...', 'tipo_acceso': ...}
+    Modo ráfaga: {'imagenes_base64': [...], ...} con varios cuadros del mismo paso.
+    """
     try:
         # CAMBIO CLAVE: Ya no hacemos json.loads() porque server.py envía un diccionario
         # Si por alguna razón llega como string (tests locales antiguos), intentamos parsear
@@ -50,52 +69,146 @@ def procesar_validacion_acceso(data_input, vigilante_id):
         else:
             data = data_input # Ya es diccionario
 
-        imagen_b64 = data.get("image_base64")
+        imagen_b64 = data.get("imagenes_base64") or data.get("image_base64")
         tipo_acceso = data.get("tipo_acceso") 
+        id_punto = data.get("id_punto")  # Cámara / punto de control que envía el cuadro
 
         if not imagen_b64: return {"error": "No hay imagen"}, 400
 
-        placa_detectada = detectar_placa(imagen_b64) 
-        
-        if not placa_detectada:
-            return {"resultado": "Denegado", "datos": {"placa": "No detectada", "motivo": "Imagen ilegible"}}, 200
+        return validar_imagen_acceso(imagen_b64, tipo_acceso, vigilante_id, id_punto)
 
-        print(f"📡 Procesando: {placa_detectada} ({tipo_acceso})")
+    except Exception as e:
+        print(f"❌ Error controlador: {e}")
+        return {"error": str(e)}, 500
 
-        # LOGICA NEGOCIO
-        id_acceso_pendiente = verificar_vehiculo_dentro(placa_detectada)
+def procesar_validacion_asincrona(data_input, vigilante_id):
+    """
+    Mismo contrato JSON que procesar_validacion_acceso, pero solo encola el trabajo
+    y responde 202 con su id. El resultado se consulta en /api/accesos/trabajos/<id>.
+    """
+    try:
+        data = json.loads(data_input) if isinstance(data_input, (str, bytes)) else data_input
+        imagen = data.get("imagenes_base64") or data.get("image_base64")
+        tipo_acceso = data.get("tipo_acceso")
+        id_punto = data.get("id_punto")
+        if not imagen: return {"error": "No hay imagen"}, 400
 
-        if tipo_acceso == 'salida':
-            if not id_acceso_pendiente:
-                return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "No tiene entrada"}}, 200
-            else:
-                if registrar_salida_db(id_acceso_pendiente):
-                    registrar_auditoria_global(vigilante_id, "ACCESO", id_acceso_pendiente, "SALIDA", datos_nuevos={"placa": placa_detectada})
-                    return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Salida Exitosa"}}, 200
-                else:
-                    return {"error": "Error DB"}, 500
-        else: 
-            if id_acceso_pendiente:
-                return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "Ya está dentro"}}, 200
-            else:
-                res = registrar_entrada_db(placa_detectada, vigilante_id)
-                if res['status'] == 'ok':
-                    registrar_auditoria_global(vigilante_id, "ACCESO", 0, "ENTRADA", datos_nuevos={"placa": placa_detectada})
-                    return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Entrada Registrada"}}, 200
-                else:
-                    # Si falla registro, intentar lógica de invitados (calendario)
-                    from core.controller_calendario import hay_evento_activo_controller
-                    from models.vehiculo import registrar_vehiculo_invitado_db
-                    
-                    if hay_evento_activo_controller():
-                        if registrar_vehiculo_invitado_db(placa_detectada):
-                            res_inv = registrar_entrada_db(placa_detectada, vigilante_id)
-                            if res_inv['status'] == 'ok':
-                                registrar_auditoria_global(vigilante_id, "ACCESO", 0, "INVITADO", datos_nuevos={"placa": placa_detectada})
-                                return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "INVITADO EVENTO"}}, 200
-                    
-                    return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": res['mensaje']}}, 200
+        trabajo = encolar_validacion(validar_imagen_acceso, (imagen, tipo_acceso, vigilante_id, id_punto),
+                                     prioridad_para(tipo_acceso, id_punto))
+        if trabajo is None:
+            return {"error": "Cola de validación llena, reintente"}, 429
+        return {"id_trabajo": trabajo["id"], "estado": trabajo["estado"], "posicion": trabajo.get("posicion")}, 202
 
     except Exception as e:
         print(f"❌ Error controlador: {e}")
-        return {"error": str(e)}, 500
\ No newline at end of file
+        return {"error": str(e)}, 500
+
+def consultar_trabajo_validacion(id_trabajo):
+    trabajo = obtener_trabajo(id_trabajo)
+    if trabajo is None: return {"error": "Trabajo no encontrado o vencido"}, 404
+    return trabajo, 200
+
+def procesar_validacion_binaria(imagen_bytes, tipo_acceso, vigilante_id, id_punto=None):
+    """
+    Subida binaria (multipart o image/jpeg crudo): los bytes van directo al decodificador.
+    'imagen_bytes' puede ser una lista de cuadros (multipart con varios archivos).
+    """
+    try:
+        if not imagen_bytes: return {"error": "No hay imagen"}, 400
+        return validar_imagen_acceso(imagen_bytes, tipo_acceso, vigilante_id, id_punto)
+    except Exception as e:
+        print(f"❌ Error controlador: {e}")
+        return {"error": str(e)}, 500
+
+def validar_imagen_acceso(imagen, tipo_acceso, vigilante_id, id_punto=None):
+    """
+    OCR + reglas de negocio de entrada/salida.
+    'imagen' puede ser base64 o bytes crudos; 'id_punto' identifica la cámara.
+    Si llega una lista de cuadros se usa el modo ráfaga (votación entre cuadros).
+    """
+    # El OCR corre en el pool de workers (modelo ya cargado en cada proceso)
+    if isinstance(imagen, (list, tuple)):
+        analisis = analizar_rafaga(imagen, id_punto) if len(imagen) > 1 else analizar_imagen(imagen[0], id_punto)
+    else:
+        analisis = analizar_imagen(imagen, id_punto)
+    placa_detectada = analisis.get('placa')
+    
+    if not placa_detectada:
+        codigo = analisis.get('motivo')
+        if codigo:
+            # Rechazo por calidad: la garita puede pedir otro cuadro a la cámara de inmediato
+            return {"resultado": "Denegado", "datos": {
+                "placa": "No detectada", "motivo": "Imagen ilegible", "codigo": codigo,
+                "detalle": mensaje_motivo(codigo), "reintentar": True}}, 200
+        return {"resultado": "Denegado", "datos": {"placa": "No detectada", "motivo": "Imagen ilegible", "codigo": "sin_placa"}}, 200
+
+    # Lectura dudosa que no está en el padrón: la resolvemos a la placa registrada más cercana
+    placa_leida = placa_detectada
+    placa_resuelta = resolver_placa(placa_detectada, analisis.get('score'))
+    if placa_resuelta != placa_detectada:
+        print(f"🔎 Lectura {placa_detectada} resuelta a {placa_resuelta} (padrón de vehículos)")
+        placa_detectada = placa_resuelta
+
+    print(f"📡 Procesando: {placa_detectada} ({tipo_acceso}) [filtro {analisis.get('filtro')}, etapa {analisis.get('etapa')}]")
+
+    # LOGICA NEGOCIO: vehículo, visita abierta, invitado, entrada/salida y auditoría
+    # en una sola transacción de la BD (sin carreras entre dos garitas con la misma placa)
+    paso = registrar_paso_garita(placa_detectada, tipo_acceso, vigilante_id, id_usuario_auditoria=vigilante_id or None)
+    if paso is None:
+        return {"error": "Error DB"}, 500
+    if paso.get('sin_funcion'):
+        respuesta, codigo = _validar_por_pasos(placa_detectada, tipo_acceso, vigilante_id)
+    else:
+        if paso['invitado']:
+            indice_placas.agregar(placa_detectada)
+        if paso['resultado'] == 'Autorizado':
+            respuesta, codigo = {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": paso['detalle']}}, 200
+        else:
+            respuesta, codigo = {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": paso['detalle']}}, 200
+
+    if placa_leida != placa_detectada:
+        _auditar_resolucion(placa_leida, placa_detectada, analisis.get('score'), vigilante_id,
+                            paso.get('id_acceso'), respuesta.get('resultado'))
+        if "datos" in respuesta:
+            respuesta["datos"]["placa_leida"] = placa_leida
+    return respuesta, codigo
+
+def _auditar_resolucion(placa_leida, placa_resuelta, score, vigilante_id, id_acceso, resultado):
+    """Toda lectura corregida con el padrón queda en auditoría (lo leído vs lo usado)."""
+    registrar_auditoria_global(vigilante_id, "ACCESO", id_acceso or 0, "PLACA_RESUELTA",
+                               datos_previos={"placa": placa_leida, "score": score},
+                               datos_nuevos={"placa": placa_resuelta, "resultado": resultado})
+
+def _validar_por_pasos(placa_detectada, tipo_acceso, vigilante_id):
+    """Flujo anterior (varias conexiones): solo se usa si la BD aún no tiene migraciones/001."""
+    if tipo_acceso == 'salida':
+        id_acceso_pendiente = verificar_vehiculo_dentro(placa_detectada)
+        if not id_acceso_pendiente:
+            return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "No tiene entrada"}}, 200
+        else:
+            if registrar_salida_db(id_acceso_pendiente):
+                registrar_auditoria_global(vigilante_id, "ACCESO", id_acceso_pendiente, "SALIDA", datos_nuevos={"placa": placa_detectada})
+                return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Salida Exitosa"}}, 200
+            else:
+                return {"error": "Error DB"}, 500
+    else:
+        # Entrada condicional: "ya está dentro" sale de la misma sentencia (sin consulta previa)
+        res = registrar_entrada_db(placa_detectada, vigilante_id)
+        if res['status'] == 'ok':
+            registrar_auditoria_global(vigilante_id, "ACCESO", res['id_acceso'], "ENTRADA", datos_nuevos={"placa": placa_detectada})
+            return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Entrada Registrada"}}, 200
+        if res['status'] == 'dentro':
+            return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "Ya está dentro"}}, 200
+
+        # Si falla registro, intentar lógica de invitados (calendario)
+        from core.controller_calendario import hay_evento_activo_controller
+        from models.vehiculo import registrar_vehiculo_invitado_db
+
+        if hay_evento_activo_controller():
+            if registrar_vehiculo_invitado_db(placa_detectada):
+                res_inv = registrar_entrada_db(placa_detectada, vigilante_id)
+                if res_inv['status'] == 'ok':
+                    registrar_auditoria_global(vigilante_id, "ACCESO", res_inv['id_acceso'], "INVITADO", datos_nuevos={"placa": placa_detectada})
+                    return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "INVITADO EVENTO"}}, 200
+
+        return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": res['mensaje']}}, 200
@@ -1,50 +1,23 @@
 # backend/core/controller_personas.py
 # Lógica de negocio para el CRUD de Personas y Auditoría (Alineado con bd_carros.sql)
 
-import json
 # CORREGIDO: Importación del modelo con la ruta completa
 from models.persona import Persona 
 from core.db.connection import get_connection
 # CORREGIDO: Importación de Psycopg2 para cursores de diccionario
 from psycopg2.extras import RealDictCursor
-from core.auditoria_utils import registrar_auditoria_global
+from core.auditoria_utils import registrar_auditoria_global, escritor_auditoria
 # --- Función de Auditoría (Corregida para bd_carros.sql) ---
 
 def _registrar_auditoria(id_vigilante, entidad, id_entidad, accion, datos_previos=None, datos_nuevos=None):
     """
-    Función helper para insertar un registro de auditoría.
+    Función helper para registrar auditoría. Va al sumidero asíncrono común
+    (core/auditoria_utils.py): la petición no espera la escritura en la BD.
     """
-    conn = None
-    cursor = None
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # --- CAMBIO CLAVE AQUÍ ---
-        # La columna ahora se llama 'id_usuario' en la BD
-        query = """
-        INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        # -------------------------
-        
-        val_ant_str = json.dumps(datos_previos, default=str) if datos_previos else None
-        val_nue_str = json.dumps(datos_nuevos, default=str) if datos_nuevos else None
-        
-        # Pasamos el 'id_vigilante' (que es el id_audit/nu) a la columna 'id_usuario'
-        cursor.execute(query, (id_vigilante, entidad, id_entidad, accion, val_ant_str, val_nue_str))
-        conn.commit()
-        print(f"[Auditoria] Registro creado: {accion} en {entidad} (ID: {id_entidad}) por usuario {id_vigilante}")
-        
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"Error al registrar auditoría: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    # Pasamos el 'id_vigilante' (que es el id_audit/nu) a la columna 'id_usuario'
+    escritor_auditoria.encolar(id_vigilante, entidad, id_entidad, accion, datos_previos, datos_nuevos)
+    print(f"[Auditoria] Registro encolado: {accion} en {entidad} (ID: {id_entidad}) por usuario {id_vigilante}")
+
 # --- Funciones del CRUD de Personas (Corregido) ---
 
 def obtener_personas_controller():
@@ -4,6 +4,7 @@ from models.vehiculo import Vehiculo
 from core.db.connection import get_connection
 from psycopg2.extras import RealDictCursor
 from core.controller_personas import _registrar_auditoria 
+from core.indice_placas import indice_placas
 
 def obtener_vehiculos_controller():
     conn = None
@@ -83,6 +84,7 @@ def crear_vehiculo_controller(data, usuario_actual):
         conn.commit()
         
         nuevo_vehiculo.id_vehiculo = id_vehiculo_nuevo
+        indice_placas.agregar(nuevo_vehiculo.placa)
         _registrar_auditoria(
             id_vigilante=id_vigilante_actual,
             entidad='vehiculo',
@@ -167,6 +169,9 @@ def actualizar_vehiculo_controller(id_vehiculo, data, usuario_actual):
         ))
         
         conn.commit()
+        if vehiculo_anterior.placa != vehiculo_actualizado.placa:
+            indice_placas.quitar(vehiculo_anterior.placa)
+            indice_placas.agregar(vehiculo_actualizado.placa)
 
         # 5. Registrar Auditoría (Corregido: usaba variables inexistentes)
         _registrar_auditoria(
@@ -207,6 +212,7 @@ def eliminar_vehiculo_controller(id_vehiculo, usuario_actual):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM vehiculo WHERE id_vehiculo = %s", (id_vehiculo,))
         conn.commit()
+        indice_placas.quitar(vehiculo_anterior.placa)
 
         _registrar_auditoria(
             id_vigilante=id_vigilante_actual,
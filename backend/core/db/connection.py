@@ -1,31 +1,238 @@
+# backend/core/db/connection.py
+# Pool de conexiones PostgreSQL compartido por controladores y modelos.
+# get_connection() entrega una conexión del pool; conn.close() la DEVUELVE al pool
+# (no cierra el socket), así el código existente no cambia su forma de usarla.
 import psycopg2
+import psycopg2.extensions
 import os
+import time
+import threading
 from dotenv import load_dotenv
 
 # Carga las variables del archivo .env en el entorno
 load_dotenv()
 
-def get_connection():
-    try:
-        # Llama a las variables de entorno para la conexión
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# Conexiones físicas máximas por proceso
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Segundos que get_connection espera por una conexión libre antes de rendirse (retorna None)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Conexiones ociosas más de estos segundos se verifican con SELECT 1 antes de entregarse
+DB_POOL_VERIFICAR_S = float(os.getenv("DB_POOL_VERIFICAR_S", "30"))
+# Vida máxima de una conexión física (se recicla al devolverse; 0 = sin límite)
+DB_POOL_VIDA_MAX_S = float(os.getenv("DB_POOL_VIDA_MAX_S", "1800"))
+# Zona horaria de la sesión: va en las opciones de arranque (sin SET ni commit extra)
+DB_TIMEZONE = os.getenv("DB_TIMEZONE", "America/Bogota")
+
+# ==============================================================================
+# 2. CONEXIÓN PRESTADA
+# ==============================================================================
+class ConexionPrestada:
+    """
+    Envuelve una conexión psycopg2 del pool. Todo se delega a la conexión real
+    salvo close(), que la devuelve al pool. Si el código la olvida abierta, al
+    recolectarse el objeto vuelve igual al pool (y se cuenta como fuga).
+    """
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn, pool):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_pool", pool)
+
+    def __getattr__(self, nombre):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is None:
+            raise psycopg2.InterfaceError("conexión ya devuelta al pool")
+        return getattr(conn, nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._conn, nombre, valor)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self._conn.__exit__(*args)
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool.devolver(conn)
+
+    @property
+    def closed(self):
+        return 1 if self._conn is None else self._conn.closed
+
+    def __del__(self):
+        conn = getattr(self, "_conn", None)
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            try:
+                self._pool.devolver(conn, fuga=True)
+            except Exception:
+                pass   # Apagado del intérprete: ya no hay a dónde devolverla
+
+# ==============================================================================
+# 3. POOL
+# ==============================================================================
+class PoolConexiones:
+    def __init__(self, maximo=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT):
+        self.maximo = max(1, maximo)
+        self.timeout = timeout
+        self._libres = []          # [(conn, ultimo_uso)] (LIFO: la más reciente está caliente)
+        self._creadas_en = {}      # id(conn) -> momento de creación
+        self._abiertas = 0         # Físicas abiertas (libres + prestadas + en apertura)
+        self._cond = threading.Condition()
+        self.contadores = {"creadas": 0, "descartadas": 0, "verificaciones": 0, "fallidas": 0,
+                           "esperas": 0, "timeouts": 0, "fugas": 0, "prestamos": 0}
+        self.espera_ms_max = 0.0
+
+    def _abrir(self):
         conn = psycopg2.connect(
             host=os.getenv("DB_HOST"),
             database=os.getenv("DB_NAME"),
             user=os.getenv("DB_USER"),
             password=os.getenv("DB_PASSWORD"),
             port=os.getenv("DB_PORT"),
-            client_encoding='UTF8'
+            client_encoding='UTF8',
+            # --- CORRECCIÓN DE HORA ---
+            # Sesión en hora de Colombia desde el arranque, una vez por conexión física
+            options=f"-c TimeZone={DB_TIMEZONE}"
         )
-        
-        # --- CORRECCIÓN DE HORA ---
-        # Forzamos la sesión a la hora de Colombia inmediatamente al conectar
-        cur = conn.cursor()
-        cur.execute("SET TIME ZONE 'America/Bogota';")
-        cur.close()
-        conn.commit()
-        # --------------------------
-        
+        self._creadas_en[id(conn)] = time.monotonic()
+        self.contadores["creadas"] += 1
         return conn
+
+    def _sana(self, conn, ultimo_uso):
+        """Descarta conexiones cerradas y verifica las que llevan rato ociosas."""
+        if conn.closed:
+            return False
+        if time.monotonic() - ultimo_uso < DB_POOL_VERIFICAR_S:
+            return True
+        self.contadores["verificaciones"] += 1
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, conn):
+        self._creadas_en.pop(id(conn), None)
+        self.contadores["descartadas"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def obtener(self):
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        while True:
+            with self._cond:
+                while not self._libres and self._abiertas >= self.maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.contadores["timeouts"] += 1
+                        raise psycopg2.OperationalError(
+                            f"pool agotado: {self.maximo} conexiones en uso tras {self.timeout}s")
+                    self.contadores["esperas"] += 1
+                    self._cond.wait(restante)
+                if self._libres:
+                    conn, ultimo_uso = self._libres.pop()
+                else:
+                    conn, ultimo_uso = None, None
+                    self._abiertas += 1   # Reservamos el cupo antes de conectar (fuera del lock)
+
+            if conn is None:
+                try:
+                    conn = self._abrir()
+                except Exception:
+                    with self._cond:
+                        self._abiertas -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._sana(conn, ultimo_uso):
+                self.contadores["fallidas"] += 1
+                with self._cond:
+                    self._abiertas -= 1
+                self._descartar(conn)
+                continue
+
+            self.contadores["prestamos"] += 1
+            self.espera_ms_max = max(self.espera_ms_max, (time.monotonic() - inicio) * 1000)
+            return ConexionPrestada(conn, self)
+
+    def devolver(self, conn, fuga=False):
+        if fuga:
+            self.contadores["fugas"] += 1
+        reutilizable = not conn.closed
+        if reutilizable and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # Transacción abierta o abortada que el código no cerró: no debe pasar al siguiente
+            try:
+                conn.rollback()
+            except Exception:
+                reutilizable = False
+        creada = self._creadas_en.get(id(conn), 0)
+        if reutilizable and DB_POOL_VIDA_MAX_S and time.monotonic() - creada > DB_POOL_VIDA_MAX_S:
+            reutilizable = False
+        with self._cond:
+            if reutilizable:
+                self._libres.append((conn, time.monotonic()))
+            else:
+                self._abiertas -= 1
+            self._cond.notify()
+        if not reutilizable:
+            self._descartar(conn)
+
+    def cerrar_todas(self):
+        """Cierra las conexiones libres (las prestadas se cierran al devolverse)."""
+        with self._cond:
+            libres, self._libres = self._libres, []
+            self._abiertas -= len(libres)
+        for conn, _ in libres:
+            self._descartar(conn)
+
+    def metricas(self):
+        with self._cond:
+            return {
+                "maximo": self.maximo,
+                "abiertas": self._abiertas,
+                "libres": len(self._libres),
+                "en_uso": self._abiertas - len(self._libres),
+                "timeout_s": self.timeout,
+                "espera_ms_max": round(self.espera_ms_max, 1),
+                **self.contadores,
+            }
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def obtener_pool():
+    """Pool del proceso actual (se recrea tras un fork: los sockets no se comparten)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool, _pool_pid = PoolConexiones(), os.getpid()
+        return _pool
+
+def get_connection():
+    """
+    Conexión del pool (ver ConexionPrestada): conn.close() la devuelve.
+    Retorna None si la BD no responde o el pool sigue agotado tras DB_POOL_TIMEOUT.
+    """
+    try:
+        return obtener_pool().obtener()
     except Exception as e:
         print(f"❌ Error crítico conectando a la BD: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def metricas_pool():
+    return obtener_pool().metricas()
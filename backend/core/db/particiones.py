@@ -0,0 +1,176 @@
+# backend/core/db/particiones.py
+# Mantenimiento de las tablas particionadas por mes (migraciones/005): crea por adelantado
+# las particiones de los próximos meses y aplica la retención (desprende los meses viejos,
+# los archiva en CSV comprimido y los borra). Pensado para correr a diario desde cron:
+#   python core/db/particiones.py                  (crear + retención)
+#   python core/db/particiones.py --simular        (solo muestra lo que haría)
+#   python core/db/particiones.py --solo-crear
+import os
+import re
+import sys
+import gzip
+import argparse
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from core.db.connection import get_connection
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# Meses futuros que deben existir siempre (si faltan, las filas caen en <tabla>_pdefault)
+PARTICIONES_MESES_FUTUROS = int(os.getenv("PARTICIONES_MESES_FUTUROS", "3"))
+# Meses completos que se conservan en la BD por tabla (0 = sin retención)
+RETENCION_MESES = {
+    "acceso": int(os.getenv("RETENCION_MESES_ACCESO", "24")),
+    "auditoria": int(os.getenv("RETENCION_MESES_AUDITORIA", "60")),
+}
+# Carpeta de los archivos <tabla>_pAAAA_MM.csv.gz
+ARCHIVO_PARTICIONES = os.getenv("ARCHIVO_PARTICIONES", os.path.join(os.path.dirname(__file__), "..", "..", "archivo_particiones"))
+
+TABLAS = ("acceso", "auditoria")
+
+# ==============================================================================
+# 2. MESES
+# ==============================================================================
+def sumar_meses(mes, n):
+    """Primer día del mes 'mes' + n (n puede ser negativo)."""
+    total = mes.year * 12 + mes.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
+
+def mes_de_particion(tabla, nombre):
+    """'acceso_p2025_03' -> date(2025, 3, 1); None si no es una partición mensual."""
+    m = re.fullmatch(re.escape(tabla) + r"_p(\d{4})_(\d{2})", nombre)
+    return date(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+def listar_particiones(cur, tabla):
+    """
+    Retorna [(nombre, mes, adjunta)] ordenado por mes. Incluye las ya desprendidas que
+    siguen en la BD (un archivado anterior que falló): se reintentan.
+    """
+    cur.execute("""
+        SELECT c.relname, EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+        FROM pg_class c
+        WHERE c.relkind = 'r' AND c.relname LIKE %s
+    """, (tabla + "\\_p%",))
+    particiones = []
+    for nombre, adjunta in cur.fetchall():
+        mes = mes_de_particion(tabla, nombre)
+        if mes:
+            particiones.append((nombre, mes, adjunta))
+    return sorted(particiones, key=lambda p: p[1])
+
+# ==============================================================================
+# 3. CREACIÓN
+# ==============================================================================
+def crear_futuras(cur, hoy=None, simular=False):
+    mes_actual = (hoy or date.today()).replace(day=1)
+    creadas = []
+    for tabla in TABLAS:
+        for n in range(PARTICIONES_MESES_FUTUROS + 1):
+            mes = sumar_meses(mes_actual, n)
+            if simular:
+                print(f"🔎 Asegurar {tabla}_p{mes:%Y_%m}")
+                continue
+            cur.execute("SELECT crear_particion_mensual(%s, %s)", (tabla, mes))
+            if cur.fetchone()[0]:
+                creadas.append(f"{tabla}_p{mes:%Y_%m}")
+                print(f"🧱 Partición creada: {tabla}_p{mes:%Y_%m}")
+        if not simular:
+            cur.execute(f"SELECT COUNT(*) FROM {tabla}_pdefault")
+            en_defecto = cur.fetchone()[0]
+            if en_defecto:
+                print(f"⚠️ {en_defecto} fila(s) de {tabla} en la partición por defecto (fechas fuera de los meses creados)")
+    return creadas
+
+# ==============================================================================
+# 4. RETENCIÓN
+# ==============================================================================
+def archivar_particion(cur, tabla, nombre):
+    """COPY a <nombre>.csv.gz (escrito a un temporal y renombrado). Retorna las filas escritas."""
+    os.makedirs(ARCHIVO_PARTICIONES, exist_ok=True)
+    destino = os.path.join(os.path.abspath(ARCHIVO_PARTICIONES), f"{nombre}.csv.gz")
+    temporal = destino + ".tmp"
+    cur.execute(f"SELECT COUNT(*) FROM {nombre}")
+    esperadas = cur.fetchone()[0]
+    with gzip.open(temporal, "wb") as f:
+        cur.copy_expert(f"COPY {nombre} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+        copiadas = cur.rowcount
+    if copiadas >= 0 and copiadas != esperadas:
+        os.remove(temporal)
+        raise RuntimeError(f"{nombre}: se copiaron {copiadas} de {esperadas} filas")
+    with open(temporal, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(temporal, destino)
+    return esperadas, destino
+
+def aplicar_retencion(cur, hoy=None, simular=False):
+    """
+    Archiva y borra las particiones cuyo mes terminó antes del corte (mes actual menos
+    RETENCION_MESES). Orden seguro: desprender -> archivar -> borrar; si el archivado falla,
+    la tabla desprendida queda en la BD y se reintenta en la siguiente corrida.
+    """
+    mes_actual = (hoy or date.today()).replace(day=1)
+    archivadas = []
+    for tabla in TABLAS:
+        meses = RETENCION_MESES.get(tabla, 0)
+        if meses <= 0:
+            continue
+        corte = sumar_meses(mes_actual, -meses)
+        for nombre, mes, adjunta in listar_particiones(cur, tabla):
+            if mes >= corte:
+                continue
+            if simular:
+                print(f"🔎 Archivar y borrar {nombre} (anterior a {corte})")
+                continue
+            if adjunta:
+                if tabla == "acceso":
+                    # Una visita que nunca registró salida no puede quedar "dentro" para siempre
+                    cur.execute("""
+                        UPDATE acceso
+                        SET hora_salida = fecha_hora,
+                            observaciones = CONCAT_WS(' | ', observaciones, 'Cerrada por retención')
+                        WHERE fecha_hora >= %s AND fecha_hora < %s AND hora_salida IS NULL
+                    """, (mes, sumar_meses(mes, 1)))
+                cur.execute(f"ALTER TABLE {tabla} DETACH PARTITION {nombre}")
+            try:
+                filas, destino = archivar_particion(cur, tabla, nombre)
+            except Exception as e:
+                print(f"❌ No se pudo archivar {nombre} (queda desprendida en la BD): {e}")
+                continue
+            cur.execute(f"DROP TABLE {nombre}")
+            archivadas.append(nombre)
+            print(f"📦 {nombre}: {filas} fila(s) archivadas en {destino}")
+    return archivadas
+
+# ==============================================================================
+# 5. EJECUCIÓN
+# ==============================================================================
+def mantener(retencion=True, simular=False):
+    conn = get_connection()
+    if conn is None:
+        return False
+    try:
+        # Cada paso se confirma solo: un fallo no deshace las particiones ya creadas/archivadas
+        conn.autocommit = True
+        cur = conn.cursor()
+        crear_futuras(cur, simular=simular)
+        if retencion:
+            aplicar_retencion(cur, simular=simular)
+        cur.close()
+        return True
+    except Exception as e:
+        print(f"❌ Error en el mantenimiento de particiones: {e}")
+        return False
+    finally:
+        if not conn.closed:
+            conn.autocommit = False
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crea particiones futuras y aplica la retención")
+    parser.add_argument("--simular", action="store_true", help="Solo muestra lo que haría")
+    parser.add_argument("--solo-crear", action="store_true", help="No aplica la retención")
+    args = parser.parse_args()
+    sys.exit(0 if mantener(retencion=not args.solo_crear, simular=args.simular) else 1)
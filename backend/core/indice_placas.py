@@ -0,0 +1,214 @@
+# backend/core/indice_placas.py
+# Índice en memoria de las placas registradas (BK-tree) para resolver lecturas OCR
+# dudosas a la placa registrada más cercana, usando los costos de confusión L2N/N2L.
+import os
+import time
+import threading
+
+from core.db.connection import get_connection
+from ocr.detector import L2N, N2L
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# Distancia máxima aceptada (1 = una confusión típica O/0, 2 = dos). Solo cuentan las
+# sustituciones entre caracteres confundibles: un error libre o un carácter de más/menos
+# nunca se resuelve (sería abrirle la barrera a otra placa)
+OCR_RESOLUCION_DISTANCIA = int(os.getenv("OCR_RESOLUCION_DISTANCIA", "1"))
+# Solo se resuelven lecturas con score menor a este (105 = lectura perfecta, no se toca)
+OCR_RESOLUCION_SCORE_MAX = int(os.getenv("OCR_RESOLUCION_SCORE_MAX", "105"))
+# Segundos entre recargas completas desde la BD (cambios hechos por otros procesos)
+INDICE_PLACAS_TTL = float(os.getenv("INDICE_PLACAS_TTL", "600"))
+
+# ==============================================================================
+# 2. DISTANCIA DE EDICIÓN PONDERADA POR CONFUSIÓN
+# ==============================================================================
+# Costos enteros: confusión típica del OCR (O<->0, S<->5...) = 1, otra sustitución = 2,
+# inserción/borrado = 2. Con estos costos la distancia sigue siendo una métrica (BK-tree válido).
+COSTO_CONFUSION = 1
+COSTO_SUSTITUCION = 2
+COSTO_INDEL = 2
+
+CONFUSIONES = frozenset(
+    par for k, v in list(L2N.items()) + list(N2L.items()) if k.isupper() or k.isdigit()
+    for par in ((k, v), (v, k))
+)
+
+def distancia_placas(a, b):
+    """Levenshtein con costos de confusión OCR (programación dinámica, dos filas)."""
+    if a == b:
+        return 0
+    previa = [j * COSTO_INDEL for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, start=1):
+        actual = [i * COSTO_INDEL]
+        for j, cb in enumerate(b, start=1):
+            if ca == cb:
+                sustitucion = previa[j - 1]
+            else:
+                sustitucion = previa[j - 1] + (COSTO_CONFUSION if (ca, cb) in CONFUSIONES else COSTO_SUSTITUCION)
+            actual.append(min(sustitucion, previa[j] + COSTO_INDEL, actual[j - 1] + COSTO_INDEL))
+        previa = actual
+    return previa[-1]
+
+def solo_confusiones(a, b):
+    """True si 'b' sale de 'a' cambiando únicamente caracteres confundibles (misma longitud)."""
+    return len(a) == len(b) and all(ca == cb or (ca, cb) in CONFUSIONES for ca, cb in zip(a, b))
+
+# ==============================================================================
+# 3. BK-TREE
+# ==============================================================================
+class _Nodo:
+    __slots__ = ("placa", "hijos")
+    def __init__(self, placa):
+        self.placa = placa
+        self.hijos = {}   # distancia -> _Nodo
+
+class IndicePlacas:
+    """
+    BK-tree sobre vehiculo.placa. Las altas se insertan al vuelo; las bajas se marcan
+    y el árbol se reconstruye cuando acumulan un 25%. Cada INDICE_PLACAS_TTL se
+    recarga completo desde la BD para ver los cambios de otros procesos.
+    """
+    def __init__(self, ttl=INDICE_PLACAS_TTL):
+        self.ttl = ttl
+        self._raiz = None
+        self._placas = set()
+        self._borradas = set()
+        self._cargado_en = None
+        self._lock = threading.RLock()
+        self.resoluciones = 0
+        self.ambiguas = 0
+        self.sin_coincidencia = 0
+
+    # --- Carga y mantenimiento ---
+    def recargar(self):
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT placa FROM vehiculo")
+            placas = {fila[0].upper() for fila in cur.fetchall() if fila[0]}
+            cur.close()
+        except Exception as e:
+            print(f"❌ Error cargando índice de placas: {e}")
+            # Sin BD no insistimos en cada petición: reintento en 30 s
+            self._cargado_en = time.monotonic() - self.ttl + 30
+            return False
+        finally:
+            if conn: conn.close()
+        with self._lock:
+            self._reconstruir(placas)
+            self._cargado_en = time.monotonic()
+        print(f"🗂️ Índice de placas cargado ({len(placas)} placas)")
+        return True
+
+    def _reconstruir(self, placas):
+        self._raiz = None
+        self._placas = set()
+        self._borradas = set()
+        for placa in placas:
+            self._insertar(placa)
+
+    def _asegurar_cargado(self):
+        if self._cargado_en is None or time.monotonic() - self._cargado_en > self.ttl:
+            self.recargar()
+
+    def _insertar(self, placa):
+        if placa in self._placas:
+            return
+        self._placas.add(placa)
+        if self._raiz is None:
+            self._raiz = _Nodo(placa)
+            return
+        nodo = self._raiz
+        while True:
+            d = distancia_placas(placa, nodo.placa)
+            if d == 0:
+                return   # Ya estaba (pudo estar marcada como borrada)
+            hijo = nodo.hijos.get(d)
+            if hijo is None:
+                nodo.hijos[d] = _Nodo(placa)
+                return
+            nodo = hijo
+
+    def agregar(self, placa):
+        """Alta o reactivación (vehículo creado / placa editada)."""
+        if not placa: return
+        placa = placa.upper()
+        with self._lock:
+            self._borradas.discard(placa)
+            self._insertar(placa)
+
+    def quitar(self, placa):
+        """Baja (vehículo eliminado / placa anterior de una edición)."""
+        if not placa: return
+        placa = placa.upper()
+        with self._lock:
+            if placa in self._placas and placa not in self._borradas:
+                self._borradas.add(placa)
+                if len(self._borradas) * 4 > len(self._placas):
+                    self._reconstruir(self._placas - self._borradas)
+
+    def contiene(self, placa):
+        self._asegurar_cargado()
+        with self._lock:
+            return placa in self._placas and placa not in self._borradas
+
+    # --- Búsqueda ---
+    def buscar(self, placa, distancia_max):
+        """Todas las placas registradas a distancia <= distancia_max: [(distancia, placa)]."""
+        self._asegurar_cargado()
+        encontradas = []
+        with self._lock:
+            pendientes = [self._raiz] if self._raiz else []
+            while pendientes:
+                nodo = pendientes.pop()
+                d = distancia_placas(placa, nodo.placa)
+                if d <= distancia_max and nodo.placa not in self._borradas:
+                    encontradas.append((d, nodo.placa))
+                # Desigualdad triangular: solo hijos con |d - k| <= distancia_max
+                for k, hijo in nodo.hijos.items():
+                    if d - distancia_max <= k <= d + distancia_max:
+                        pendientes.append(hijo)
+        return sorted(encontradas)
+
+    def resolver(self, placa, distancia_max=OCR_RESOLUCION_DISTANCIA):
+        """
+        Placa registrada más cercana a 'placa', o None si no hay ninguna dentro
+        del límite o si hay empate (dos registradas igual de cerca: no adivinamos).
+        Solo se consideran las que difieren en caracteres confundibles por el OCR.
+        """
+        cercanas = [(d, p) for d, p in self.buscar(placa, distancia_max) if solo_confusiones(placa, p)]
+        if not cercanas:
+            self.sin_coincidencia += 1
+            return None
+        if len(cercanas) > 1 and cercanas[0][0] == cercanas[1][0]:
+            self.ambiguas += 1
+            print(f"⚠️ Lectura {placa} ambigua entre {cercanas[0][1]} y {cercanas[1][1]}")
+            return None
+        self.resoluciones += 1
+        return cercanas[0][1]
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "placas": len(self._placas) - len(self._borradas),
+                "borradas_pendientes": len(self._borradas),
+                "resoluciones": self.resoluciones,
+                "ambiguas": self.ambiguas,
+                "sin_coincidencia": self.sin_coincidencia,
+                "distancia_max": OCR_RESOLUCION_DISTANCIA,
+            }
+
+# Instancia compartida por el proceso web
+indice_placas = IndicePlacas()
+
+def resolver_placa(placa, score=None):
+    """
+    Si la lectura es dudosa (score < OCR_RESOLUCION_SCORE_MAX) y no está registrada,
+    retorna la placa registrada más cercana; en cualquier otro caso la misma placa.
+    """
+    if not placa or (score is not None and score >= OCR_RESOLUCION_SCORE_MAX):
+        return placa
+    if indice_placas.contiene(placa):
+        return placa
+    return indice_placas.resolver(placa) or placa
@@ -0,0 +1,88 @@
+# backend/core/paginacion.py
+# Paginación por llave (keyset) para los historiales ordenados por (fecha_hora, id) DESC.
+# En vez de OFFSET (que relee todo lo anterior), cada página arranca después de la última
+# fila entregada: "WHERE (fecha_hora, id) < (ultima_fecha, ultimo_id)", mismo costo en la
+# página 1 que en la 1000 gracias a los índices (fecha_hora DESC, id DESC) de migraciones/002.
+# Solo se pagina si el cliente lo pide (?limite= o ?cursor=): sin ellos la respuesta es la
+# lista completa de siempre, así un cliente antiguo no pierde filas sin enterarse.
+import os
+import json
+import base64
+from datetime import datetime
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# Filas por página cuando el cliente manda ?cursor= sin ?limite=
+HISTORIAL_PAGINA = int(os.getenv("HISTORIAL_PAGINA", "50"))
+# Tope de filas por página (aunque el cliente pida más)
+HISTORIAL_PAGINA_MAX = int(os.getenv("HISTORIAL_PAGINA_MAX", "500"))
+
+# ==============================================================================
+# 2. CURSOR OPACO
+# ==============================================================================
+def codificar_cursor(fecha_hora, id_fila):
+    """Token base64 url-safe con la llave de la última fila entregada."""
+    crudo = json.dumps([fecha_hora.isoformat(), id_fila], separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decodificar_cursor(token):
+    """Retorna (fecha_hora, id). Lanza ValueError si el token no es nuestro o está dañado."""
+    try:
+        relleno = "=" * (-len(token) % 4)
+        fecha, id_fila = json.loads(base64.urlsafe_b64decode(token + relleno))
+        return datetime.fromisoformat(fecha), int(id_fila)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def leer_paginacion(args):
+    """
+    Lee 'cursor' y 'limite' de los parámetros de la petición.
+    Retorna (llave o None, limite); limite es None si no vino ninguno de los dos (sin
+    paginar). ValueError si alguno es inválido.
+    """
+    cursor = args.get("cursor")
+    if not cursor and not args.get("limite"):
+        return None, None
+    llave = decodificar_cursor(cursor) if cursor else None
+    try:
+        limite = int(args.get("limite") or HISTORIAL_PAGINA)
+    except ValueError:
+        raise ValueError("Límite inválido")
+    return llave, limite
+
+# ==============================================================================
+# 3. CONSULTA
+# ==============================================================================
+def tamano_pagina(limite):
+    """None se mantiene (lista completa); cualquier otro valor queda entre 1 y el tope."""
+    if limite is None:
+        return None
+    return max(1, min(int(limite), HISTORIAL_PAGINA_MAX))
+
+def clausula_keyset(columna_fecha, columna_id, llave, params):
+    """
+    Fragmento ' AND (fecha, id) < (%s, %s)' (vacío en la primera página). Agrega los
+    valores a 'params'. Va acompañado de ORDER BY fecha DESC, id DESC y clausula_limite.
+    """
+    if llave is None:
+        return ""
+    params.extend(llave)
+    return f" AND ({columna_fecha}, {columna_id}) < (%s, %s)"
+
+def clausula_limite(limite, params):
+    """' LIMIT %s' con limite + 1 (la fila extra indica que hay otra página); vacío sin paginar."""
+    if limite is None:
+        return ""
+    params.append(limite + 1)
+    return " LIMIT %s"
+
+def cortar_pagina(filas, limite, llave_de):
+    """
+    Se piden limite + 1 filas: si llegó la extra hay otra página. Retorna
+    (filas de la página, cursor siguiente o None). 'llave_de(fila)' -> (fecha_hora, id).
+    """
+    if limite is None or len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, codificar_cursor(*llave_de(filas[-1]))
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify
-from db.connection import get_connection
+from core.db.connection import get_connection
 
 cars_bp = Blueprint('cars', __name__)
 
@@ -9,10 +9,12 @@ def get_carros():
     if conn is None:
         return jsonify({"error": "No se pudo conectar a la base de datos"}), 500
 
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM carros;")
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM carros;")
+        data = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
 
     return jsonify(data)
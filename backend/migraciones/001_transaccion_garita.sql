@@ -0,0 +1,91 @@
+-- ====================================================================
+-- MIGRACIÓN 001: Transacción de garita en un solo viaje a la BD
+-- registrar_paso_garita() hace en UNA transacción lo que antes eran 4-6 conexiones:
+-- búsqueda del vehículo, visita abierta, alta de invitado (si hay evento activo),
+-- entrada/salida y auditoría. Los FOR UPDATE serializan dos garitas leyendo la misma placa.
+-- ====================================================================
+
+CREATE OR REPLACE FUNCTION registrar_paso_garita(
+    p_placa VARCHAR,
+    p_tipo VARCHAR,               -- 'entrada' | 'salida'
+    p_id_vigilante INTEGER,
+    p_id_punto INTEGER,           -- Punto de control de la entrada
+    p_id_usuario INTEGER,         -- Usuario auditado (NULL = sin auditoría)
+    p_permitir_invitado BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (resultado VARCHAR, detalle VARCHAR, id_acceso INTEGER, invitado BOOLEAN)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_id_vehiculo INTEGER;
+    v_id_acceso INTEGER;
+    v_invitado BOOLEAN := FALSE;
+    v_datos TEXT := json_build_object('placa', p_placa)::TEXT;
+BEGIN
+    -- 1. Vehículo (bloqueado: otra garita con la misma placa espera a que terminemos)
+    SELECT v.id_vehiculo INTO v_id_vehiculo
+    FROM vehiculo v WHERE v.placa = p_placa
+    FOR UPDATE;
+
+    IF v_id_vehiculo IS NULL THEN
+        IF p_tipo = 'salida' THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'No tiene entrada'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        -- Sin registro: solo pasa como invitado si hay un evento activo
+        IF NOT p_permitir_invitado
+           OR NOT EXISTS (SELECT 1 FROM evento e WHERE NOW() BETWEEN e.fecha_inicio AND e.fecha_fin) THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'Vehículo no registrado'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        -- ID 9999 es el usuario 'INVITADO EVENTO'. ON CONFLICT: otra garita lo acaba de crear
+        INSERT INTO vehiculo (placa, tipo, color, id_persona)
+        VALUES (p_placa, 'Invitado', 'Sin especificar', 9999)
+        ON CONFLICT (placa) DO UPDATE SET placa = EXCLUDED.placa
+        RETURNING vehiculo.id_vehiculo INTO v_id_vehiculo;
+        v_invitado := TRUE;
+    END IF;
+
+    -- 2. Visita abierta (entrada sin hora de salida)
+    SELECT a.id_acceso INTO v_id_acceso
+    FROM acceso a
+    WHERE a.id_vehiculo = v_id_vehiculo AND a.hora_salida IS NULL
+    ORDER BY a.fecha_hora DESC
+    LIMIT 1
+    FOR UPDATE;
+
+    -- 3. Salida
+    IF p_tipo = 'salida' THEN
+        IF v_id_acceso IS NULL THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'No tiene entrada'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        UPDATE acceso
+        SET hora_salida = CURRENT_TIMESTAMP, resultado = 'Salida Exitosa'
+        WHERE acceso.id_acceso = v_id_acceso;
+        IF p_id_usuario IS NOT NULL THEN
+            INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+            VALUES (p_id_usuario, 'ACCESO', v_id_acceso, 'SALIDA', NULL, v_datos, CURRENT_TIMESTAMP);
+        END IF;
+        RETURN QUERY SELECT 'Autorizado'::VARCHAR, 'Salida Exitosa'::VARCHAR, v_id_acceso, FALSE;
+        RETURN;
+    END IF;
+
+    -- 4. Entrada
+    IF v_id_acceso IS NOT NULL THEN
+        RETURN QUERY SELECT 'Denegado'::VARCHAR, 'Ya está dentro'::VARCHAR, v_id_acceso, FALSE;
+        RETURN;
+    END IF;
+    INSERT INTO acceso (id_vehiculo, id_punto, id_vigilante, fecha_hora, resultado, hora_salida)
+    VALUES (v_id_vehiculo, p_id_punto, p_id_vigilante, CURRENT_TIMESTAMP, 'Acceso Concedido - Entrada', NULL)
+    RETURNING acceso.id_acceso INTO v_id_acceso;
+    IF p_id_usuario IS NOT NULL THEN
+        INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+        VALUES (p_id_usuario, 'ACCESO', v_id_acceso, CASE WHEN v_invitado THEN 'INVITADO' ELSE 'ENTRADA' END,
+                NULL, v_datos, CURRENT_TIMESTAMP);
+    END IF;
+    RETURN QUERY SELECT 'Autorizado'::VARCHAR,
+                        (CASE WHEN v_invitado THEN 'INVITADO EVENTO' ELSE 'Entrada Registrada' END)::VARCHAR,
+                        v_id_acceso, v_invitado;
+END;
+$$;
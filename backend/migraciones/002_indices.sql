@@ -0,0 +1,57 @@
+-- ====================================================================
+-- MIGRACIÓN 002: Índices para las consultas calientes
+-- sin-transaccion: CREATE INDEX CONCURRENTLY no bloquea escrituras (las garitas siguen
+-- registrando mientras se construye) pero no puede correr dentro de una transacción.
+-- migrar.py ejecuta cada sentencia de este archivo por separado y en autocommit.
+-- ====================================================================
+
+-- 1. ACCESO
+-- Visitas abiertas (hora_salida IS NULL): índice parcial, pequeño aunque la tabla crezca.
+-- Sirve a la garita (vehículo dentro), al conteo del patio y a la ocupación del dashboard.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_acceso_abierto
+    ON acceso (id_vehiculo, fecha_hora DESC) WHERE hora_salida IS NULL;
+
+-- Historial, reportes por rango y paginación: orden por fecha con desempate por id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_acceso_fecha
+    ON acceso (fecha_hora DESC, id_acceso DESC);
+
+-- Historial de un vehículo (FK + orden temporal)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_acceso_vehiculo_fecha
+    ON acceso (id_vehiculo, fecha_hora DESC);
+
+-- FKs de acceso (validación de ON UPDATE/DELETE en las tablas padre)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_acceso_vigilante ON acceso (id_vigilante);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_acceso_punto ON acceso (id_punto);
+
+-- 2. AUDITORIA
+-- Reporte de alertas resueltas: igualdad en entidad/accion + rango de fechas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_auditoria_entidad_accion_fecha
+    ON auditoria (entidad, accion, fecha_hora DESC);
+-- Historial completo ordenado por fecha
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_auditoria_fecha
+    ON auditoria (fecha_hora DESC, id_auditoria DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_auditoria_usuario ON auditoria (id_usuario);
+
+-- 3. NOVEDAD
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_novedad_fecha
+    ON novedad (fecha_hora DESC, id_novedad DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_novedad_usuario ON novedad (id_usuario);
+
+-- 4. EVENTO (¿hay evento activo ahora? en cada invitado)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_evento_rango ON evento (fecha_inicio, fecha_fin);
+
+-- 5. RESTO DE FKs SIN ÍNDICE
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vehiculo_persona ON vehiculo (id_persona);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_alerta_acceso ON alerta (id_acceso);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_alerta_vigilante ON alerta (id_vigilante);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pago_acceso_entrada ON pago (id_acceso_entrada);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pago_acceso_salida ON pago (id_acceso_salida);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pase_temporal_persona ON pase_temporal (id_persona);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pase_temporal_vehiculo ON pase_temporal (id_vehiculo);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_identificador_vehiculo ON identificador (id_vehiculo);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_turno_vigilante ON turno (id_vigilante);
+
+-- Estadísticas frescas para que el planificador considere los índices nuevos
+ANALYZE acceso;
+ANALYZE auditoria;
+ANALYZE novedad;
@@ -0,0 +1,25 @@
+-- ====================================================================
+-- MIGRACIÓN 003: Una sola visita abierta por vehículo (garantizada por la BD)
+-- sin-transaccion: el índice único se construye CONCURRENTLY (migrar.py lo ejecuta en autocommit).
+-- Antes, dos garitas leyendo la misma placa podían insertar dos entradas abiertas y el
+-- conteo de ocupación quedaba inflado. Con el índice, la segunda inserción choca.
+-- ====================================================================
+
+-- 1. Cerrar duplicados existentes: por vehículo se conserva la entrada abierta más reciente
+UPDATE acceso a
+SET hora_salida = a.fecha_hora,
+    observaciones = CONCAT_WS(' | ', a.observaciones, 'Cerrada por migración 003 (entrada abierta duplicada)')
+FROM (
+    SELECT id_acceso,
+           ROW_NUMBER() OVER (PARTITION BY id_vehiculo ORDER BY fecha_hora DESC, id_acceso DESC) AS n
+    FROM acceso
+    WHERE hora_salida IS NULL AND id_vehiculo IS NOT NULL
+) d
+WHERE a.id_acceso = d.id_acceso AND d.n > 1;
+
+-- 2. Índice único parcial: a lo sumo una fila con hora_salida NULL por vehículo
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_acceso_abierto
+    ON acceso (id_vehiculo) WHERE hora_salida IS NULL;
+
+-- 3. El índice parcial de la 002 queda cubierto por el único
+DROP INDEX CONCURRENTLY IF EXISTS ix_acceso_abierto;
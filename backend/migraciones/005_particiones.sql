@@ -0,0 +1,270 @@
+-- ====================================================================
+-- MIGRACIÓN 005: acceso y auditoria particionadas por mes (fecha_hora)
+-- Cada mes es una tabla propia: las consultas con rango de fechas (reportes, historial)
+-- solo leen los meses del rango (poda de particiones) y la retención archiva/borra meses
+-- completos sin DELETE masivos (core/db/particiones.py).
+-- Reescribe ambas tablas en UNA transacción: correr en ventana de mantenimiento.
+--
+-- Consecuencias del particionado (PostgreSQL exige la llave de partición en todo índice único):
+--  * La llave primaria pasa a ser (id, fecha_hora); el id sigue siendo único por su secuencia.
+--  * "Una visita abierta por vehículo" (003) ya no puede ser un índice único sobre acceso:
+--    la garantiza la tabla acceso_abierto (PK id_vehiculo), mantenida por un trigger.
+--  * alerta y pago dejan de tener FK hacia acceso (una FK necesitaría también fecha_hora y
+--    bloquearía archivar meses viejos). Los id_acceso se conservan tal cual.
+-- ====================================================================
+
+-- 1. CREACIÓN DE PARTICIONES MENSUALES
+-- Crea <tabla>_pAAAA_MM para el mes de p_mes. Si la partición por defecto ya recibió filas
+-- de ese mes (no se creó a tiempo), las mueve antes de adjuntarla. Retorna TRUE si la creó.
+CREATE OR REPLACE FUNCTION crear_particion_mensual(p_tabla TEXT, p_mes DATE)
+RETURNS BOOLEAN
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_inicio DATE := date_trunc('month', p_mes)::DATE;
+    v_fin DATE := (date_trunc('month', p_mes) + INTERVAL '1 month')::DATE;
+    v_nombre TEXT := p_tabla || '_p' || to_char(p_mes, 'YYYY_MM');
+    v_defecto TEXT := p_tabla || '_pdefault';
+BEGIN
+    IF to_regclass(v_nombre) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_nombre, p_tabla);
+    IF to_regclass(v_defecto) IS NOT NULL THEN
+        EXECUTE format('WITH movidas AS (DELETE FROM %I WHERE fecha_hora >= %L AND fecha_hora < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM movidas', v_defecto, v_inicio, v_fin, v_nombre);
+    END IF;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', p_tabla, v_nombre, v_inicio, v_fin);
+    -- Las visitas abiertas movidas desde la partición por defecto vuelven a acceso_abierto
+    IF p_tabla = 'acceso' THEN
+        EXECUTE format('INSERT INTO acceso_abierto (id_vehiculo, id_acceso, fecha_hora) '
+                       'SELECT id_vehiculo, id_acceso, fecha_hora FROM %I '
+                       'WHERE hora_salida IS NULL AND id_vehiculo IS NOT NULL ON CONFLICT DO NOTHING', v_nombre);
+    END IF;
+    RETURN TRUE;
+END;
+$$;
+
+-- 2. ACCESO
+ALTER TABLE alerta DROP CONSTRAINT IF EXISTS alerta_id_acceso_fkey;
+ALTER TABLE pago DROP CONSTRAINT IF EXISTS pago_id_acceso_entrada_fkey;
+ALTER TABLE pago DROP CONSTRAINT IF EXISTS pago_id_acceso_salida_fkey;
+
+ALTER TABLE acceso RENAME TO acceso_legado;
+ALTER SEQUENCE acceso_id_acceso_seq OWNED BY NONE;
+
+CREATE TABLE acceso (
+    id_acceso INTEGER NOT NULL DEFAULT nextval('acceso_id_acceso_seq'),
+    fecha_hora TIMESTAMP NOT NULL DEFAULT NOW(),
+    resultado VARCHAR(50) NOT NULL,
+    observaciones TEXT,
+    id_vehiculo INTEGER,
+    id_punto INTEGER NOT NULL,
+    id_vigilante INTEGER NOT NULL,
+    hora_salida TIMESTAMP DEFAULT NULL,
+    FOREIGN KEY (id_vehiculo) REFERENCES vehiculo(id_vehiculo) ON UPDATE CASCADE ON DELETE RESTRICT,
+    FOREIGN KEY (id_punto) REFERENCES punto_de_control(id_punto) ON UPDATE CASCADE ON DELETE RESTRICT,
+    FOREIGN KEY (id_vigilante) REFERENCES vigilante(id_vigilante) ON UPDATE CASCADE ON DELETE RESTRICT
+) PARTITION BY RANGE (fecha_hora);
+
+CREATE TABLE acceso_pdefault PARTITION OF acceso DEFAULT;
+
+-- 3. AUDITORIA
+ALTER TABLE auditoria RENAME TO auditoria_legado;
+ALTER SEQUENCE auditoria_id_auditoria_seq OWNED BY NONE;
+
+CREATE TABLE auditoria (
+    id_auditoria INTEGER NOT NULL DEFAULT nextval('auditoria_id_auditoria_seq'),
+    fecha_hora TIMESTAMP NOT NULL DEFAULT NOW(),
+    entidad VARCHAR(50) NOT NULL,
+    id_entidad INTEGER NOT NULL,
+    accion VARCHAR(50) NOT NULL,
+    id_usuario INTEGER NOT NULL,
+    datos_previos TEXT,
+    datos_nuevos TEXT,
+    FOREIGN KEY (id_usuario) REFERENCES tmusuarios(nu) ON UPDATE CASCADE ON DELETE RESTRICT
+) PARTITION BY RANGE (fecha_hora);
+
+CREATE TABLE auditoria_pdefault PARTITION OF auditoria DEFAULT;
+
+-- 4. VISITA ABIERTA ÚNICA (reemplaza al índice ux_acceso_abierto de la 003)
+CREATE TABLE acceso_abierto (
+    id_vehiculo INTEGER PRIMARY KEY,
+    id_acceso INTEGER NOT NULL UNIQUE,
+    fecha_hora TIMESTAMP NOT NULL      -- Llave de partición de la visita (la salida poda a un mes)
+);
+
+-- Una segunda entrada abierta del mismo vehículo choca con la PK (unique_violation)
+CREATE OR REPLACE FUNCTION sincronizar_acceso_abierto()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        IF OLD.hora_salida IS NULL THEN
+            DELETE FROM acceso_abierto WHERE id_acceso = OLD.id_acceso;
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        IF NEW.hora_salida IS NULL AND NEW.id_vehiculo IS NOT NULL THEN
+            INSERT INTO acceso_abierto (id_vehiculo, id_acceso, fecha_hora)
+            VALUES (NEW.id_vehiculo, NEW.id_acceso, NEW.fecha_hora);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- 5. PARTICIONES: desde el mes más antiguo con datos hasta 3 meses adelante
+DO $$
+DECLARE
+    v_mes DATE;
+BEGIN
+    FOR v_mes IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(
+                COALESCE((SELECT MIN(fecha_hora) FROM acceso_legado), NOW()),
+                COALESCE((SELECT MIN(fecha_hora) FROM auditoria_legado), NOW()))),
+            date_trunc('month', NOW()) + INTERVAL '3 months',
+            INTERVAL '1 month')::DATE
+    LOOP
+        PERFORM crear_particion_mensual('acceso', v_mes);
+        PERFORM crear_particion_mensual('auditoria', v_mes);
+    END LOOP;
+END;
+$$;
+
+-- 6. COPIA DE DATOS (con verificación de conteos)
+INSERT INTO acceso (id_acceso, fecha_hora, resultado, observaciones, id_vehiculo, id_punto, id_vigilante, hora_salida)
+SELECT id_acceso, fecha_hora, resultado, observaciones, id_vehiculo, id_punto, id_vigilante, hora_salida
+FROM acceso_legado;
+
+INSERT INTO auditoria (id_auditoria, fecha_hora, entidad, id_entidad, accion, id_usuario, datos_previos, datos_nuevos)
+SELECT id_auditoria, fecha_hora, entidad, id_entidad, accion, id_usuario, datos_previos, datos_nuevos
+FROM auditoria_legado;
+
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM acceso) <> (SELECT COUNT(*) FROM acceso_legado)
+       OR (SELECT COUNT(*) FROM auditoria) <> (SELECT COUNT(*) FROM auditoria_legado) THEN
+        RAISE EXCEPTION 'Conteos distintos tras copiar a las tablas particionadas';
+    END IF;
+END;
+$$;
+
+DROP TABLE acceso_legado;
+DROP TABLE auditoria_legado;
+ALTER SEQUENCE acceso_id_acceso_seq OWNED BY acceso.id_acceso;
+ALTER SEQUENCE auditoria_id_auditoria_seq OWNED BY auditoria.id_auditoria;
+
+-- 7. LLAVES E ÍNDICES (después de la carga; se heredan a cada partición, también a las futuras)
+ALTER TABLE acceso ADD PRIMARY KEY (id_acceso, fecha_hora);
+CREATE INDEX ix_acceso_abierto ON acceso (id_vehiculo) WHERE hora_salida IS NULL;
+CREATE INDEX ix_acceso_fecha ON acceso (fecha_hora DESC, id_acceso DESC);
+CREATE INDEX ix_acceso_vehiculo_fecha ON acceso (id_vehiculo, fecha_hora DESC);
+CREATE INDEX ix_acceso_vigilante ON acceso (id_vigilante);
+CREATE INDEX ix_acceso_punto ON acceso (id_punto);
+
+ALTER TABLE auditoria ADD PRIMARY KEY (id_auditoria, fecha_hora);
+CREATE INDEX ix_auditoria_entidad_accion_fecha ON auditoria (entidad, accion, fecha_hora DESC);
+CREATE INDEX ix_auditoria_fecha ON auditoria (fecha_hora DESC, id_auditoria DESC);
+CREATE INDEX ix_auditoria_usuario ON auditoria (id_usuario);
+
+-- 8. VISITAS ABIERTAS ACTUALES Y TRIGGER
+INSERT INTO acceso_abierto (id_vehiculo, id_acceso, fecha_hora)
+SELECT DISTINCT ON (id_vehiculo) id_vehiculo, id_acceso, fecha_hora
+FROM acceso
+WHERE hora_salida IS NULL AND id_vehiculo IS NOT NULL
+ORDER BY id_vehiculo, fecha_hora DESC, id_acceso DESC;
+
+CREATE TRIGGER trg_acceso_abierto
+AFTER INSERT OR DELETE OR UPDATE OF hora_salida, id_vehiculo, fecha_hora ON acceso
+FOR EACH ROW EXECUTE FUNCTION sincronizar_acceso_abierto();
+
+-- 9. TRANSACCIÓN DE GARITA sobre acceso_abierto (la versión de la 004 usaba ON CONFLICT
+--    sobre ux_acceso_abierto, que no existe en la tabla particionada)
+CREATE OR REPLACE FUNCTION registrar_paso_garita(
+    p_placa VARCHAR,
+    p_tipo VARCHAR,               -- 'entrada' | 'salida'
+    p_id_vigilante INTEGER,
+    p_id_punto INTEGER,           -- Punto de control de la entrada
+    p_id_usuario INTEGER,         -- Usuario auditado (NULL = sin auditoría)
+    p_permitir_invitado BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (resultado VARCHAR, detalle VARCHAR, id_acceso INTEGER, invitado BOOLEAN)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+    v_id_vehiculo INTEGER;
+    v_id_acceso INTEGER;
+    v_fecha_entrada TIMESTAMP;
+    v_invitado BOOLEAN := FALSE;
+    v_datos TEXT := json_build_object('placa', p_placa)::TEXT;
+BEGIN
+    -- 1. Vehículo (bloqueado: otra garita con la misma placa espera a que terminemos)
+    SELECT v.id_vehiculo INTO v_id_vehiculo
+    FROM vehiculo v WHERE v.placa = p_placa
+    FOR UPDATE;
+
+    IF v_id_vehiculo IS NULL THEN
+        IF p_tipo = 'salida' THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'No tiene entrada'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        -- Sin registro: solo pasa como invitado si hay un evento activo
+        IF NOT p_permitir_invitado
+           OR NOT EXISTS (SELECT 1 FROM evento e WHERE NOW() BETWEEN e.fecha_inicio AND e.fecha_fin) THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'Vehículo no registrado'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        -- ID 9999 es el usuario 'INVITADO EVENTO'. ON CONFLICT: otra garita lo acaba de crear
+        INSERT INTO vehiculo (placa, tipo, color, id_persona)
+        VALUES (p_placa, 'Invitado', 'Sin especificar', 9999)
+        ON CONFLICT (placa) DO UPDATE SET placa = EXCLUDED.placa
+        RETURNING vehiculo.id_vehiculo INTO v_id_vehiculo;
+        v_invitado := TRUE;
+    END IF;
+
+    -- 2. Salida: cierra la visita abierta (acceso_abierto tiene a lo sumo una por vehículo)
+    IF p_tipo = 'salida' THEN
+        SELECT ab.id_acceso, ab.fecha_hora INTO v_id_acceso, v_fecha_entrada
+        FROM acceso_abierto ab
+        WHERE ab.id_vehiculo = v_id_vehiculo
+        FOR UPDATE;
+        IF v_id_acceso IS NULL THEN
+            RETURN QUERY SELECT 'Denegado'::VARCHAR, 'No tiene entrada'::VARCHAR, NULL::INTEGER, FALSE;
+            RETURN;
+        END IF;
+        UPDATE acceso
+        SET hora_salida = CURRENT_TIMESTAMP, resultado = 'Salida Exitosa'
+        WHERE acceso.id_acceso = v_id_acceso AND acceso.fecha_hora = v_fecha_entrada;   -- fecha_hora: un solo mes
+        IF p_id_usuario IS NOT NULL THEN
+            INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+            VALUES (p_id_usuario, 'ACCESO', v_id_acceso, 'SALIDA', NULL, v_datos, CURRENT_TIMESTAMP);
+        END IF;
+        RETURN QUERY SELECT 'Autorizado'::VARCHAR, 'Salida Exitosa'::VARCHAR, v_id_acceso, FALSE;
+        RETURN;
+    END IF;
+
+    -- 3. Entrada: inserción directa, sin consulta previa. Si ya hay visita abierta, el
+    --    trigger trg_acceso_abierto choca con la PK de acceso_abierto (= ya está dentro)
+    BEGIN
+        INSERT INTO acceso (id_vehiculo, id_punto, id_vigilante, fecha_hora, resultado, hora_salida)
+        VALUES (v_id_vehiculo, p_id_punto, p_id_vigilante, CURRENT_TIMESTAMP, 'Acceso Concedido - Entrada', NULL)
+        RETURNING acceso.id_acceso INTO v_id_acceso;
+    EXCEPTION WHEN unique_violation THEN
+        SELECT ab.id_acceso INTO v_id_acceso FROM acceso_abierto ab WHERE ab.id_vehiculo = v_id_vehiculo;
+        RETURN QUERY SELECT 'Denegado'::VARCHAR, 'Ya está dentro'::VARCHAR, v_id_acceso, FALSE;
+        RETURN;
+    END;
+    IF p_id_usuario IS NOT NULL THEN
+        INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+        VALUES (p_id_usuario, 'ACCESO', v_id_acceso, CASE WHEN v_invitado THEN 'INVITADO' ELSE 'ENTRADA' END,
+                NULL, v_datos, CURRENT_TIMESTAMP);
+    END IF;
+    RETURN QUERY SELECT 'Autorizado'::VARCHAR,
+                        (CASE WHEN v_invitado THEN 'INVITADO EVENTO' ELSE 'Entrada Registrada' END)::VARCHAR,
+                        v_id_acceso, v_invitado;
+END;
+$$;
+
+ANALYZE acceso;
+ANALYZE auditoria;
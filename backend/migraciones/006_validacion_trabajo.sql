@@ -0,0 +1,20 @@
+-- ====================================================================
+-- MIGRACIÓN 006: Estado compartido de los trabajos de validación asíncrona
+-- Con varios workers (gunicorn -w N) el trabajo se encola y procesa en el proceso que
+-- recibió el POST, pero la consulta o el SSE pueden caer en otro: este lo lee de aquí.
+-- UNLOGGED: es estado efímero (vive VALIDACION_TTL segundos), no necesita WAL.
+-- ====================================================================
+
+CREATE UNLOGGED TABLE IF NOT EXISTS validacion_trabajo (
+    id_trabajo CHAR(32) PRIMARY KEY,
+    estado VARCHAR(20) NOT NULL,
+    prioridad INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    resultado JSONB,
+    status INTEGER,
+    creado TIMESTAMPTZ NOT NULL,
+    terminado TIMESTAMPTZ
+);
+
+-- Purga de vencidos (core/cola_validaciones.py) sin recorrer la tabla
+CREATE INDEX IF NOT EXISTS ix_validacion_trabajo_vence ON validacion_trabajo ((COALESCE(terminado, creado)));
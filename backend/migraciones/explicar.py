@@ -0,0 +1,168 @@
+# backend/migraciones/explicar.py
+# Planes de ejecución (EXPLAIN ANALYZE) de las consultas calientes, para comparar antes y
+# después de una migración de índices sobre un volumen de datos realista.
+# Uso (SIEMPRE sobre una BD de pruebas, --sembrar inserta datos masivos):
+#   python migraciones/explicar.py --sembrar 2000000           (accesos; auditoría y novedades en proporción)
+#   python migraciones/explicar.py --salida antes.json
+#   python migraciones/migrar.py
+#   python migraciones/explicar.py --salida despues.json --comparar antes.json
+import os
+import sys
+import json
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.db.connection import get_connection
+
+# ==============================================================================
+# 1. CONSULTAS (mismas formas que usan los modelos y controladores)
+# ==============================================================================
+HOY = date.today()
+SEMANA = (HOY - timedelta(days=7), HOY)
+
+CONSULTAS = {
+    # Reporte por rango: forma anterior (DATE() sobre la columna, no usa índices) y la actual
+    "reporte_accesos_date()": ("""
+        SELECT a.fecha_hora, v.placa, a.resultado FROM acceso a
+        LEFT JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+        WHERE DATE(a.fecha_hora) BETWEEN %s AND %s ORDER BY a.fecha_hora DESC
+    """, SEMANA),
+    "reporte_accesos": ("""
+        SELECT a.fecha_hora, v.placa, a.resultado FROM acceso a
+        LEFT JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+        WHERE a.fecha_hora >= %s::date AND a.fecha_hora < %s::date + 1 ORDER BY a.fecha_hora DESC
+    """, SEMANA),
+    "reporte_alertas_resueltas": ("""
+        SELECT au.fecha_hora, au.datos_nuevos FROM auditoria au
+        WHERE au.entidad = 'ALERTA' AND au.accion = 'RESOLVER_ALERTA'
+          AND au.fecha_hora >= %s::date AND au.fecha_hora < %s::date + 1
+    """, SEMANA),
+    "reporte_novedades": ("""
+        SELECT n.fecha_hora, n.asunto FROM novedad n
+        WHERE n.fecha_hora >= %s::date AND n.fecha_hora < %s::date + 1 ORDER BY n.fecha_hora DESC
+    """, SEMANA),
+    # Garita: ¿el vehículo tiene una visita abierta?
+    "visita_abierta": ("""
+        SELECT id_acceso FROM acceso
+        WHERE id_vehiculo = (SELECT MIN(id_vehiculo) FROM vehiculo) AND hora_salida IS NULL
+        ORDER BY fecha_hora DESC LIMIT 1
+    """, ()),
+    # Dashboard: ocupación actual
+    "ocupacion": ("""
+        SELECT COUNT(*) FROM acceso a JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+        WHERE a.hora_salida IS NULL
+    """, ()),
+    "patio_hoy": ("SELECT COUNT(*) FROM acceso WHERE hora_salida IS NULL AND fecha_hora >= CURRENT_DATE", ()),
+    # Historiales: últimas filas
+    "ultimos_accesos": ("SELECT id_acceso FROM acceso ORDER BY fecha_hora DESC, id_acceso DESC LIMIT 50", ()),
+    "ultima_auditoria": ("SELECT id_auditoria FROM auditoria ORDER BY fecha_hora DESC, id_auditoria DESC LIMIT 50", ()),
+    "evento_activo": ("SELECT COUNT(*) FROM evento WHERE NOW() BETWEEN fecha_inicio AND fecha_fin", ()),
+}
+
+# ==============================================================================
+# 2. DATOS DE PRUEBA
+# ==============================================================================
+def sembrar(cur, accesos):
+    """
+    Inserta 'accesos' visitas cerradas repartidas en el último año sobre los vehículos,
+    puntos y vigilantes existentes, más auditoría (1 por cada 2 accesos) y novedades.
+    Las visitas abiertas reales no se tocan: el índice parcial debe seguir pequeño.
+    """
+    # Con tablas particionadas (migraciones/005) cada mes sembrado necesita su partición
+    cur.execute("SELECT to_regprocedure('crear_particion_mensual(text, date)') IS NOT NULL")
+    if cur.fetchone()[0]:
+        cur.execute("""
+            SELECT crear_particion_mensual(t.tabla, m::DATE)
+            FROM (VALUES ('acceso'), ('auditoria')) AS t(tabla),
+                 generate_series(date_trunc('month', NOW() - INTERVAL '365 days'), date_trunc('month', NOW()), INTERVAL '1 month') AS m
+        """)
+    cur.execute("""
+        INSERT INTO acceso (fecha_hora, resultado, id_vehiculo, id_punto, id_vigilante, hora_salida)
+        SELECT t, CASE WHEN random() < 0.9 THEN 'Autorizado' ELSE 'Denegado' END,
+               v.ids[1 + g %% array_length(v.ids, 1)],
+               (SELECT MIN(id_punto) FROM punto_de_control),
+               (SELECT MIN(id_vigilante) FROM vigilante),
+               t + (random() * INTERVAL '10 hours')
+        FROM (SELECT g, NOW() - random() * INTERVAL '365 days' AS t FROM generate_series(1, %s) g) s,
+             (SELECT ARRAY_AGG(id_vehiculo) AS ids FROM vehiculo) v
+    """, (accesos,))
+    cur.execute("""
+        INSERT INTO auditoria (fecha_hora, entidad, id_entidad, accion, id_usuario, datos_nuevos)
+        SELECT NOW() - random() * INTERVAL '365 days',
+               CASE WHEN g %% 10 = 0 THEN 'ALERTA' ELSE 'ACCESO' END, g,
+               CASE WHEN g %% 10 = 0 THEN 'RESOLVER_ALERTA' ELSE 'ENTRADA' END,
+               (SELECT MIN(nu) FROM tmusuarios), '{}'
+        FROM generate_series(1, %s) g
+    """, (accesos // 2,))
+    cur.execute("""
+        INSERT INTO novedad (asunto, descripcion, fecha_hora, id_usuario)
+        SELECT 'Prueba', 'Novedad sembrada', NOW() - random() * INTERVAL '365 days', (SELECT MIN(nu) FROM tmusuarios)
+        FROM generate_series(1, %s) g
+    """, (max(1, accesos // 50),))
+    cur.execute("ANALYZE acceso; ANALYZE auditoria; ANALYZE novedad;")
+
+# ==============================================================================
+# 3. PLANES
+# ==============================================================================
+def _nodos(plan, encontrados):
+    """Recorre el árbol del plan y junta los accesos a tablas (Seq Scan / Index Scan ...)."""
+    if "Relation Name" in plan or "Index Name" in plan:
+        encontrados.append(f"{plan['Node Type']} {plan.get('Index Name') or plan.get('Relation Name')}")
+    for hijo in plan.get("Plans", []):
+        _nodos(hijo, encontrados)
+    return encontrados
+
+def explicar(cur):
+    resultados = {}
+    for nombre, (sql, params) in CONSULTAS.items():
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        plan = cur.fetchone()[0][0]
+        resultados[nombre] = {
+            "tiempo_ms": round(plan["Execution Time"], 2),
+            "lecturas": plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0),
+            "nodos": _nodos(plan["Plan"], []),
+            "plan": plan,
+        }
+    return resultados
+
+def imprimir(resultados, base=None):
+    for nombre, r in resultados.items():
+        linea = f"📊 {nombre:<28} {r['tiempo_ms']:>10} ms  {r['lecturas']:>8} bloques  {', '.join(r['nodos'])}"
+        if base and nombre in base:
+            antes = base[nombre]["tiempo_ms"]
+            linea += f"\n   antes {antes} ms ({', '.join(base[nombre]['nodos'])}) -> x{round(antes / r['tiempo_ms'], 1) if r['tiempo_ms'] else '-'}"
+        print(linea)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE de las consultas calientes")
+    parser.add_argument("--sembrar", type=int, metavar="N", help="Inserta N accesos de prueba antes de medir")
+    parser.add_argument("--salida", help="Ruta del JSON con los planes")
+    parser.add_argument("--comparar", help="JSON de una corrida previa (antes de migrar)")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    if conn is None:
+        sys.exit(1)
+    try:
+        cur = conn.cursor()
+        if args.sembrar:
+            print(f"🌱 Sembrando {args.sembrar} accesos de prueba...")
+            sembrar(cur, args.sembrar)
+            conn.commit()
+        resultados = explicar(cur)
+        conn.rollback()
+        cur.close()
+    finally:
+        conn.close()
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir(resultados, base)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"💾 Planes guardados en {args.salida}")
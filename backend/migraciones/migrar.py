@@ -0,0 +1,145 @@
+# backend/migraciones/migrar.py
+# Aplica en orden los archivos NNN_*.sql de esta carpeta que la BD aún no tiene y los
+# registra en schema_migraciones (versión, nombre, checksum, fecha).
+# Uso:
+#   python migraciones/migrar.py              (aplica las pendientes)
+#   python migraciones/migrar.py --estado     (solo lista aplicadas/pendientes)
+#   python migraciones/migrar.py --base       (BD recién creada con bd_carros.sql, que ya
+#                                               incluye todas: las marca sin ejecutarlas)
+#
+# Cada archivo corre en UNA transacción, salvo los marcados con '-- sin-transaccion'
+# (CREATE INDEX CONCURRENTLY no se permite dentro de una): esos se ejecutan sentencia
+# por sentencia en autocommit y deben ser idempotentes (IF NOT EXISTS) por si se cortan.
+import os
+import re
+import sys
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.db.connection import get_connection
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+PATRON = re.compile(r"^(\d{3})_.+\.sql$")
+
+SQL_TABLA = """
+    CREATE TABLE IF NOT EXISTS schema_migraciones (
+        version VARCHAR(10) PRIMARY KEY,
+        nombre VARCHAR(150) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        aplicada_en TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+"""
+
+# ==============================================================================
+# 1. ARCHIVOS
+# ==============================================================================
+def listar_migraciones():
+    """Retorna [(version, nombre, ruta)] ordenado por versión."""
+    archivos = []
+    for nombre in sorted(os.listdir(CARPETA)):
+        m = PATRON.match(nombre)
+        if m:
+            archivos.append((m.group(1), nombre, os.path.join(CARPETA, nombre)))
+    return archivos
+
+def checksum(sql):
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+def sin_transaccion(sql):
+    return re.search(r"^--\s*sin-transaccion", sql, re.M | re.I) is not None
+
+def separar_sentencias(sql):
+    """Para archivos sin transacción (solo DDL simple: sin funciones con $$ ni ';' en literales)."""
+    limpio = "\n".join(l for l in sql.splitlines() if not l.strip().startswith("--"))
+    return [s.strip() for s in limpio.split(";") if s.strip()]
+
+# ==============================================================================
+# 2. EJECUCIÓN
+# ==============================================================================
+def aplicadas(cur):
+    cur.execute(SQL_TABLA)
+    cur.execute("SELECT version, nombre, checksum FROM schema_migraciones ORDER BY version")
+    return {v: (n, c) for v, n, c in cur.fetchall()}
+
+def aplicar(conn, version, nombre, sql):
+    cur = conn.cursor()
+    if sin_transaccion(sql):
+        conn.autocommit = True
+        try:
+            for sentencia in separar_sentencias(sql):
+                print(f"   ↳ {sentencia.splitlines()[0][:90]}")
+                cur.execute(sentencia)
+            # Un índice que quedó INVALID (ej. duplicados al crear uno único) no cuenta como aplicado
+            invalidos = indices_invalidos(cur)
+            if invalidos:
+                raise RuntimeError(f"índices inválidos: {', '.join(invalidos)} "
+                                   "(corrija la causa, bórrelos con DROP INDEX CONCURRENTLY y vuelva a migrar)")
+            cur.execute("INSERT INTO schema_migraciones (version, nombre, checksum) VALUES (%s, %s, %s)",
+                        (version, nombre, checksum(sql)))
+        finally:
+            conn.autocommit = False
+    else:
+        cur.execute(sql)
+        cur.execute("INSERT INTO schema_migraciones (version, nombre, checksum) VALUES (%s, %s, %s)",
+                    (version, nombre, checksum(sql)))
+        conn.commit()
+    cur.close()
+
+def indices_invalidos(cur):
+    """Un CREATE INDEX CONCURRENTLY interrumpido deja el índice INVALID (y IF NOT EXISTS lo salta)."""
+    cur.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid
+    """)
+    return [r[0] for r in cur.fetchall()]
+
+def migrar(solo_estado=False, base=False):
+    conn = get_connection()
+    if conn is None:
+        return False
+    try:
+        cur = conn.cursor()
+        hechas = aplicadas(cur)
+        conn.commit()
+        pendientes = []
+        for version, nombre, ruta in listar_migraciones():
+            with open(ruta, encoding="utf-8") as f:
+                sql = f.read()
+            if version in hechas:
+                marca = "✅" if hechas[version][1] == checksum(sql) else "⚠️ (modificada después de aplicarse)"
+                print(f"{marca} {nombre}")
+            else:
+                print(f"⏳ {nombre}")
+                pendientes.append((version, nombre, sql))
+        if solo_estado:
+            return True
+        if base:
+            for version, nombre, sql in pendientes:
+                cur.execute("INSERT INTO schema_migraciones (version, nombre, checksum) VALUES (%s, %s, %s)",
+                            (version, nombre, checksum(sql)))
+            conn.commit()
+            print(f"📌 {len(pendientes)} migración(es) marcadas como aplicadas")
+            return True
+
+        for version, nombre, sql in pendientes:
+            print(f"🚀 Aplicando {nombre}...")
+            try:
+                aplicar(conn, version, nombre, sql)
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Falló {nombre}: {e}")
+                return False
+        cur.close()
+        print(f"🏁 {len(pendientes)} migración(es) aplicada(s)")
+        return True
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica las migraciones SQL pendientes")
+    parser.add_argument("--estado", action="store_true", help="Solo muestra aplicadas y pendientes")
+    parser.add_argument("--base", action="store_true", help="Marca las pendientes como aplicadas sin ejecutarlas")
+    args = parser.parse_args()
+    sys.exit(0 if migrar(solo_estado=args.estado, base=args.base) else 1)
@@ -1,25 +1,31 @@
 # backend/models/acceso.py
+import psycopg2
+import psycopg2.errors
 from core.db.connection import get_connection
 
+ID_PUNTO_ENTRADA = 1   # Según el SQL: id_punto 1 = 'Entrada'
+
 def verificar_vehiculo_dentro(placa):
     """
     Busca si hay un registro de esta placa que tenga fecha de entrada 
     pero NO tenga fecha de salida (hora_salida IS NULL).
     """
     conn = get_connection()
-    cur = conn.cursor()
-    
-    # Buscamos la última entrada que tenga salida NULL (vacía)
-    sql = """
-        SELECT a.id_acceso 
-        FROM acceso a
-        JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
-        WHERE v.placa = %s AND a.hora_salida IS NULL
-    """
-    cur.execute(sql, (placa,))
-    resultado = cur.fetchone()
-    cur.close()
-    conn.close()
+    try:
+        cur = conn.cursor()
+
+        # Buscamos la última entrada que tenga salida NULL (vacía)
+        sql = """
+            SELECT a.id_acceso 
+            FROM acceso a
+            JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+            WHERE v.placa = %s AND a.hora_salida IS NULL
+        """
+        cur.execute(sql, (placa,))
+        resultado = cur.fetchone()
+        cur.close()
+    finally:
+        conn.close()
     
     if resultado:
         return resultado[0] # Retorna el ID del acceso pendiente
@@ -52,42 +58,86 @@ def registrar_salida_db(id_acceso):
 
 def registrar_entrada_db(placa, id_vigilante):
     """
-    Crea un nuevo registro de acceso.
-    CORREGIDO: No inserta id_persona (no existe en tabla acceso).
-    CORREGIDO: Inserta id_punto (obligatorio).
+    Crea un nuevo registro de acceso en UNA sentencia: busca el vehículo e inserta la
+    entrada solo si no tiene una visita abierta. El índice único ux_acceso_abierto
+    (migraciones/003; desde la 005, la tabla acceso_abierto) resuelve la carrera entre
+    dos garitas: la segunda inserción choca y no inserta nada.
+    Status: 'ok', 'dentro' (ya tiene visita abierta) o 'error'.
     """
     conn = get_connection()
     cur = conn.cursor()
     try:
-        # 1. Obtener ID Vehiculo (validamos que exista)
-        cur.execute("SELECT id_vehiculo FROM vehiculo WHERE placa = %s", (placa,))
-        vehiculo = cur.fetchone()
-        
-        if not vehiculo:
-            return {"status": "error", "mensaje": "Vehículo no registrado"}
-
-        id_vehiculo = vehiculo[0]
-        
-        # DEFINICIÓN DE PUNTO DE CONTROL
-        # Según tu SQL: id_punto 1 = 'Entrada'
-        ID_PUNTO_ENTRADA = 1 
-
-        # 2. Insertar Entrada
-        # Eliminamos 'id_persona' de la lista de columnas
-        # Agregamos 'id_punto'
+        # NOT EXISTS evita el intento (y sirve si la BD aún no tiene la 003);
+        # ON CONFLICT DO NOTHING cubre la inserción simultánea de otra garita
         sql = """
-            INSERT INTO acceso (id_vehiculo, id_punto, id_vigilante, fecha_hora, resultado, hora_salida)
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, 'Acceso Concedido - Entrada', NULL)
+            WITH v AS (
+                SELECT id_vehiculo FROM vehiculo WHERE placa = %s
+            ), nueva AS (
+                INSERT INTO acceso (id_vehiculo, id_punto, id_vigilante, fecha_hora, resultado, hora_salida)
+                SELECT v.id_vehiculo, %s, %s, CURRENT_TIMESTAMP, 'Acceso Concedido - Entrada', NULL
+                FROM v
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM acceso a WHERE a.id_vehiculo = v.id_vehiculo AND a.hora_salida IS NULL
+                )
+                ON CONFLICT DO NOTHING
+                RETURNING id_acceso
+            )
+            SELECT (SELECT id_vehiculo FROM v), (SELECT id_acceso FROM nueva)
         """
-        
-        cur.execute(sql, (id_vehiculo, ID_PUNTO_ENTRADA, id_vigilante))
+        cur.execute(sql, (placa, ID_PUNTO_ENTRADA, id_vigilante))
+        id_vehiculo, id_acceso = cur.fetchone()
         conn.commit()
-        
-        return {"status": "ok", "mensaje": "Entrada registrada"}
+
+        if id_vehiculo is None:
+            return {"status": "error", "mensaje": "Vehículo no registrado"}
+        if id_acceso is None:
+            return {"status": "dentro", "mensaje": "Ya está dentro"}
+        return {"status": "ok", "mensaje": "Entrada registrada", "id_acceso": id_acceso}
+    except psycopg2.errors.UniqueViolation:
+        # Con acceso particionado (migraciones/005) la unicidad la impone el trigger sobre
+        # acceso_abierto, que ON CONFLICT no absorbe: el choque también es "ya está dentro"
+        conn.rollback()
+        return {"status": "dentro", "mensaje": "Ya está dentro"}
     except Exception as e:
         conn.rollback()
         print(f"Error SQL registrar_entrada: {e}")
         return {"status": "error", "mensaje": str(e)}
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# ==========================================================
+# TRANSACCIÓN DE GARITA (Un solo viaje a la BD)
+# ==========================================================
+def registrar_paso_garita(placa, tipo_acceso, id_vigilante, id_usuario_auditoria=None, permitir_invitado=True):
+    """
+    Entrada o salida completa en una sola transacción (función SQL registrar_paso_garita,
+    migraciones/001): busca el vehículo, revisa la visita abierta, registra al invitado si
+    hay evento activo, inserta/actualiza el acceso y escribe la auditoría.
+    La sentencia corre en autocommit: un solo viaje de ida y vuelta, sin COMMIT aparte.
+    Retorna {'resultado', 'detalle', 'id_acceso', 'invitado'}; None si falló la BD y
+    {'resultado': None, 'sin_funcion': True} si la BD aún no tiene la migración.
+    """
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT resultado, detalle, id_acceso, invitado FROM registrar_paso_garita(%s, %s, %s, %s, %s, %s)",
+            (placa, tipo_acceso, id_vigilante, ID_PUNTO_ENTRADA, id_usuario_auditoria, permitir_invitado)
+        )
+        fila = cur.fetchone()
+        cur.close()
+        return {"resultado": fila[0], "detalle": fila[1], "id_acceso": fila[2], "invitado": fila[3]}
+    except psycopg2.errors.UndefinedFunction:
+        print("⚠️ Falta la función registrar_paso_garita (aplique las migraciones: python migraciones/migrar.py)")
+        return {"resultado": None, "sin_funcion": True}
+    except Exception as e:
+        print(f"Error SQL registrar_paso_garita: {e}")
+        return None
+    finally:
+        if not conn.closed:
+            conn.autocommit = False
+        conn.close()
@@ -2,6 +2,7 @@
 import json
 from core.db.connection import get_connection
 from psycopg2.extras import RealDictCursor
+from core.paginacion import tamano_pagina, clausula_keyset, clausula_limite, cortar_pagina
 # --- IMPORTAR AUDITORÍA ---
 from core.auditoria_utils import registrar_auditoria_global
 
@@ -10,6 +11,7 @@ from core.auditoria_utils import registrar_auditoria_global
 # ==========================================================
 def obtener_datos_dashboard():
     """Resumen de datos generales para administrador"""
+    conn = None
     try:
         conn = get_connection()
         cur = conn.cursor()
@@ -20,32 +22,46 @@ def obtener_datos_dashboard():
         cur.execute("SELECT COUNT(*) FROM alerta;")
         total_alertas = cur.fetchone()[0]
         cur.close()
-        conn.close()
         return {"total_vehiculos": total_vehiculos, "total_accesos": total_accesos, "total_alertas": total_alertas}
     except Exception as e:
         print("❌ Error en dashboard:", e)
         return {}
+    finally:
+        if conn: conn.close()
 
-def obtener_accesos_detalle():
-    """Lista todos los accesos recientes"""
+def obtener_accesos_detalle(llave=None, limite=None):
+    """
+    Accesos del más reciente al más antiguo: una página, o todos si 'limite' es None.
+    Retorna (filas, cursor_siguiente).
+    """
+    limite = tamano_pagina(limite)
+    conn = None
     try:
         conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
+        params = []
+        keyset = clausula_keyset("a.fecha_hora", "a.id_acceso", llave, params)
+        tope = clausula_limite(limite, params)
+        cur.execute(f"""
             SELECT v.placa, v.tipo, v.color, p.nombre AS propietario, a.resultado, 
-                   TO_CHAR(a.fecha_hora, 'YYYY-MM-DD HH24:MI') as fecha
+                   TO_CHAR(a.fecha_hora, 'YYYY-MM-DD HH24:MI') as fecha,
+                   a.fecha_hora AS _orden_fecha, a.id_acceso AS _orden_id
             FROM acceso a
             JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
             JOIN persona p ON v.id_persona = p.id_persona
-            ORDER BY a.fecha_hora DESC;
-        """)
-        data = cur.fetchall()
+            WHERE TRUE{keyset}
+            ORDER BY a.fecha_hora DESC, a.id_acceso DESC{tope};
+        """, params)
+        data, siguiente = cortar_pagina(cur.fetchall(), limite, lambda f: (f["_orden_fecha"], f["_orden_id"]))
         cur.close()
-        conn.close()
-        return data
+        for fila in data:
+            del fila["_orden_fecha"], fila["_orden_id"]
+        return data, siguiente
     except Exception as e:
         print("❌ Error en accesos:", e)
-        return []
+        return [], None
+    finally:
+        if conn: conn.close()
 
 # ==========================================================
 # 2. GESTIÓN DE PERSONAL (VIGILANTES/ADMINS)
@@ -55,6 +71,7 @@ def obtener_todos_vigilantes():
     """
     Obtiene la lista combinando datos de 'vigilante' y 'tmusuarios'.
     """
+    conn = None
     try:
         conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -80,11 +97,12 @@ def obtener_todos_vigilantes():
         cur.execute(query)
         data = cur.fetchall()
         cur.close()
-        conn.close()
         return data
     except Exception as e:
         print("❌ Error listando personal:", e)
         return []
+    finally:
+        if conn: conn.close()
 
 def registrar_vigilante_completo(data, id_admin_responsable):
     """
@@ -261,13 +279,15 @@ def obtener_data_reporte_completo(fecha_inicio, fecha_fin):
     try:
         cur = conn.cursor(cursor_factory=RealDictCursor)
 
+        # Rangos semiabiertos [inicio, fin + 1 día): DATE(fecha_hora) impedía usar los índices por fecha
+
         # 1. ESTADÍSTICAS
         sql_stats = """
             SELECT 
                 COUNT(*) as total_movimientos,
                 SUM(CASE WHEN resultado ILIKE '%%Autorizado%%' THEN 1 ELSE 0 END) as autorizados,
                 SUM(CASE WHEN resultado ILIKE '%%Denegado%%' THEN 1 ELSE 0 END) as denegados
-            FROM acceso WHERE DATE(fecha_hora) BETWEEN %s AND %s
+            FROM acceso WHERE fecha_hora >= %s::date AND fecha_hora < %s::date + 1
         """
         cur.execute(sql_stats, (fecha_inicio, fecha_fin))
         data["estadisticas"] = cur.fetchone()
@@ -275,7 +295,7 @@ def obtener_data_reporte_completo(fecha_inicio, fecha_fin):
         # 2. HORA PICO
         sql_pico = """
             SELECT EXTRACT(HOUR FROM fecha_hora) as hora, COUNT(*) as cantidad
-            FROM acceso WHERE DATE(fecha_hora) BETWEEN %s AND %s
+            FROM acceso WHERE fecha_hora >= %s::date AND fecha_hora < %s::date + 1
             GROUP BY hora ORDER BY cantidad DESC LIMIT 1
         """
         cur.execute(sql_pico, (fecha_inicio, fecha_fin))
@@ -287,7 +307,7 @@ def obtener_data_reporte_completo(fecha_inicio, fecha_fin):
             FROM acceso a
             LEFT JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
             LEFT JOIN tmusuarios u ON a.id_vigilante = u.nu
-            WHERE DATE(a.fecha_hora) BETWEEN %s AND %s ORDER BY a.fecha_hora DESC
+            WHERE a.fecha_hora >= %s::date AND a.fecha_hora < %s::date + 1 ORDER BY a.fecha_hora DESC
         """
         cur.execute(sql_accesos, (fecha_inicio, fecha_fin))
         data["accesos"] = cur.fetchall()
@@ -296,7 +316,7 @@ def obtener_data_reporte_completo(fecha_inicio, fecha_fin):
         sql_alertas = """
             SELECT TO_CHAR(au.fecha_hora, 'YYYY-MM-DD HH24:MI') as fecha_resolucion, u.nombre as resolutor, au.datos_previos, au.datos_nuevos
             FROM auditoria au JOIN tmusuarios u ON au.id_usuario = u.nu
-            WHERE au.entidad = 'ALERTA' AND au.accion = 'RESOLVER_ALERTA' AND DATE(au.fecha_hora) BETWEEN %s AND %s
+            WHERE au.entidad = 'ALERTA' AND au.accion = 'RESOLVER_ALERTA' AND au.fecha_hora >= %s::date AND au.fecha_hora < %s::date + 1
         """
         cur.execute(sql_alertas, (fecha_inicio, fecha_fin))
         data["alertas_resueltas"] = cur.fetchall()
@@ -305,7 +325,7 @@ def obtener_data_reporte_completo(fecha_inicio, fecha_fin):
         sql_novedades = """
             SELECT TO_CHAR(n.fecha_hora, 'YYYY-MM-DD HH24:MI') as fecha, n.asunto, n.descripcion, u.nombre as vigilante
             FROM novedad n JOIN tmusuarios u ON n.id_usuario = u.nu
-            WHERE DATE(n.fecha_hora) BETWEEN %s AND %s ORDER BY n.fecha_hora DESC
+            WHERE n.fecha_hora >= %s::date AND n.fecha_hora < %s::date + 1 ORDER BY n.fecha_hora DESC
         """
         cur.execute(sql_novedades, (fecha_inicio, fecha_fin))
         data["novedades"] = cur.fetchall()
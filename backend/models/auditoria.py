@@ -7,19 +7,25 @@ from psycopg2.extras import RealDictCursor
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core.db.connection import get_connection
+from core.paginacion import tamano_pagina, clausula_keyset, clausula_limite, cortar_pagina
 
-def obtener_historial_auditoria():
+def obtener_historial_auditoria(llave=None, limite=None):
     """
-    Obtiene todos los registros del historial de auditoría.
+    Obtiene una página del historial de auditoría (ver core/paginacion.py), o todo el
+    historial si 'limite' es None. Retorna (registros, cursor_siguiente o None).
     SOLUCIÓN DE HORA: Usamos TO_CHAR para formatear la fecha directamente desde la BD.
     """
+    limite = tamano_pagina(limite)
     conn = None
     try:
         conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
+        params = []
+        keyset = clausula_keyset("a.fecha_hora", "a.id_auditoria", llave, params)
+        tope = clausula_limite(limite, params)
         
         # --- AQUÍ ESTÁ EL CAMBIO CLAVE (TO_CHAR) ---
-        query = """
+        query = f"""
             SELECT 
                 a.id_auditoria,
                 TO_CHAR(a.fecha_hora, 'YYYY-MM-DD HH12:MI:SS AM') as fecha_hora, -- Formato fijo texto
@@ -29,20 +35,24 @@ def obtener_historial_auditoria():
                 a.accion,
                 a.datos_previos,
                 a.datos_nuevos,
-                a.id_usuario
+                a.id_usuario,
+                a.fecha_hora AS _orden_fecha
             FROM 
                 auditoria a
             LEFT JOIN 
                 tmusuarios u ON a.id_usuario = u.nu
+            WHERE TRUE{keyset}
             ORDER BY 
-                a.fecha_hora DESC;
+                a.fecha_hora DESC, a.id_auditoria DESC{tope};
         """
         
-        cur.execute(query)
-        historial = cur.fetchall()
+        cur.execute(query, params)
+        historial, siguiente = cortar_pagina(cur.fetchall(), limite, lambda f: (f["_orden_fecha"], f["id_auditoria"]))
+        for fila in historial:
+            del fila["_orden_fecha"]
         
         cur.close()
-        return historial
+        return historial, siguiente
         
     except Exception as e:
         print(f"❌ Error en models/auditoria.py: {e}")
@@ -54,9 +64,9 @@ def obtener_historial_auditoria():
 if __name__ == "__main__":
     try:
         print("Probando obtener_historial_auditoria...")
-        historial = obtener_historial_auditoria()
+        historial, siguiente = obtener_historial_auditoria()
         if historial:
-            print(f"✅ Se obtuvieron {len(historial)} registros.")
+            print(f"✅ Se obtuvieron {len(historial)} registros (más páginas: {'sí' if siguiente else 'no'}).")
             print("Fecha del primer registro:", historial[0]['fecha_hora'])
     except Exception as e:
         print(f"⚠️  Error en la prueba: {e}")
\ No newline at end of file
@@ -1,6 +1,7 @@
 from core.db.connection import get_connection
 
 def verificar_usuario(usuario, clave, rol):
+    conn = None
     try:
         conn = get_connection()
         cur = conn.cursor()
@@ -16,7 +17,6 @@ def verificar_usuario(usuario, clave, rol):
         result = cur.fetchone()
 
         cur.close()
-        conn.close()
 
         print("🔍 Resultado BD:", result)
         print("🧩 Rol recibido:", rol)
@@ -51,4 +51,6 @@ def verificar_usuario(usuario, clave, rol):
 
     except Exception as e:
         print("❌ Error en verificar_usuario:", e)
-        return None
\ No newline at end of file
+        return None
+    finally:
+        if conn: conn.close()
\ No newline at end of file
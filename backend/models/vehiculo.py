@@ -57,6 +57,9 @@ def registrar_vehiculo_invitado_db(placa):
         """
         cur.execute(sql, (placa.upper(),))
         conn.commit()
+        # Import local: evita cargar ocr.detector (OpenCV) en quien solo usa los modelos
+        from core.indice_placas import indice_placas
+        indice_placas.agregar(placa)
         return True
     except Exception as e:
         conn.rollback()
@@ -0,0 +1,219 @@
+# backend/ocr/backend_onnx.py
+# Backend ONNX Runtime para EasyOCR: el detector CRAFT y el reconocedor se exportan a ONNX
+# (opcionalmente int8) y se ejecutan con onnxruntime en CPU, en lugar de PyTorch eager.
+# Se conserva el pre/post-procesamiento de EasyOCR: solo se reemplazan reader.detector y
+# reader.recognizer por adaptadores con la misma firma (verificado contra EasyOCR 1.7).
+#
+# Uso:
+#   python ocr/backend_onnx.py exportar [--sin-int8]            (una vez, con torch instalado)
+#   python ocr/backend_onnx.py paridad --dir corpus_sintetico    (torch vs onnx sobre el corpus)
+#   OCR_BACKEND=onnx python server.py
+import os
+import sys
+import json
+import argparse
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+OCR_ONNX_DIR = os.getenv("OCR_ONNX_DIR", os.path.join(os.path.dirname(__file__), "modelos_onnx"))
+# 1 = usar los modelos cuantizados int8 si existen (menos RAM y más rápido en CPU)
+OCR_ONNX_INT8 = os.getenv("OCR_ONNX_INT8", "1") == "1"
+# Hilos intra-op de onnxruntime (0 = los que decida ORT). Con varios workers conviene 1-2.
+OCR_ONNX_HILOS = int(os.getenv("OCR_ONNX_HILOS", "0"))
+
+IDIOMAS = ['es', 'en']
+ARCHIVOS = {'detector': "detector", 'reconocedor': "reconocedor"}
+
+def ruta_modelo(nombre, int8=False, directorio=None):
+    return os.path.join(directorio or OCR_ONNX_DIR, f"{ARCHIVOS[nombre]}{'.int8' if int8 else ''}.onnx")
+
+# ==============================================================================
+# 2. ADAPTADORES (misma interfaz que los módulos torch que reemplazan)
+# ==============================================================================
+def _opciones_sesion():
+    import onnxruntime as ort
+    opciones = ort.SessionOptions()
+    opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    opciones.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if OCR_ONNX_HILOS > 0:
+        opciones.intra_op_num_threads = OCR_ONNX_HILOS
+    return opciones
+
+def _sesion(ruta):
+    import onnxruntime as ort
+    return ort.InferenceSession(ruta, _opciones_sesion(), providers=["CPUExecutionProvider"])
+
+class DetectorOnnx:
+    """Reemplaza a CRAFT: easyocr.detection.test_net hace 'y, feature = net(x)'."""
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.sesion = _sesion(ruta)
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        import torch
+        mapas, caracteristicas = self.sesion.run(None, {"imagen": x.cpu().numpy()})
+        return torch.from_numpy(mapas), torch.from_numpy(caracteristicas)
+
+class ReconocedorOnnx:
+    """Reemplaza al reconocedor CRNN: recognizer_predict llama model.eval() y model(imagen, texto)."""
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.sesion = _sesion(ruta)
+
+    def eval(self):
+        return self
+
+    def __call__(self, imagen, texto=None):
+        import torch
+        logits, = self.sesion.run(None, {"imagen": imagen.cpu().numpy()})
+        return torch.from_numpy(logits)
+
+def modelos_disponibles(int8=None, directorio=None):
+    """Rutas (detector, reconocedor) a usar, o None si falta alguna."""
+    int8 = OCR_ONNX_INT8 if int8 is None else int8
+    rutas = []
+    for nombre in ARCHIVOS:
+        ruta = ruta_modelo(nombre, int8, directorio)
+        if int8 and not os.path.exists(ruta):
+            ruta = ruta_modelo(nombre, False, directorio)   # Sin versión int8: usamos fp32
+        if not os.path.exists(ruta):
+            return None
+        rutas.append(ruta)
+    return tuple(rutas)
+
+def crear_reader_onnx(directorio=None):
+    """
+    Construye un easyocr.Reader sin cargar los pesos de CRAFT en torch y le inyecta
+    los adaptadores ONNX. Lanza una excepción si faltan los modelos exportados.
+    """
+    rutas = modelos_disponibles(directorio=directorio)
+    if rutas is None:
+        raise FileNotFoundError(f"No hay modelos ONNX en {directorio or OCR_ONNX_DIR} (ejecute 'backend_onnx.py exportar')")
+
+    import easyocr
+    from easyocr import detection
+    # detector=False evita cargar CRAFT en torch; el reconocedor torch se carga porque
+    # el Reader arma ahí el conversor CTC, y luego se descarta.
+    reader = easyocr.Reader(IDIOMAS, gpu=False, quantize=False, detector=False)
+    reader.get_textbox = detection.get_textbox
+    reader.detector = DetectorOnnx(rutas[0])
+    reader.recognizer = ReconocedorOnnx(rutas[1])
+    print(f"🧩 Backend ONNX activo ({os.path.basename(rutas[0])}, {os.path.basename(rutas[1])})")
+    return reader
+
+# ==============================================================================
+# 3. EXPORTACIÓN (requiere torch + onnx; se corre una vez y se despliegan los .onnx)
+# ==============================================================================
+def exportar_modelos(directorio=None, int8=True, opset=17):
+    """Exporta CRAFT y el reconocedor de EasyOCR a ONNX con ejes dinámicos y, opcional, int8."""
+    import torch
+    import easyocr
+
+    directorio = directorio or OCR_ONNX_DIR
+    os.makedirs(directorio, exist_ok=True)
+    # Sin quantize: los módulos cuantizados dinámicamente de torch no se exportan a ONNX
+    reader = easyocr.Reader(IDIOMAS, gpu=False, quantize=False)
+
+    class PromedioAlto(torch.nn.Module):
+        """AdaptiveAvgPool2d((None, 1)) sobre [b, w, c, h] = promedio en h (exportable)."""
+        def forward(self, x):
+            return x.mean(dim=3, keepdim=True)
+
+    class ReconocedorExportable(torch.nn.Module):
+        """El modelo CTC ignora 'text'; exportamos solo la imagen como entrada."""
+        def __init__(self, modelo):
+            super().__init__()
+            self.modelo = modelo
+        def forward(self, imagen):
+            return self.modelo(imagen, None)
+
+    detector = getattr(reader.detector, "module", reader.detector).eval()
+    ruta_det = ruta_modelo('detector', False, directorio)
+    with torch.no_grad():
+        torch.onnx.export(
+            detector, torch.randn(1, 3, 480, 640), ruta_det, opset_version=opset,
+            input_names=["imagen"], output_names=["mapas", "caracteristicas"],
+            dynamic_axes={"imagen": {0: "lote", 2: "alto", 3: "ancho"},
+                          "mapas": {0: "lote", 1: "alto_mapa", 2: "ancho_mapa"},
+                          "caracteristicas": {0: "lote", 2: "alto_mapa", 3: "ancho_mapa"}})
+    print(f"✅ Detector exportado: {ruta_det}")
+
+    modelo = getattr(reader.recognizer, "module", reader.recognizer).eval()
+    if hasattr(modelo, "AdaptiveAvgPool"):
+        modelo.AdaptiveAvgPool = PromedioAlto()
+    ruta_rec = ruta_modelo('reconocedor', False, directorio)
+    with torch.no_grad():
+        torch.onnx.export(
+            ReconocedorExportable(modelo).eval(), torch.randn(1, 1, 64, 256), ruta_rec, opset_version=opset,
+            input_names=["imagen"], output_names=["logits"],
+            dynamic_axes={"imagen": {0: "lote", 3: "ancho"}, "logits": {0: "lote", 1: "pasos"}})
+    print(f"✅ Reconocedor exportado: {ruta_rec}")
+
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        for nombre in ARCHIVOS:
+            quantize_dynamic(ruta_modelo(nombre, False, directorio), ruta_modelo(nombre, True, directorio),
+                             weight_type=QuantType.QUInt8)
+            print(f"✅ {nombre} cuantizado a int8")
+
+    with open(os.path.join(directorio, "metadatos.json"), "w", encoding="utf-8") as f:
+        json.dump({"easyocr": getattr(easyocr, "__version__", None), "torch": torch.__version__,
+                   "idiomas": IDIOMAS, "opset": opset, "int8": int8}, f, indent=2)
+
+# ==============================================================================
+# 4. PARIDAD SOBRE EL CORPUS (torch vs onnx)
+# ==============================================================================
+def verificar_paridad(directorio_corpus, modo=None):
+    """
+    Corre el banco de pruebas con cada backend y compara lectura por lectura.
+    Retorna {'coincidencias', 'total', 'diferencias', 'torch', 'onnx'} (resúmenes del benchmark).
+    """
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from ocr import detector, benchmark
+
+    corridas = {}
+    for backend in ("torch", "onnx"):
+        detector.OCR_BACKEND = backend
+        detector._reader_instance = None
+        corridas[backend] = benchmark.ejecutar_benchmark(directorio_corpus, modo=modo)
+        if detector.ESTADO_MODELO.get('backend') != backend:
+            raise RuntimeError(f"No se pudo activar el backend {backend}: {detector.ESTADO_MODELO.get('error')}")
+
+    diferencias = [
+        {"imagen": a["imagen"], "esperada": a["esperada"], "torch": a["placa"], "onnx": b["placa"]}
+        for a, b in zip(corridas["torch"]["imagenes"], corridas["onnx"]["imagenes"]) if a["placa"] != b["placa"]
+    ]
+    total = len(corridas["torch"]["imagenes"])
+    return {"coincidencias": total - len(diferencias), "total": total, "diferencias": diferencias,
+            "torch": corridas["torch"]["resumen"], "onnx": corridas["onnx"]["resumen"]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend ONNX Runtime para el OCR")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_exp = sub.add_parser("exportar", help="Exporta los modelos de EasyOCR a ONNX")
+    p_exp.add_argument("--dir", default=OCR_ONNX_DIR)
+    p_exp.add_argument("--sin-int8", action="store_true")
+    p_par = sub.add_parser("paridad", help="Compara torch vs onnx sobre un corpus etiquetado")
+    p_par.add_argument("--dir", required=True)
+    p_par.add_argument("--modo", choices=["lote", "cascada"], default=None)
+    p_par.add_argument("--salida", help="JSON con el reporte de paridad")
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        exportar_modelos(args.dir, int8=not args.sin_int8)
+    else:
+        reporte = verificar_paridad(args.dir, args.modo)
+        for d in reporte["diferencias"]:
+            print(f"❌ {d['imagen']}: torch={d['torch']} onnx={d['onnx']} (esperada {d['esperada']})")
+        print(f"🎯 Paridad: {reporte['coincidencias']}/{reporte['total']} lecturas idénticas")
+        for backend in ("torch", "onnx"):
+            r = reporte[backend]
+            print(f"📊 {backend}: p50 {r['latencia_ms']['p50']} ms | p95 {r['latencia_ms']['p95']} ms | "
+                  f"precisión {r['precision']['precision']}")
+        if args.salida:
+            with open(args.salida, "w", encoding="utf-8") as f:
+                json.dump(reporte, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,380 @@
+# backend/ocr/benchmark.py
+# Banco de pruebas del OCR: precisión y latencia sobre un corpus de placas etiquetado.
+# Uso:
+#   python ocr/benchmark.py --dir corpus/ --salida resultados.json
+#   python ocr/benchmark.py --dir corpus/ --comparar base.json          (antes de desplegar)
+#   python ocr/benchmark.py --dir ocr/img_placas --normalizacion         (decodificación completa vs OCR_MAX_PIXELES)
+#   python ocr/benchmark.py --dir corpus/ --calidad                      (qué rechaza el control de calidad y a qué costo)
+#
+# Etiquetas: un archivo 'etiquetas.csv' (archivo,placa) en el directorio o, si no existe,
+# el nombre del archivo: "ABC123.jpg", "ABC123_noche.jpg", "ABC123-2.png" -> ABC123.
+import os
+import re
+import sys
+import csv
+import json
+import math
+import time
+import platform
+import argparse
+import resource
+import statistics
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ocr import detector
+from ocr import calidad
+
+EXTENSIONES = ('.jpg', '.jpeg', '.png')
+
+# Funciones del detector cronometradas como "etapas" del pipeline
+ETAPAS = ['decodificar_imagen', 'localizar_regiones_placa', 'detectar_cajas', 'reconocer_en_lote', 'evaluar_lecturas']
+
+# ==============================================================================
+# 1. CORPUS
+# ==============================================================================
+def cargar_corpus(directorio):
+    """Retorna [(ruta, placa_esperada)] ordenado por nombre. Placa None = sin etiqueta."""
+    etiquetas = {}
+    ruta_csv = os.path.join(directorio, "etiquetas.csv")
+    if os.path.exists(ruta_csv):
+        with open(ruta_csv, newline="", encoding="utf-8") as f:
+            for fila in csv.reader(f):
+                if len(fila) >= 2 and fila[0].lower() != "archivo":
+                    etiquetas[fila[0].strip()] = fila[1].strip().upper()
+
+    corpus = []
+    for nombre in sorted(os.listdir(directorio)):
+        if not nombre.lower().endswith(EXTENSIONES): continue
+        if nombre in etiquetas:
+            esperada = etiquetas[nombre]
+        else:
+            base = re.split(r'[_\-. ]', os.path.splitext(nombre)[0])[0].upper()
+            esperada = base if patron_de(base) else None
+        corpus.append((os.path.join(directorio, nombre), esperada))
+    return corpus
+
+def patron_de(placa):
+    """Nombre del patrón de PATRONES que describe la placa esperada (o None)."""
+    for nombre, reglas in detector.PATRONES.items():
+        if re.match(reglas['regex'], placa or ""):
+            return nombre
+    return None
+
+# ==============================================================================
+# 2. INSTRUMENTACIÓN (cronómetro por etapa, sin tocar el detector)
+# ==============================================================================
+def instrumentar(tiempos, lecturas_por_filtro):
+    """
+    Envuelve las etapas del detector para acumular milisegundos en 'tiempos'
+    y guardar los candidatos de cada filtro. Retorna una función que restaura el original.
+    """
+    originales = {nombre: getattr(detector, nombre) for nombre in ETAPAS}
+
+    def cronometrar(nombre, funcion):
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                tiempos[nombre] = tiempos.get(nombre, 0.0) + (time.perf_counter() - inicio) * 1000
+        return envoltura
+
+    for nombre, funcion in originales.items():
+        setattr(detector, nombre, cronometrar(nombre, funcion))
+
+    # Candidatos por filtro: necesarios para la precisión de cada filtro por separado
+    evaluar = detector.evaluar_lecturas
+    def evaluar_y_registrar(lecturas):
+        candidatos = evaluar(lecturas)
+        for c in candidatos:
+            lecturas_por_filtro.setdefault(c['filtro'], []).append(c)
+        return candidatos
+    detector.evaluar_lecturas = evaluar_y_registrar
+
+    # Filtros de imagen: los usan tanto el modo lote como la cascada
+    filtros_originales = dict(detector.FILTROS)
+    for nombre, funcion in filtros_originales.items():
+        detector.FILTROS[nombre] = cronometrar("filtros", funcion)
+
+    def restaurar():
+        for nombre, funcion in originales.items():
+            setattr(detector, nombre, funcion)
+        detector.FILTROS.update(filtros_originales)
+    return restaurar
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso (Linux reporta KB, macOS bytes)."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+# ==============================================================================
+# 3. EJECUCIÓN
+# ==============================================================================
+def ejecutar_benchmark(directorio, modo=None, calentamiento=True):
+    """
+    Corre detector.analizar_placa (lo mismo que detectar_placa, con detalle) sobre
+    cada imagen del corpus. Retorna {'meta', 'imagenes', 'resumen'}.
+    """
+    corpus = cargar_corpus(directorio)
+    modo = (modo or detector.OCR_MODO).lower()
+
+    inicio = time.perf_counter()
+    detector.get_reader()
+    carga_modelo_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    if calentamiento and corpus:
+        # La primera inferencia paga la inicialización de torch: no la medimos
+        with open(corpus[0][0], "rb") as f:
+            detector.analizar_placa(f.read(), modo=modo)
+
+    filas = []
+    for ruta, esperada in corpus:
+        with open(ruta, "rb") as f:
+            datos = f.read()
+
+        tiempos, por_filtro = {}, {}
+        restaurar = instrumentar(tiempos, por_filtro)
+        try:
+            inicio = time.perf_counter()
+            resultado = detector.analizar_placa(datos, modo=modo)
+            total_ms = (time.perf_counter() - inicio) * 1000
+        finally:
+            restaurar()
+
+        # Mejor lectura de cada filtro por separado
+        mejor_por_filtro = {f: max(cs, key=lambda c: c['score'])['placa'] for f, cs in por_filtro.items()}
+        filas.append({
+            "imagen": os.path.basename(ruta),
+            "esperada": esperada,
+            "patron_esperado": patron_de(esperada),
+            "placa": resultado.get('placa'),
+            "correcta": esperada is not None and resultado.get('placa') == esperada,
+            "patron": resultado.get('patron'),
+            "filtro": resultado.get('filtro'),
+            "etapa": resultado.get('etapa'),
+            "score": resultado.get('score'),
+            "latencia_ms": round(total_ms, 2),
+            "etapas_ms": {k: round(v, 2) for k, v in tiempos.items()},
+            "por_filtro": mejor_por_filtro,
+            "rss_mb": rss_pico_mb(),
+        })
+
+    meta = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "directorio": os.path.abspath(directorio),
+        "modo": modo,
+        "backend": detector.ESTADO_MODELO.get('backend'),
+        "max_pixeles": detector.OCR_MAX_PIXELES,
+        "umbral_cascada": detector.OCR_UMBRAL_CASCADA,
+        "carga_modelo_ms": carga_modelo_ms,
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+    }
+    return {"meta": meta, "imagenes": filas, "resumen": resumir(filas)}
+
+# ==============================================================================
+# 4. MÉTRICAS
+# ==============================================================================
+def percentil(valores, p):
+    """Percentil por rango más cercano (sin interpolar, estable con pocos datos)."""
+    if not valores: return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados), max(1, math.ceil(p / 100 * len(ordenados)))) - 1
+    return round(ordenados[indice], 2)
+
+def _precision(aciertos, total):
+    return {"aciertos": aciertos, "total": total, "precision": round(aciertos / total, 3) if total else None}
+
+def resumir(filas):
+    latencias = [f["latencia_ms"] for f in filas]
+    etiquetadas = [f for f in filas if f["esperada"]]
+
+    etapas = {}
+    for f in filas:
+        for etapa, ms in f["etapas_ms"].items():
+            etapas.setdefault(etapa, []).append(ms)
+
+    filtros = sorted({nombre for f in etiquetadas for nombre in f["por_filtro"]} | set(detector.FILTROS))
+    patrones = sorted({f["patron_esperado"] or "DESCONOCIDO" for f in etiquetadas})
+
+    return {
+        "imagenes": len(filas),
+        "etiquetadas": len(etiquetadas),
+        "latencia_ms": {
+            "p50": percentil(latencias, 50), "p95": percentil(latencias, 95), "p99": percentil(latencias, 99),
+            "media": round(statistics.mean(latencias), 2) if latencias else None,
+        },
+        "etapas_ms": {e: {"media": round(statistics.mean(v), 2), "p95": percentil(v, 95)} for e, v in etapas.items()},
+        "rss_pico_mb": rss_pico_mb(),
+        "precision": _precision(sum(f["correcta"] for f in etiquetadas), len(etiquetadas)),
+        # Por filtro: ¿ese filtro solo habría leído la placa correcta?
+        "precision_por_filtro": {
+            nombre: _precision(sum(f["por_filtro"].get(nombre) == f["esperada"] for f in etiquetadas), len(etiquetadas))
+            for nombre in filtros
+        },
+        # Por patrón: precisión final agrupada por el formato de la placa esperada
+        "precision_por_patron": {
+            p: _precision(sum(f["correcta"] for f in etiquetadas if (f["patron_esperado"] or "DESCONOCIDO") == p),
+                          sum(1 for f in etiquetadas if (f["patron_esperado"] or "DESCONOCIDO") == p))
+            for p in patrones
+        },
+        "filtro_ganador": dict(Counter(f["filtro"] for f in filas if f["filtro"])),
+    }
+
+def imprimir_reporte(resultado):
+    resumen = resultado["resumen"]
+    for f in resultado["imagenes"]:
+        marca = "✅" if f["correcta"] else ("❔" if not f["esperada"] else "❌")
+        print(f"{marca} {f['imagen']}: {f['placa']} (esperada {f['esperada']}) {f['latencia_ms']} ms [{f['filtro']}]")
+    if not resultado["imagenes"]:
+        print("⚠️ No hay imágenes en el directorio.")
+        return
+    lat = resumen["latencia_ms"]
+    print(f"📊 Latencia: p50 {lat['p50']} ms | p95 {lat['p95']} ms | p99 {lat['p99']} ms")
+    for etapa, v in resumen["etapas_ms"].items():
+        print(f"   ⏱️ {etapa}: media {v['media']} ms | p95 {v['p95']} ms")
+    print(f"🧠 RSS pico: {resumen['rss_pico_mb']} MB")
+    p = resumen["precision"]
+    print(f"🎯 Precisión: {p['aciertos']}/{p['total']} ({p['precision']})")
+    for nombre, v in resumen["precision_por_filtro"].items():
+        print(f"   🎛️ {nombre}: {v['aciertos']}/{v['total']}")
+    for nombre, v in resumen["precision_por_patron"].items():
+        print(f"   🔤 {nombre}: {v['aciertos']}/{v['total']}")
+
+def comparar_con_base(resultado, ruta_base):
+    """Imprime la diferencia de las métricas principales contra un JSON previo."""
+    with open(ruta_base, encoding="utf-8") as f:
+        base = json.load(f)["resumen"]
+    actual = resultado["resumen"]
+    filas = [("precisión", base["precision"]["precision"], actual["precision"]["precision"])]
+    filas += [(f"latencia {p}", base["latencia_ms"][p], actual["latencia_ms"][p]) for p in ("p50", "p95", "p99")]
+    filas.append(("RSS pico MB", base["rss_pico_mb"], actual["rss_pico_mb"]))
+    print(f"🔍 Comparación contra {ruta_base}:")
+    for nombre, antes, ahora in filas:
+        delta = round(ahora - antes, 3) if antes is not None and ahora is not None else "-"
+        print(f"   {nombre}: {antes} -> {ahora} (Δ {delta})")
+
+# ==============================================================================
+# 5. NORMALIZACIÓN DE CUADROS (completa vs OCR_MAX_PIXELES)
+# ==============================================================================
+def _medir(funcion, repeticiones=1):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return resultado, (time.perf_counter() - inicio) / repeticiones * 1000
+
+def comparar_normalizacion(directorio, max_pixeles, con_ocr=True):
+    """
+    Para cada imagen mide el tiempo de decodificación y (opcional) del análisis
+    completo con y sin límite de píxeles, y si ambas lecturas coinciden.
+    """
+    filas = []
+    for nombre in sorted(os.listdir(directorio)):
+        if not nombre.lower().endswith(EXTENSIONES): continue
+        with open(os.path.join(directorio, nombre), "rb") as f:
+            datos = f.read()
+
+        fila = {"imagen": nombre}
+        for etiqueta, limite in (("completa", 0), ("normalizada", max_pixeles)):
+            img, ms = _medir(lambda: detector.decodificar_imagen(datos, limite), repeticiones=5)
+            fila[f"{etiqueta}_px"] = f"{img.shape[1]}x{img.shape[0]}" if img is not None else "-"
+            fila[f"{etiqueta}_decod_ms"] = round(ms, 2)
+            if con_ocr:
+                detector.OCR_MAX_PIXELES = limite
+                res, ms = _medir(lambda: detector.analizar_placa(datos))
+                fila[f"{etiqueta}_placa"] = res['placa']
+                fila[f"{etiqueta}_ocr_ms"] = round(ms, 1)
+        filas.append(fila)
+    return filas
+
+def imprimir_resumen(filas, con_ocr=True):
+    for f in filas:
+        print(f)
+    if not filas:
+        print("⚠️ No hay imágenes en el directorio.")
+        return
+    claves = ["decod_ms"] + (["ocr_ms"] if con_ocr else [])
+    for clave in claves:
+        c = statistics.median(f[f"completa_{clave}"] for f in filas)
+        n = statistics.median(f[f"normalizada_{clave}"] for f in filas)
+        print(f"📊 Mediana {clave}: completa {c} | normalizada {n} | ganancia x{round(c / n, 2) if n else '-'}")
+    if con_ocr:
+        iguales = sum(1 for f in filas if f["completa_placa"] == f["normalizada_placa"])
+        print(f"🎯 Lecturas idénticas: {iguales}/{len(filas)}")
+
+# ==============================================================================
+# 6. CONTROL DE CALIDAD (rechazos vs lecturas perdidas)
+# ==============================================================================
+def evaluar_control_calidad(directorio, con_ocr=True):
+    """
+    Pasa cada imagen por ocr/calidad.py con los umbrales actuales (OCR_CALIDAD_*).
+    Con OCR también analiza las rechazadas sin el control: una rechazada que se habría
+    leído bien es el costo del control; una aceptada que no se lee, lo que dejó pasar.
+    """
+    filas = []
+    for ruta, esperada in cargar_corpus(directorio):
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        informe = calidad.evaluar_calidad(datos)
+        fila = {"imagen": os.path.basename(ruta), "esperada": esperada, "apta": informe['apta'],
+                "motivo": informe.get('motivo'), "ms": informe.get('ms')}
+        if con_ocr:
+            res, ms = _medir(lambda: detector.analizar_placa(datos, verificar_calidad=False))
+            fila["correcta"] = esperada is not None and res['placa'] == esperada
+            fila["ocr_ms"] = round(ms, 1)
+        filas.append(fila)
+    return filas
+
+def imprimir_control_calidad(filas, con_ocr=True):
+    if not filas:
+        print("⚠️ No hay imágenes en el directorio.")
+        return
+    rechazadas = [f for f in filas if not f["apta"]]
+    print(f"🚦 Umbrales: {calidad.OCR_CALIDAD_ANCHO_MIN}x{calidad.OCR_CALIDAD_ALTO_MIN} px, "
+          f"brillo {calidad.OCR_CALIDAD_BRILLO_MIN}-{calidad.OCR_CALIDAD_BRILLO_MAX}, "
+          f"saturación {calidad.OCR_CALIDAD_SATURACION_MAX}, contraste {calidad.OCR_CALIDAD_CONTRASTE_MIN}, "
+          f"nitidez {calidad.OCR_CALIDAD_NITIDEZ_MIN}")
+    print(f"🚫 Rechazadas: {len(rechazadas)}/{len(filas)} ({round(100 * len(rechazadas) / len(filas), 1)}%)"
+          f"  {dict(Counter(f['motivo'] for f in rechazadas))}")
+    print(f"⏱️ Mediana del control: {round(statistics.median(f['ms'] for f in filas), 2)} ms")
+    if con_ocr:
+        perdidas = sum(1 for f in rechazadas if f["correcta"])
+        aceptadas = [f for f in filas if f["apta"]]
+        print(f"❌ Rechazadas que se habrían leído: {perdidas}/{len(rechazadas)}")
+        precision = _precision(sum(1 for f in aceptadas if f['correcta']), len(aceptadas))
+        print(f"🎯 Precisión de las aceptadas: {precision['aciertos']}/{precision['total']} ({precision['precision']})")
+        print(f"💸 OCR ahorrado: {round(sum(f['ocr_ms'] for f in rechazadas))} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banco de pruebas de precisión y latencia del OCR")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(__file__), "img_placas"))
+    parser.add_argument("--modo", choices=["lote", "cascada"], default=None, help="Por defecto OCR_MODO")
+    parser.add_argument("--salida", help="Ruta del JSON con los resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida previa para mostrar diferencias")
+    parser.add_argument("--sin-calentamiento", action="store_true", help="Incluye la primera inferencia en las medidas")
+    parser.add_argument("--normalizacion", action="store_true", help="Compara decodificación completa vs normalizada")
+    parser.add_argument("--max-pixeles", type=int, default=detector.OCR_MAX_PIXELES)
+    parser.add_argument("--sin-ocr", action="store_true", help="Con --normalizacion o --calidad, no corre EasyOCR")
+    parser.add_argument("--calidad", action="store_true", help="Rechazos del control de calidad y lecturas perdidas")
+    args = parser.parse_args()
+
+    if args.calidad:
+        filas = evaluar_control_calidad(args.dir, con_ocr=not args.sin_ocr)
+        imprimir_control_calidad(filas, con_ocr=not args.sin_ocr)
+        sys.exit(0)
+
+    if args.normalizacion:
+        filas = comparar_normalizacion(args.dir, args.max_pixeles, con_ocr=not args.sin_ocr)
+        imprimir_resumen(filas, con_ocr=not args.sin_ocr)
+        sys.exit(0)
+
+    resultado = ejecutar_benchmark(args.dir, modo=args.modo, calentamiento=not args.sin_calentamiento)
+    imprimir_reporte(resultado)
+    if args.comparar:
+        comparar_con_base(resultado, args.comparar)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"💾 Resultados guardados en {args.salida}")
@@ -0,0 +1,116 @@
+# backend/ocr/cache.py
+# Caché LRU de resultados OCR indexada por hash perceptual de la placa (por cámara / punto de control).
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from ocr.detector import localizar_regiones_placa
+
+# ==============================================================================
+# 1. CONFIGURACIÓN
+# ==============================================================================
+OCR_CACHE_MAX = int(os.getenv("OCR_CACHE_MAX", "256"))            # Entradas máximas (0 = desactivada)
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", "10"))           # Segundos que vive un resultado
+OCR_CACHE_DISTANCIA = int(os.getenv("OCR_CACHE_DISTANCIA", "3"))  # Bits distintos tolerados (de 128)
+OCR_CACHE_PIXELES = int(os.getenv("OCR_CACHE_PIXELES", str(640 * 480)))  # Copia reducida para calidad y hash
+
+# ==============================================================================
+# 2. HASH PERCEPTUAL (dHash de 128 bits sobre la placa)
+# ==============================================================================
+def hash_perceptual(img):
+    """
+    dHash de la región de placa más prometedora (no del cuadro: el fondo de la cámara
+    es el mismo para todos los carros). La placa se reduce a 17x8 grises y cada píxel
+    se compara con su vecino, así los caracteres pesan en el hash.
+    'img' es la copia BGR reducida a OCR_CACHE_PIXELES que decodifica el servicio OCR
+    (la misma que usa el control de calidad: el cuadro se decodifica una sola vez).
+    Retorna int o None si no hay región de placa (ese cuadro no usa la caché).
+    """
+    if img is None:
+        return None
+    regiones = localizar_regiones_placa(img)
+    if not regiones:
+        return None
+    gris = cv2.cvtColor(regiones[0], cv2.COLOR_BGR2GRAY)
+    mini = cv2.resize(gris, (17, 8), interpolation=cv2.INTER_AREA)
+    bits = (mini[:, 1:] > mini[:, :-1]).flatten()
+    valor = 0
+    for b in bits:
+        valor = (valor << 1) | int(b)
+    return valor
+
+def distancia_hamming(a, b):
+    return bin(a ^ b).count("1")
+
+# ==============================================================================
+# 3. CACHÉ LRU CON TTL Y ÁMBITO POR CÁMARA
+# ==============================================================================
+class CacheResultados:
+    def __init__(self, max_entradas=OCR_CACHE_MAX, ttl=OCR_CACHE_TTL, distancia=OCR_CACHE_DISTANCIA):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.distancia = distancia
+        self._entradas = OrderedDict()   # (camara, hash) -> (resultado, expira)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.omitidos = 0    # Sin cámara o sin placa localizada: no se cachean
+
+    def _aplica(self, camara, valor_hash):
+        # Sin id_punto no hay ámbito: dos cámaras distintas compartirían entradas
+        return self.max_entradas > 0 and camara is not None and valor_hash is not None
+
+    def buscar(self, camara, valor_hash):
+        """Retorna el resultado previo de una placa casi idéntica de la MISMA cámara, o None."""
+        if not self._aplica(camara, valor_hash):
+            if self.max_entradas > 0:
+                self.omitidos += 1
+            return None
+        ahora = time.monotonic()
+        with self._lock:
+            clave = (camara, valor_hash)
+            if clave not in self._entradas:
+                # Sin coincidencia exacta: buscamos un hash cercano dentro de la cámara
+                clave = next((k for k in self._entradas
+                              if k[0] == camara and distancia_hamming(k[1], valor_hash) <= self.distancia), None)
+            if clave is not None:
+                resultado, expira = self._entradas[clave]
+                if expira > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return resultado
+                del self._entradas[clave]
+            self.fallos += 1
+            return None
+
+    def guardar(self, camara, valor_hash, resultado):
+        if not self._aplica(camara, valor_hash):
+            return
+        with self._lock:
+            self._entradas[(camara, valor_hash)] = (resultado, time.monotonic() + self.ttl)
+            self._entradas.move_to_end((camara, valor_hash))
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def metricas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0,
+                "expulsiones": self.expulsiones,
+                "omitidos": self.omitidos,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_s": self.ttl,
+                "distancia_max": self.distancia,
+            }
+
+# Instancia compartida por el proceso web
+cache_resultados = CacheResultados()
@@ -0,0 +1,172 @@
+# backend/ocr/calidad.py
+# Control de calidad del cuadro antes del OCR: resolución, exposición, contraste y nitidez.
+# Un cuadro sin esperanza (movido, quemado, casi negro) se rechaza en milisegundos con un
+# código de motivo, en lugar de pasar por los filtros y EasyOCR para terminar "ilegible".
+import os
+import time
+import threading
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from ocr.detector import dimensiones_imagen, factor_reduccion, imagen_a_bytes
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+OCR_CALIDAD = os.getenv("OCR_CALIDAD", "1") == "1"
+# Resolución mínima del cuadro (una placa legible necesita píxeles). Los valores por defecto
+# son para cámaras de garita; una instalación con cámaras de baja resolución o que envía
+# recortes de la placa los baja por entorno, midiendo antes con:
+#   python ocr/benchmark.py --dir <cuadros de esa cámara> --calidad
+OCR_CALIDAD_ANCHO_MIN = int(os.getenv("OCR_CALIDAD_ANCHO_MIN", "320"))
+OCR_CALIDAD_ALTO_MIN = int(os.getenv("OCR_CALIDAD_ALTO_MIN", "240"))
+# Varianza del Laplaciano de la zona más nítida (bloque 4x4) por debajo de la cual el cuadro está movido
+OCR_CALIDAD_NITIDEZ_MIN = float(os.getenv("OCR_CALIDAD_NITIDEZ_MIN", "40"))
+# Brillo medio (0-255) fuera de este rango = cuadro casi negro / quemado
+OCR_CALIDAD_BRILLO_MIN = float(os.getenv("OCR_CALIDAD_BRILLO_MIN", "25"))
+OCR_CALIDAD_BRILLO_MAX = float(os.getenv("OCR_CALIDAD_BRILLO_MAX", "230"))
+# Fracción de píxeles saturados (>= 250 o <= 5) que se tolera
+OCR_CALIDAD_SATURACION_MAX = float(os.getenv("OCR_CALIDAD_SATURACION_MAX", "0.6"))
+# Desviación estándar mínima de grises (lente tapado, cuadro uniforme)
+OCR_CALIDAD_CONTRASTE_MIN = float(os.getenv("OCR_CALIDAD_CONTRASTE_MIN", "12"))
+
+ANALISIS_PIXELES = 640 * 480   # Se mide sobre una copia reducida (decodificación JPEG escalada)
+BLOQUES = 4                    # Rejilla para la nitidez: la placa es una zona pequeña del cuadro
+
+_MODOS_GRISES = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# Códigos de motivo (estables: los consume la UI de la garita)
+MOTIVOS = {
+    'formato_invalido': "No se pudo decodificar la imagen",
+    'resolucion_baja': "Resolución insuficiente",
+    'subexpuesta': "Imagen demasiado oscura",
+    'sobreexpuesta': "Imagen sobreexpuesta",
+    'sin_contraste': "Imagen sin contraste (lente tapado o desenfocado)",
+    'borrosa': "Imagen movida o desenfocada",
+}
+
+_contadores = {"evaluados": 0}
+_rechazos = Counter()
+_lock = threading.Lock()
+
+# ==============================================================================
+# 2. EVALUACIÓN
+# ==============================================================================
+def _nitidez(gris):
+    """Varianza del Laplaciano del bloque más nítido de una rejilla BLOQUES x BLOQUES."""
+    laplaciano = cv2.Laplacian(gris, cv2.CV_32F)
+    alto, ancho = laplaciano.shape
+    paso_y, paso_x = max(1, alto // BLOQUES), max(1, ancho // BLOQUES)
+    return max(
+        float(laplaciano[y:y + paso_y, x:x + paso_x].var())
+        for y in range(0, alto - paso_y + 1, paso_y)
+        for x in range(0, ancho - paso_x + 1, paso_x)
+    )
+
+def evaluar_cuadro(gris, ancho=None, alto=None):
+    """
+    Evalúa un cuadro ya en grises. 'ancho'/'alto' son los del cuadro original
+    (por defecto los de 'gris'). Retorna {'apta', 'motivo', 'brillo', 'contraste',
+    'saturacion', 'nitidez', 'ancho', 'alto'}; 'motivo' es None si el cuadro es apto.
+    """
+    alto_g, ancho_g = gris.shape[:2]
+    ancho, alto = ancho or ancho_g, alto or alto_g
+    informe = {'apta': False, 'motivo': None, 'ancho': ancho, 'alto': alto,
+               'brillo': None, 'contraste': None, 'saturacion': None, 'nitidez': None}
+
+    if ancho < OCR_CALIDAD_ANCHO_MIN or alto < OCR_CALIDAD_ALTO_MIN:
+        informe['motivo'] = 'resolucion_baja'
+        return informe
+
+    # Exposición: un solo histograma da brillo medio y saturación
+    histograma = cv2.calcHist([gris], [0], None, [256], [0, 256]).ravel()
+    total = histograma.sum()
+    niveles = np.arange(256)
+    brillo = float((histograma * niveles).sum() / total)
+    contraste = float(np.sqrt((histograma * (niveles - brillo) ** 2).sum() / total))
+    saturacion_alta = float(histograma[250:].sum() / total)
+    saturacion_baja = float(histograma[:6].sum() / total)
+    informe.update(brillo=round(brillo, 1), contraste=round(contraste, 1),
+                   saturacion=round(max(saturacion_alta, saturacion_baja), 3))
+
+    if brillo < OCR_CALIDAD_BRILLO_MIN or saturacion_baja > OCR_CALIDAD_SATURACION_MAX:
+        informe['motivo'] = 'subexpuesta'
+    elif brillo > OCR_CALIDAD_BRILLO_MAX or saturacion_alta > OCR_CALIDAD_SATURACION_MAX:
+        informe['motivo'] = 'sobreexpuesta'
+    elif contraste < OCR_CALIDAD_CONTRASTE_MIN:
+        informe['motivo'] = 'sin_contraste'
+    else:
+        informe['nitidez'] = round(_nitidez(gris), 1)
+        if informe['nitidez'] < OCR_CALIDAD_NITIDEZ_MIN:
+            informe['motivo'] = 'borrosa'
+
+    informe['apta'] = informe['motivo'] is None
+    return informe
+
+def evaluar_calidad(imagen):
+    """
+    Evalúa un cuadro en base64 o bytes crudos. La resolución se lee de la cabecera
+    y los píxeles se decodifican en grises y reducidos, así que cuesta pocos ms.
+    Con OCR_CALIDAD=0 siempre retorna apta. Ver evaluar_cuadro para el resultado (+ 'ms').
+    """
+    if not OCR_CALIDAD:
+        return {'apta': True, 'motivo': None}
+    inicio = time.perf_counter()
+    datos = imagen_a_bytes(imagen)
+
+    dims = dimensiones_imagen(datos)
+    factor = factor_reduccion(*dims, ANALISIS_PIXELES) if dims else 1
+    gris = cv2.imdecode(np.frombuffer(datos, np.uint8), _MODOS_GRISES[factor])
+    if gris is None:
+        informe = {'apta': False, 'motivo': 'formato_invalido'}
+    else:
+        ancho, alto = dims if dims else (gris.shape[1], gris.shape[0])
+        if not dims and gris.size > ANALISIS_PIXELES:
+            escala = (ANALISIS_PIXELES / gris.size) ** 0.5
+            gris = cv2.resize(gris, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        informe = evaluar_cuadro(gris, ancho, alto)
+
+    informe['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    registrar(informe)
+    return informe
+
+def evaluar_calidad_decodificada(img, ancho=None, alto=None):
+    """
+    Igual que evaluar_calidad sobre un cuadro BGR que quien llama ya decodificó (reducido);
+    'ancho'/'alto' son los del cuadro original. None = no se pudo decodificar.
+    """
+    if not OCR_CALIDAD:
+        return {'apta': True, 'motivo': None}
+    inicio = time.perf_counter()
+    if img is None:
+        informe = {'apta': False, 'motivo': 'formato_invalido'}
+    else:
+        gris = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if gris.size > ANALISIS_PIXELES:
+            escala = (ANALISIS_PIXELES / gris.size) ** 0.5
+            gris = cv2.resize(gris, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        informe = evaluar_cuadro(gris, ancho, alto)
+    informe['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    registrar(informe)
+    return informe
+
+def registrar(informe):
+    with _lock:
+        _contadores["evaluados"] += 1
+        if informe.get('motivo'):
+            _rechazos[informe['motivo']] += 1
+
+def mensaje_motivo(motivo):
+    return MOTIVOS.get(motivo, "Imagen ilegible")
+
+def metricas_calidad():
+    with _lock:
+        return {"activo": OCR_CALIDAD, "evaluados": _contadores["evaluados"],
+                "rechazados": sum(_rechazos.values()), "por_motivo": dict(_rechazos)}
@@ -1,38 +1,94 @@
 import cv2
-import easyocr
 import numpy as np
 import base64
 import os
 import re
-import gc # Garbage Collector
+import string
+import time
 from collections import Counter
 
+from ocr.memoria import GestorMemoria
+
 # ==============================================================================
 # 1. GESTIÓN DE MEMORIA Y CARGA PEREZOSA (CRÍTICO PARA RENDER)
 # ==============================================================================
 _reader_instance = None
+# 'torch' (EasyOCR estándar) u 'onnx' (ocr/backend_onnx.py, requiere modelos exportados)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "torch").lower()
+# Estado observable de la carga en ESTE proceso (lo reportan /api/ocr/listo y /api/ocr/metricas)
+# estado: 'sin_cargar' | 'cargando' | 'cargado' | 'listo' (cargado + inferencia de calentamiento)
+#         | 'descargado' (liberado por inactividad o presupuesto; se recarga al pedirlo) | 'error'
+ESTADO_MODELO = {'pid': os.getpid(), 'estado': 'sin_cargar', 'backend': None, 'carga_ms': None, 'calentamiento_ms': None, 'error': None}
 
 def get_reader():
     """
     Carga el modelo solo cuando se necesita y usa optimización (quantize)
     para ahorrar memoria RAM. Patrón Singleton.
+    Con OCR_BACKEND=onnx usa ONNX Runtime; si no puede, vuelve a torch.
+    Si la carga falla retorna None y deja el motivo en ESTADO_MODELO['error'].
     """
     global _reader_instance
     if _reader_instance is None:
-        print("⚡ Cargando modelo EasyOCR en memoria (Lazy Load)...")
+        print(f"⚡ Cargando modelo EasyOCR en memoria (Lazy Load, backend {OCR_BACKEND})...")
+        ESTADO_MODELO.update(estado='cargando', error=None)
+        inicio = time.perf_counter()
         try:
-            # quantize=True reduce el uso de memoria sacrificando mínimamente precisión
-            # Solo cargamos 'es' y 'en' si es estrictamente necesario, aquí priorizamos 'es'
-            _reader_instance = easyocr.Reader(['es', 'en'], gpu=False, quantize=True)
-            print("✅ Modelo cargado.")
+            if OCR_BACKEND == 'onnx':
+                try:
+                    from ocr.backend_onnx import crear_reader_onnx
+                    _reader_instance = crear_reader_onnx()
+                    ESTADO_MODELO['backend'] = 'onnx'
+                except Exception as e:
+                    print(f"⚠️ Backend ONNX no disponible ({e}), usando torch")
+            if _reader_instance is None:
+                # Import perezoso: el proceso web solo usa los helpers de imagen y no debe cargar torch
+                import easyocr
+                # quantize=True reduce el uso de memoria sacrificando mínimamente precisión
+                # Solo cargamos 'es' y 'en' si es estrictamente necesario, aquí priorizamos 'es'
+                _reader_instance = easyocr.Reader(['es', 'en'], gpu=False, quantize=True)
+                ESTADO_MODELO['backend'] = 'torch'
+            ESTADO_MODELO.update(estado='cargado', carga_ms=round((time.perf_counter() - inicio) * 1000, 1))
+            gestor_memoria.registrar_carga()
+            print(f"✅ Modelo cargado en {ESTADO_MODELO['carga_ms']} ms.")
         except Exception as e:
+            ESTADO_MODELO.update(estado='error', error=f"{type(e).__name__}: {e}")
             print(f"❌ Error fatal cargando OCR: {e}")
             return None
     return _reader_instance
 
+def calentar_modelo():
+    """
+    Carga el modelo y corre una inferencia de prueba sobre una placa dibujada,
+    para que la primera petición real no pague la inicialización de torch.
+    Retorna una copia de ESTADO_MODELO.
+    """
+    if get_reader() is None:
+        return dict(ESTADO_MODELO)
+    lienzo = np.full((140, 380, 3), 255, np.uint8)
+    cv2.putText(lienzo, "ABC123", (20, 100), cv2.FONT_HERSHEY_SIMPLEX, 2.4, (0, 0, 0), 7)
+    inicio = time.perf_counter()
+    # Sin control de calidad: el lienzo es sintético (y pequeño), no un cuadro de cámara
+    analizar_placa(cv2.imencode('.jpg', lienzo)[1].tobytes(), verificar_calidad=False)
+    ESTADO_MODELO.update(estado='listo', calentamiento_ms=round((time.perf_counter() - inicio) * 1000, 1))
+    print(f"🔥 Modelo caliente (inferencia de prueba en {ESTADO_MODELO['calentamiento_ms']} ms)")
+    return dict(ESTADO_MODELO)
+
+def _descargar_reader():
+    """Suelta la referencia al modelo (el gestor de memoria corre gc y devuelve las páginas)."""
+    global _reader_instance
+    _reader_instance = None
+    ESTADO_MODELO['estado'] = 'descargado'
+
 def limpiar_memoria():
-    """Fuerza la limpieza de RAM después de usar el modelo"""
-    gc.collect()
+    """
+    Limpieza de RAM tras un análisis, guiada por el presupuesto (OCR_MEMORIA_MAX_MB):
+    mide el RSS y solo fuerza gc.collect() cerca del límite (ver ocr/memoria.py).
+    """
+    gestor_memoria.despues_de_analisis()
+
+# Descarga por inactividad, precarga programada y presupuesto de RSS de ESTE proceso
+gestor_memoria = GestorMemoria(descargar=_descargar_reader, precargar=calentar_modelo,
+                               esta_cargado=lambda: _reader_instance is not None)
 
 # ==============================================================================
 # 2. BASES DE CONOCIMIENTO (Diccionarios de Corrección)
@@ -79,189 +135,581 @@ BLACKLIST = ['COLOMBIA', 'BOGOTA', 'MEDELLIN', 'ANTIGUO', 'AUTO', 'MOVIL', 'TRAN
 # ==============================================================================
 # 3. MOTOR DE PREPROCESAMIENTO DE IMÁGENES
 # ==============================================================================
-def generar_pipelines_imagen(img_original):
-    """
-    Genera múltiples versiones de la imagen para intentar vencer
-    diferentes condiciones de luz, sombra y suciedad.
-    """
-    pipelines = []
-    
+def _filtro_gray(gray):
     # --- A. Escala de Grises (Base) ---
-    gray = cv2.cvtColor(img_original, cv2.COLOR_BGR2GRAY)
-    pipelines.append(('GRAY', gray))
+    return gray
 
+def _filtro_clahe(gray):
     # --- B. CLAHE (Para sombras fuertes como en la moto amarilla) ---
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    gray_clahe = clahe.apply(gray)
-    pipelines.append(('CLAHE', gray_clahe))
+    return clahe.apply(gray)
 
+def _filtro_otsu(gray):
     # --- C. Binarización Otsu (Alto contraste blanco/negro) ---
     # Bueno para placas sucias pero con buen contraste de tinta
     blur = cv2.GaussianBlur(gray, (5,5), 0)
     _, otsu = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    pipelines.append(('OTSU', otsu))
+    return otsu
 
+def _filtro_contrast(gray):
     # --- D. Aumento de Contraste Lineal (Para placas descoloridas) ---
     # alpha=1.5 (contraste), beta=0 (brillo)
-    contrast = cv2.convertScaleAbs(gray, alpha=1.5, beta=0)
-    pipelines.append(('CONTRAST', contrast))
+    return cv2.convertScaleAbs(gray, alpha=1.5, beta=0)
+
+FILTROS = {
+    'GRAY': _filtro_gray,
+    'CLAHE': _filtro_clahe,
+    'OTSU': _filtro_otsu,
+    'CONTRAST': _filtro_contrast,
+}
 
-    return pipelines
+# Orden de la cascada: del filtro más barato al más caro (medido en una foto 1024x768:
+# CONTRAST ~0.15 ms, OTSU ~0.8 ms, CLAHE ~3.4 ms)
+ORDEN_CASCADA = ['GRAY', 'CONTRAST', 'OTSU', 'CLAHE']
+
+def generar_pipelines_imagen(img_original, filtros=None):
+    """
+    Genera múltiples versiones de la imagen para intentar vencer
+    diferentes condiciones de luz, sombra y suciedad.
+    'filtros' permite pedir solo algunos y en un orden concreto.
+    """
+    gray = cv2.cvtColor(img_original, cv2.COLOR_BGR2GRAY)
+    return [(nombre, FILTROS[nombre](gray)) for nombre in (filtros or FILTROS)]
+
+# ==============================================================================
+# 3.0 LOCALIZACIÓN DE LA PLACA (Antes de filtros y OCR)
+# ==============================================================================
+LOC_ANCHO_TRABAJO = 640       # Se localiza sobre una copia reducida (barato)
+LOC_MAX_REGIONES = 3          # Máximo de recortes que pasan al OCR
+LOC_RATIO = (1.5, 6.0)        # Relación ancho/alto aceptada (placas COL/VEN ~2:1)
+LOC_AREA = (0.01, 0.6)        # Fracción del cuadro que puede ocupar una placa
+LOC_CONTRASTE_MIN = 30        # Desviación estándar mínima de grises (tinta vs fondo)
+LOC_ALTO_MIN_RECORTE = 120    # Recortes más bajos se amplían para el detector CRAFT
+
+def localizar_regiones_placa(img_original):
+    """
+    Busca rectángulos con forma y contraste de placa usando solo OpenCV
+    (bordes + contornos). Retorna recortes BGR de la imagen original,
+    ordenados del más prometedor al menos. Lista vacía si no encuentra nada.
+    """
+    gray = cv2.cvtColor(img_original, cv2.COLOR_BGR2GRAY)
+    alto, ancho = gray.shape
+    escala = min(1.0, LOC_ANCHO_TRABAJO / ancho)
+    if escala < 1.0:
+        gray = cv2.resize(gray, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    h, w = gray.shape
+
+    # Bordes del marco de la placa (el filtro bilateral conserva bordes y borra textura)
+    suave = cv2.bilateralFilter(gray, 7, 50, 50)
+    bordes = cv2.Canny(suave, 50, 150)
+    bordes = cv2.dilate(bordes, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    contornos, _ = cv2.findContours(bordes, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    candidatos = []
+    for c in contornos:
+        x, y, cw, ch = cv2.boundingRect(c)
+        if ch < 10: continue
+        ratio = cw / ch
+        fraccion = (cw * ch) / (h * w)
+        if not (LOC_RATIO[0] <= ratio <= LOC_RATIO[1]) or not (LOC_AREA[0] <= fraccion <= LOC_AREA[1]):
+            continue
+        # Rectangularidad: el contorno debe llenar su caja
+        relleno = cv2.contourArea(cv2.convexHull(c)) / (cw * ch)
+        if relleno < 0.6: continue
+        contraste = float(gray[y:y + ch, x:x + cw].std())
+        if contraste < LOC_CONTRASTE_MIN: continue
+        candidatos.append((contraste * relleno, x, y, cw, ch))
+
+    candidatos.sort(reverse=True)
+
+    # Supresión de duplicados: descartamos cajas que casi se solapan con una ya elegida
+    elegidas = []
+    for cand in candidatos:
+        _, x, y, cw, ch = cand
+        repetida = False
+        for _, ex, ey, ew, eh in elegidas:
+            ix = max(0, min(x + cw, ex + ew) - max(x, ex))
+            iy = max(0, min(y + ch, ey + eh) - max(y, ey))
+            if ix * iy > 0.5 * min(cw * ch, ew * eh):
+                repetida = True
+                break
+        if not repetida:
+            elegidas.append(cand)
+        if len(elegidas) >= LOC_MAX_REGIONES:
+            break
+
+    recortes = []
+    for _, x, y, cw, ch in elegidas:
+        # Volvemos a coordenadas originales con un margen del 10%
+        mx, my = int(cw * 0.1), int(ch * 0.1)
+        x0 = max(0, int((x - mx) / escala)); y0 = max(0, int((y - my) / escala))
+        x1 = min(ancho, int((x + cw + mx) / escala)); y1 = min(alto, int((y + ch + my) / escala))
+        recorte = img_original[y0:y1, x0:x1]
+        if recorte.shape[0] < LOC_ALTO_MIN_RECORTE:
+            factor = LOC_ALTO_MIN_RECORTE / recorte.shape[0]
+            recorte = cv2.resize(recorte, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+        recortes.append(recorte)
+    return recortes
+
+# ==============================================================================
+# 3.1 RECONOCIMIENTO EN LOTE (Un solo detector CRAFT para todos los filtros)
+# ==============================================================================
+# allowlist: Solo caracteres que pueden estar en una placa
+ALLOWLIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-'
+
+def detectar_cajas(reader, img_base):
+    """
+    Corre el detector de texto (CRAFT) una sola vez.
+    Retorna (cajas_horizontales, cajas_libres) o None si no hay texto.
+    """
+    horizontales, libres = reader.detect(img_base)
+    horizontales, libres = horizontales[0], libres[0]
+    if not horizontales and not libres:
+        return None
+    return horizontales, libres
+
+def reconocer_en_lote(reader, imagenes_proc, cajas):
+    """
+    Envía las cajas de todos los filtros al reconocedor en un único lote.
+    Truco: apilamos los filtros en vertical (misma geometría) y desplazamos las
+    cajas por el alto de la imagen; luego cada lectura vuelve a su filtro por su 'y'.
+    Retorna: lista de (nombre_filtro, texto_leido)
+    """
+    horizontales, libres = cajas
+    alto = imagenes_proc[0][1].shape[0]
+
+    mosaico = np.vstack([img_p for _, img_p in imagenes_proc])
+    cajas_h, cajas_l = [], []
+    for k in range(len(imagenes_proc)):
+        dy = k * alto
+        # Recortamos al alto de la imagen para que ninguna caja invada el filtro vecino
+        for x_min, x_max, y_min, y_max in horizontales:
+            cajas_h.append([x_min, x_max, max(0, y_min) + dy, min(y_max, alto) + dy])
+        for caja in libres:
+            cajas_l.append([[x, min(max(0, y), alto - 1) + dy] for x, y in caja])
+
+    resultados = reader.recognize(
+        mosaico, horizontal_list=cajas_h, free_list=cajas_l,
+        batch_size=len(cajas_h) + len(cajas_l),
+        detail=1, paragraph=False, allowlist=ALLOWLIST
+    )
+
+    lecturas = []
+    for caja, texto, _confianza in resultados:
+        k = min(int(min(p[1] for p in caja) // alto), len(imagenes_proc) - 1)
+        lecturas.append((imagenes_proc[k][0], texto))
+    return lecturas
 
 # ==============================================================================
 # 4. MOTOR DE ANÁLISIS Y CORRECCIÓN
 # ==============================================================================
-def aplicar_mascara(texto, mascara):
-    """
-    Intenta forzar un texto a cumplir una máscara específica (ej: LLLNNN).
-    Retorna: (Texto Corregido, Penalización)
-    Penalización: 0 = Perfecto, >0 = Se tuvieron que cambiar caracteres.
-    Retorna (None, 999) si es imposible corregir.
-    """
-    texto_lista = list(texto)
-    if len(texto_lista) != len(mascara): return None, 999
-    
-    penalizacion = 0
-    nuevo_texto = []
-
-    for i, tipo_esperado in enumerate(mascara):
-        char = texto_lista[i]
-        
-        # 1. Si esperamos NÚMERO
-        if tipo_esperado == 'N':
-            if char.isdigit():
-                nuevo_texto.append(char) # OK
-            elif char in L2N:
-                nuevo_texto.append(L2N[char]) # Corregido
-                penalizacion += 1
-            else:
-                return None, 999 # Error fatal (ej: 'K' donde va número)
-
-        # 2. Si esperamos LETRA
-        elif tipo_esperado == 'L':
-            if char.isalpha():
-                nuevo_texto.append(char) # OK
-            elif char in N2L:
-                nuevo_texto.append(N2L[char]) # Corregido
-                penalizacion += 1
-            else:
-                return None, 999 # Error fatal
-
-    return "".join(nuevo_texto), penalizacion
+# --- 4.0 Matcher compilado ---
+# Cada carácter alfanumérico se traduce a una "clase" según qué tan corregible es:
+#   d = dígito con equivalente letra (0-8)     n = dígito sin equivalente (9)
+#   l = letra con equivalente número (O, S...) k = letra sin equivalente
+# Sobre la cadena de clases, una máscara 'LLLNNN' es simplemente '[kld]{3}[dnl]{3}'.
+_CLASE_MASCARA = {'L': 'kld', 'N': 'dnl'}
+_CLASE_CORREGIDA = {'L': 'd', 'N': 'l'}   # Clase que cuesta una corrección en esa posición
+_FUENTE_POR_TIPO = {'L': 0, 'N': 1}        # 0 = texto forzado a letras, 1 = forzado a números
+
+TABLA_CLASES = str.maketrans({
+    c: ('d' if c in N2L else 'n') if c.isdigit() else ('l' if c in L2N else 'k')
+    for c in string.ascii_uppercase + string.digits
+})
+TABLA_L2N = str.maketrans({k: v for k, v in L2N.items() if k.isupper()})
+TABLA_N2L = str.maketrans(N2L)
+
+RE_NO_ALFANUM = re.compile(r'[^A-Z0-9]')
+
+def _tramos_mascara(mascara):
+    """'LLLNNN' -> [(0, 3, 'L'), (3, 6, 'N')]: tramos contiguos del mismo tipo."""
+    return [(m.start(), m.end(), m.group()[0]) for m in re.finditer(r'L+|N+', mascara)]
+
+def _tramos_compilados(mascara):
+    """Tramos listos para el bucle caliente: (inicio, fin, fuente, clase que cuesta)."""
+    return tuple((ini, fin, _FUENTE_POR_TIPO[t], _CLASE_CORREGIDA[t]) for ini, fin, t in _tramos_mascara(mascara))
+
+def compilar_patrones(patrones):
+    """
+    Precompila PATRONES en un solo regex: un lookahead con grupo opcional por máscara distinta,
+    así un único finditer sobre la cadena de clases prueba TODAS las ventanas contra
+    TODAS las máscaras. Patrones con la misma máscara comparten grupo y corrección.
+    Retorna (regex, {grupo: (largo, tramos, [(nombre, indice, regex), ...])}, largos).
+    """
+    grupos = {}
+    nombres_grupo = {}   # mascara -> nombre del grupo
+    partes = []
+    cuerpos = []
+    for indice, (nombre, regla) in enumerate(patrones.items()):
+        mascara = regla['mask']
+        if mascara not in nombres_grupo:
+            grupo = nombres_grupo[mascara] = f"m{len(nombres_grupo)}"
+            tramos = _tramos_mascara(mascara)
+            cuerpo = "".join(f"[{_CLASE_MASCARA[t]}]{{{fin - ini}}}" for ini, fin, t in tramos)
+            cuerpos.append(cuerpo)
+            partes.append(f"(?=(?P<{grupo}>{cuerpo})?)")
+            grupos[grupo] = (len(mascara), _tramos_compilados(mascara), [])
+        grupos[nombres_grupo[mascara]][2].append((nombre, indice, re.compile(regla['regex'])))
+    # Guardia inicial: la posición solo "calza" si alguna máscara encaja ahí, así
+    # finditer salta en C las posiciones vacías. Cada grupo va DENTRO de su lookahead
+    # (atómico): con '(?:(?=...))?' el motor retrocedería 2^n combinaciones por posición.
+    guardia = "(?=" + "|".join(cuerpos) + ")"
+    largos = sorted({largo for largo, _, _ in grupos.values()})
+    return re.compile(guardia + "".join(partes)), grupos, largos
+
+RE_PATRONES, GRUPOS_PATRONES, LARGOS_PATRONES = compilar_patrones(PATRONES)
+
+def _opciones_candidato(texto_crudo, solo_mejor=False):
+    """
+    Un solo barrido: finditer sobre la cadena de clases entrega cada posición donde
+    calza alguna máscara, con todas las máscaras que calzan ahí.
+    Retorna tuplas (-score, grupo_orden, posicion, indice_patron, placa, patron); el
+    orden natural de las tuplas reproduce el desempate del barrido por ventanas:
+    texto completo, ventanas cortas, ventanas largas y orden de PATRONES.
+    Con solo_mejor=True descarta sin corregir las ventanas que ya no pueden ganar.
+    """
+    limpio = RE_NO_ALFANUM.sub('', texto_crudo.upper())
+    total = len(limpio)
+    if total < LARGOS_PATRONES[0]:
+        return []
+    clases = limpio.translate(TABLA_CLASES)
+    # Una sola traducción por texto: versión "todo letras" y "todo números"
+    fuentes = (limpio.translate(TABLA_N2L), limpio.translate(TABLA_L2N))
+
+    # Ventanas deslizantes solo si el texto es más largo que 6 (bordes tipo "|OMG650")
+    if total <= 6:
+        m = RE_PATRONES.match(clases)
+        coincidencias = [m] if m else []
+    else:
+        coincidencias = RE_PATRONES.finditer(clases)
+
+    opciones = []
+    for m in coincidencias:
+        pos = m.start()
+        for grupo, inicio in zip(GRUPOS_PATRONES, m.regs[1:]):
+            if inicio[0] < 0:
+                continue
+            largo, tramos, reglas = GRUPOS_PATRONES[grupo]
+            completo = pos == 0 and largo == total
+            if not completo and total <= 6:
+                continue
+            costo = 0
+            for ini, fin, _, clase_costo in tramos:
+                costo += clases.count(clase_costo, pos + ini, pos + fin)
+            grupo_orden = 0 if completo else 1 + LARGOS_PATRONES.index(largo)
+            # Base 100. Restamos 10 por cada corrección; bonus por regex exacto
+            score_base = 100 - (costo * 10)
+            if solo_mejor and opciones and (-(score_base + 5), grupo_orden, pos) > opciones[0][:3]:
+                continue
+            texto_corregido = "".join([fuentes[fuente][pos + ini:pos + fin] for ini, fin, fuente, _ in tramos])
+
+            for nombre, indice, regex in reglas:
+                score = score_base + 5 if regex.match(texto_corregido) else score_base
+                opcion = (-score, grupo_orden, pos, indice, texto_corregido, nombre)
+                if not solo_mejor:
+                    opciones.append(opcion)
+                elif not opciones or opcion < opciones[0]:
+                    opciones[:] = [opcion]
+    return opciones
+
+def _candidato(opcion, texto_crudo):
+    return {'placa': opcion[4], 'score': -opcion[0], 'patron': opcion[5], 'original': texto_crudo}
+
+def rankear_candidatos(texto_crudo):
+    """
+    Recibe un texto crudo del OCR (ej: "OMG-65O") y lo evalúa contra TODOS los
+    patrones en todas las ventanas. Retorna los candidatos por score descendente.
+    """
+    opciones = _opciones_candidato(texto_crudo)
+    opciones.sort()
+    return [_candidato(o, texto_crudo) for o in opciones]
 
 def evaluar_candidato(texto_crudo):
+    """Devuelve el mejor ajuste (o None)."""
+    opciones = _opciones_candidato(texto_crudo, solo_mejor=True)
+    return _candidato(opciones[0], texto_crudo) if opciones else None
+
+def evaluar_lecturas(lecturas):
+    """Convierte las lecturas crudas del OCR en candidatos válidos marcados con su filtro."""
+    candidatos = []
+    for nombre_filtro, txt in lecturas:
+        txt = txt.upper()
+        # Filtrar basura obvia (palabras prohibidas o muy cortas)
+        if len(txt) < 5 or any(b in txt for b in BLACKLIST):
+            continue
+
+        # Evaluar candidato
+        ganador_local = evaluar_candidato(txt)
+        if ganador_local:
+            ganador_local['filtro'] = nombre_filtro
+            candidatos.append(ganador_local)
+    return candidatos
+
+def candidatos_de_imagen(reader, img, filtros=None):
     """
-    Recibe un texto crudo del OCR (ej: "OMG-65O") y lo evalúa contra
-    TODOS los patrones posibles. Devuelve el mejor ajuste.
-    """
-    # 1. Limpieza inicial: Solo alfanuméricos mayúsculas
-    limpio = re.sub(r'[^A-Z0-9]', '', texto_crudo.upper())
-    
-    mejores_opciones = []
-
-    # Generamos subcadenas para eliminar bordes (ventanas deslizantes)
-    # Ej: "|OMG650" (7 chars) -> probamos "OMG650"
-    subcadenas = [limpio]
-    if len(limpio) > 6:
-        for i in range(len(limpio) - 5): # Ventanas de 6
-            subcadenas.append(limpio[i:i+6])
-        for i in range(len(limpio) - 6): # Ventanas de 7
-            subcadenas.append(limpio[i:i+7])
-
-    # Probamos cada subcadena contra cada patrón
-    for sub in subcadenas:
-        largo = len(sub)
-        
-        for nombre_patron, reglas in PATRONES.items():
-            if largo == reglas['len']:
-                texto_corregido, costo = aplicar_mascara(sub, reglas['mask'])
-                
-                if texto_corregido:
-                    # Cálculo de Puntaje (Score)
-                    # Base 100. Restamos 10 por cada corrección.
-                    score = 100 - (costo * 10)
-                    
-                    # Bonus por Regex exacto (Doble verificación)
-                    if re.match(reglas['regex'], texto_corregido):
-                        score += 5
-                    
-                    mejores_opciones.append({
-                        'placa': texto_corregido,
-                        'score': score,
-                        'patron': nombre_patron,
-                        'original': texto_crudo
-                    })
-
-    if not mejores_opciones:
-        return None
+    Modo LOTE: pasa una imagen (cuadro completo o recorte) por los filtros
+    ('filtros' o los cuatro) y el OCR en un solo lote. Retorna la lista de candidatos válidos.
+    """
+    imagenes_proc = generar_pipelines_imagen(img, filtros)
 
-    # Ordenamos por puntaje descendente
-    mejores_opciones.sort(key=lambda x: x['score'], reverse=True)
-    return mejores_opciones[0] # Retornamos el ganador
+    # Un detector + un lote de reconocimiento para todos los filtros.
+    # Las cajas se buscan siempre en gris, sea cual sea el orden de los filtros
+    cajas = detectar_cajas(reader, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    if cajas is None: return []
+    lecturas = reconocer_en_lote(reader, imagenes_proc, cajas)
+    return evaluar_lecturas(lecturas)
+
+def candidatos_en_cascada(reader, img, umbral, filtros=None):
+    """
+    Modo CASCADA: aplica los filtros de uno en uno (del más barato al más caro,
+    o en el orden de 'filtros') y se detiene en cuanto un candidato alcanza el 'umbral'.
+    Retorna (candidatos, etapa_decisiva) donde etapa_decisiva es 1..N o None.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    cajas = detectar_cajas(reader, gray)
+    if cajas is None: return [], None
+
+    candidatos = []
+    for etapa, nombre_filtro in enumerate(filtros or ORDEN_CASCADA, start=1):
+        img_p = FILTROS[nombre_filtro](gray)
+        lecturas = reconocer_en_lote(reader, [(nombre_filtro, img_p)], cajas)
+        nuevos = evaluar_lecturas(lecturas)
+        for c in nuevos:
+            c['etapa'] = etapa
+        candidatos += nuevos
+        if any(c['score'] >= umbral for c in nuevos):
+            return candidatos, etapa
+    return candidatos, None
+
+def barrido_ocr(reader, img, modo, umbral, filtros=None):
+    """Despacha al modo de barrido configurado. Retorna (candidatos, etapa_decisiva)."""
+    if modo == 'cascada':
+        return candidatos_en_cascada(reader, img, umbral, filtros)
+    return candidatos_de_imagen(reader, img, filtros), None
 
 # ==============================================================================
 # 5. FUNCIÓN PRINCIPAL EXPORTADA
 # ==============================================================================
-def detectar_placa(base64_image_data: str) -> str | None:
+# Modo de barrido: 'lote' (4 filtros en un solo lote) o 'cascada' (parada temprana)
+OCR_MODO = os.getenv("OCR_MODO", "lote").lower()
+# Score con el que la cascada da por buena una placa (105 = sin correcciones + regex)
+OCR_UMBRAL_CASCADA = int(os.getenv("OCR_UMBRAL_CASCADA", "105"))
+
+# Presupuesto de píxeles por cuadro (por despliegue). 1280x720 ≈ 0.92 MP; 0 = sin límite
+OCR_MAX_PIXELES = int(os.getenv("OCR_MAX_PIXELES", str(1280 * 720)))
+
+# Modos de decodificación reducida de OpenCV (libjpeg escala en la DCT: casi gratis)
+_MODOS_REDUCIDOS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Marcadores SOF de JPEG que traen el tamaño del cuadro
+_MARCADORES_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def dimensiones_imagen(datos):
+    """
+    Lee (ancho, alto) de la cabecera JPEG o PNG sin decodificar los píxeles.
+    Retorna None si el formato no se reconoce.
+    """
+    if datos[:8] == b'\x89PNG\r\n\x1a\n' and len(datos) >= 24:
+        return int.from_bytes(datos[16:20], 'big'), int.from_bytes(datos[20:24], 'big')
+
+    if datos[:2] != b'\xff\xd8':
+        return None
+    i, n = 2, len(datos)
+    while i + 9 < n:
+        if datos[i] != 0xFF:
+            return None
+        marcador = datos[i + 1]
+        if marcador == 0xFF:          # Relleno entre marcadores
+            i += 1
+            continue
+        if marcador in _MARCADORES_SOF:
+            alto = int.from_bytes(datos[i + 5:i + 7], 'big')
+            ancho = int.from_bytes(datos[i + 7:i + 9], 'big')
+            return ancho, alto
+        i += 2 + int.from_bytes(datos[i + 2:i + 4], 'big')
+    return None
+
+def factor_reduccion(ancho, alto, max_pixeles):
+    """Menor factor (1, 2, 4 u 8) que deja el cuadro dentro del presupuesto de píxeles."""
+    if not max_pixeles:
+        return 1
+    for factor in (1, 2, 4, 8):
+        if (ancho // factor) * (alto // factor) <= max_pixeles:
+            return factor
+    return 8
+
+def imagen_a_bytes(imagen):
+    """Convierte base64 (con o sin prefijo data URL) a bytes; los bytes pasan tal cual."""
+    if isinstance(imagen, str):
+        if ',' in imagen:
+            imagen = imagen.split(',')[1]
+        return base64.b64decode(imagen)
+    return imagen
+
+def decodificar_imagen(imagen, max_pixeles=None):
+    """
+    Acepta la imagen como texto base64 (con o sin prefijo 'data:image/...;base64,')
+    o como bytes crudos del archivo (JPEG/PNG). Los bytes crudos se decodifican
+    directamente sin copias intermedias. Retorna la imagen BGR o None.
+
+    Normalización: el cuadro queda limitado a 'max_pixeles' (OCR_MAX_PIXELES por
+    defecto). En JPEG la reducción ocurre dentro del decodificador (1/2, 1/4, 1/8);
+    si aún sobra resolución se termina con un resize INTER_AREA.
+    """
+    max_pixeles = OCR_MAX_PIXELES if max_pixeles is None else max_pixeles
+    imagen = imagen_a_bytes(imagen)
+    np_arr = np.frombuffer(imagen, np.uint8)
+
+    dims = dimensiones_imagen(imagen)
+    factor = factor_reduccion(*dims, max_pixeles) if dims else 1
+    img = cv2.imdecode(np_arr, _MODOS_REDUCIDOS[factor])
+    if img is None: return None
+
+    alto, ancho = img.shape[:2]
+    if max_pixeles and ancho * alto > max_pixeles:
+        escala = (max_pixeles / (ancho * alto)) ** 0.5
+        img = cv2.resize(img, (max(1, int(ancho * escala)), max(1, int(alto * escala))), interpolation=cv2.INTER_AREA)
+    return img
+
+def _barrer_cuadro(imagen, modo, umbral, filtros, vacio):
+    """Cuerpo de analizar_placa una vez aprobado el cuadro: carga, localización y OCR."""
     # --- AHORRO DE MEMORIA: CARGA PEREZOSA ---
     reader = get_reader() 
-    if reader is None: return None
+    if reader is None: return vacio
 
     try:
         # A. Decodificar Imagen
-        if ',' in base64_image_data:
-            base64_image_data = base64_image_data.split(',')[1]
-        img_bytes = base64.b64decode(base64_image_data)
-        np_arr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        if img is None: return None
-
-        # B. Generar Pipelines de Imagen
-        imagenes_proc = generar_pipelines_imagen(img)
-        
+        img = decodificar_imagen(imagen)
+        if img is None: return vacio
+
+        # B. Localizar la placa: solo los recortes pequeños pasan por filtros y OCR
+        #    Si la localización no encontró nada útil, el cuadro completo es el respaldo
+        regiones = localizar_regiones_placa(img)
+        print(f"👁️  Analizando {len(regiones)} región(es) candidata(s) en modo {modo.upper()}...")
+
         todos_los_candidatos = []
+        salida_temprana = None
+        for recorte in regiones:
+            candidatos, salida_temprana = barrido_ocr(reader, recorte, modo, umbral, filtros)
+            todos_los_candidatos += candidatos
+            if salida_temprana is not None:
+                break
 
-        print(f"👁️  Analizando imagen con {len(imagenes_proc)} filtros...")
-
-        # C. Barrido OCR
-        for nombre_filtro, img_p in imagenes_proc:
-            # allowlist: Solo caracteres que pueden estar en una placa
-            resultados = reader.readtext(img_p, detail=0, paragraph=False, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-')
-            
-            # --- LIMPIEZA DE MEMORIA ---
-            limpiar_memoria()
-            
-            for txt in resultados:
-                txt = txt.upper()
-                # Filtrar basura obvia (palabras prohibidas o muy cortas)
-                if len(txt) < 5 or any(b in txt for b in BLACKLIST):
-                    continue
-                
-                # Evaluar candidato
-                ganador_local = evaluar_candidato(txt)
-                if ganador_local:
-                    ganador_local['filtro'] = nombre_filtro
-                    todos_los_candidatos.append(ganador_local)
+        if not todos_los_candidatos:
+            print("🔁 Sin placa en las regiones, analizando el cuadro completo...")
+            todos_los_candidatos, salida_temprana = barrido_ocr(reader, img, modo, umbral, filtros)
 
         # D. Selección del Ganador Absoluto
         if not todos_los_candidatos:
             print("⚠️ No se encontró ninguna placa válida.")
-            return None
+            return vacio
 
         # Ordenar por Score
         todos_los_candidatos.sort(key=lambda x: x['score'], reverse=True)
         ganador_absoluto = todos_los_candidatos[0]
+        # Todos los filtros que llegaron a la placa ganadora (no solo el primero del orden):
+        # en modo lote el empate lo decide el orden, y las estadísticas no deben heredarlo
+        ganador_absoluto['filtros_ganadores'] = list(dict.fromkeys(
+            c['filtro'] for c in todos_los_candidatos if c['placa'] == ganador_absoluto['placa']))
+        ganador_absoluto['modo'] = modo
+        ganador_absoluto.setdefault('etapa', None)
+        ganador_absoluto['salida_temprana'] = salida_temprana is not None
 
-        print(f"✅ PLACA DETECTADA: {ganador_absoluto['placa']} (Patrón: {ganador_absoluto['patron']}, Score: {ganador_absoluto['score']})")
-        
-        # Limpieza final
-        limpiar_memoria()
-        
-        return ganador_absoluto['placa']
+        print(f"✅ PLACA DETECTADA: {ganador_absoluto['placa']} (Patrón: {ganador_absoluto['patron']}, Score: {ganador_absoluto['score']}, Filtro: {ganador_absoluto['filtro']}, Etapa: {ganador_absoluto['etapa']})")
+        return ganador_absoluto
 
     except Exception as e:
         print(f"❌ Error en proceso OCR: {e}")
-        return None
+        return vacio
+
+def analizar_placa(imagen, modo: str | None = None, umbral: int | None = None, filtros: list | None = None,
+                   verificar_calidad: bool = True) -> dict:
+    """
+    Igual que detectar_placa pero devuelve el detalle del ganador.
+    'imagen' puede ser base64 (contrato JSON) o bytes crudos (subida binaria).
+    Resultado:
+    {'placa', 'patron', 'score', 'filtro', 'filtros_ganadores', 'modo', 'etapa', 'salida_temprana'}.
+    'etapa' es el paso de la cascada (1..N) que produjo el ganador (None en modo lote)
+    y 'salida_temprana' indica si se cortó al superar el umbral. Si no hay placa,
+    'placa' es None. 'filtros' fija qué filtros correr y en qué orden (por cámara).
+    Si el cuadro no pasa el control de calidad (ocr/calidad.py) se retorna sin OCR,
+    con 'motivo' (código) y 'calidad' (medidas). 'verificar_calidad=False' lo omite
+    cuando quien llama ya lo hizo (servicio OCR).
+    """
+    modo = (modo or OCR_MODO).lower()
+    umbral = OCR_UMBRAL_CASCADA if umbral is None else umbral
+    vacio = {'placa': None, 'modo': modo, 'etapa': None, 'salida_temprana': False}
+
+    # --- CONTROL DE CALIDAD: un cuadro inservible no paga filtros ni EasyOCR ---
+    if verificar_calidad:
+        from ocr.calidad import evaluar_calidad   # Import local: ocr.calidad importa este módulo
+        calidad = evaluar_calidad(imagen)
+        if not calidad['apta']:
+            print(f"🚫 Cuadro rechazado por calidad: {calidad['motivo']}")
+            return dict(vacio, motivo=calidad['motivo'], calidad=calidad)
+
+    # --- AHORRO DE MEMORIA: el gestor no descarga un modelo mientras se usa ---
+    with gestor_memoria.en_uso():
+        resultado = _barrer_cuadro(imagen, modo, umbral, filtros, vacio)
+
+    # Limpieza final (medida contra el presupuesto de RSS)
+    limpiar_memoria()
+    return resultado
+
+def detectar_placa(imagen) -> str | None:
+    """Retorna solo el texto de la placa detectada (o None)."""
+    return analizar_placa(imagen)['placa']
+
+# ==============================================================================
+# 6. VOTACIÓN MULTI-CUADRO (Modo ráfaga)
+# ==============================================================================
+# Puntaje máximo que puede aportar un cuadro (0 correcciones + bonus regex)
+SCORE_MAXIMO = 105
+
+class UrnaPlacas:
+    """
+    Acumula votos de varios cuadros ponderados por el score de evaluar_candidato.
+    'decidida' indica que el líder ya no puede ser alcanzado por los cuadros restantes.
+    """
+    def __init__(self, total_cuadros):
+        self.total_cuadros = total_cuadros
+        self.votos = Counter()
+        self.mejor_por_placa = {}
+        self.cuadros_contados = 0
+
+    def votar(self, resultado):
+        self.cuadros_contados += 1
+        placa = resultado.get('placa') if resultado else None
+        if not placa:
+            return
+        self.votos[placa] += resultado.get('score', 0)
+        previo = self.mejor_por_placa.get(placa)
+        if previo is None or resultado.get('score', 0) > previo.get('score', 0):
+            self.mejor_por_placa[placa] = resultado
+
+    def decidida(self):
+        if not self.votos:
+            return False
+        ranking = self.votos.most_common(2)
+        lider = ranking[0][1]
+        segundo = ranking[1][1] if len(ranking) > 1 else 0
+        restantes = self.total_cuadros - self.cuadros_contados
+        return lider - segundo > restantes * SCORE_MAXIMO
+
+    def resultado(self):
+        """Ganador con el detalle de su mejor cuadro, más el conteo de la votación."""
+        if not self.votos:
+            return {'placa': None, 'votos': {}, 'cuadros': self.cuadros_contados}
+        placa, _peso = self.votos.most_common(1)[0]
+        ganador = dict(self.mejor_por_placa[placa])
+        ganador['votos'] = dict(self.votos)
+        ganador['cuadros'] = self.cuadros_contados
+        return ganador
 
 # --- TEST LOCAL ---
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+# backend/ocr/estadisticas_filtros.py
+# Estadísticas por cámara (punto de control) del filtro que produce la placa ganadora.
+# Con ellas cada cámara corre primero el filtro que le suele funcionar y salta los que nunca ganan.
+import os
+import json
+import threading
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+OCR_FILTROS_ADAPTATIVOS = os.getenv("OCR_FILTROS_ADAPTATIVOS", "1") == "1"
+# Victorias registradas antes de confiar en el orden aprendido
+OCR_FILTROS_MIN_MUESTRAS = int(os.getenv("OCR_FILTROS_MIN_MUESTRAS", "30"))
+# Filtros que ganan menos que esta fracción se saltan
+OCR_FILTROS_MIN_PARTICIPACION = float(os.getenv("OCR_FILTROS_MIN_PARTICIPACION", "0.05"))
+# Cada N análisis de una cámara se corren todos los filtros para re-evaluar los saltados
+OCR_FILTROS_EXPLORACION = int(os.getenv("OCR_FILTROS_EXPLORACION", "20"))
+# Peso de la historia en cada victoria (< 1 olvida poco a poco: cambios de luz día/noche)
+OCR_FILTROS_DECAIMIENTO = float(os.getenv("OCR_FILTROS_DECAIMIENTO", "0.98"))
+# Archivo JSON opcional para conservar lo aprendido entre reinicios
+OCR_FILTROS_ARCHIVO = os.getenv("OCR_FILTROS_ARCHIVO", "")
+GUARDAR_CADA = 25
+
+GENERAL = "general"   # Clave para peticiones sin id_punto
+
+# ==============================================================================
+# 2. ALMACÉN
+# ==============================================================================
+class EstadisticasFiltros:
+    def __init__(self, archivo=OCR_FILTROS_ARCHIVO):
+        self.archivo = archivo
+        self._camaras = {}   # camara -> {'pesos': {filtro: float}, 'muestras': int, 'consultas': int}
+        self._lock = threading.Lock()
+        self._sin_guardar = 0
+        self.cargar()
+
+    def _camara(self, camara):
+        clave = GENERAL if camara is None else str(camara)
+        return self._camaras.setdefault(clave, {'pesos': {}, 'muestras': 0, 'consultas': 0})
+
+    def registrar(self, camara, filtros):
+        """
+        Anota que 'filtros' (uno o una lista) produjeron la placa ganadora en 'camara'.
+        Cada filtro que llegó a la placa suma una victoria completa: dos filtros igual de
+        buenos conservan el mismo peso aunque el orden aprendido ponga a uno primero.
+        """
+        if not filtros:
+            return
+        if isinstance(filtros, str):
+            filtros = [filtros]
+        with self._lock:
+            datos = self._camara(camara)
+            for nombre in datos['pesos']:
+                datos['pesos'][nombre] *= OCR_FILTROS_DECAIMIENTO
+            for filtro in filtros:
+                datos['pesos'][filtro] = datos['pesos'].get(filtro, 0.0) + 1.0
+            datos['muestras'] += 1
+            self._sin_guardar += 1
+            guardar = self.archivo and self._sin_guardar >= GUARDAR_CADA
+        if guardar:
+            self.guardar()
+
+    def orden_para(self, camara, orden_base):
+        """
+        Orden de filtros para la próxima imagen de 'camara': más victorias primero,
+        sin los que casi nunca ganan. None = usar el orden por defecto (pocos datos,
+        modo desactivado o turno de exploración).
+        """
+        if not OCR_FILTROS_ADAPTATIVOS:
+            return None
+        with self._lock:
+            datos = self._camara(camara)
+            datos['consultas'] += 1
+            if datos['muestras'] < OCR_FILTROS_MIN_MUESTRAS:
+                return None
+            if OCR_FILTROS_EXPLORACION > 0 and datos['consultas'] % OCR_FILTROS_EXPLORACION == 0:
+                return None
+            pesos = dict(datos['pesos'])   # Copia: se ordena fuera del lock
+            total = sum(pesos.values()) or 1.0
+
+        # Orden estable: a igual peso se respeta el orden base
+        orden = sorted(orden_base, key=lambda f: -pesos.get(f, 0.0))
+        utiles = [f for f in orden if pesos.get(f, 0.0) / total >= OCR_FILTROS_MIN_PARTICIPACION]
+        return utiles or orden[:1]
+
+    def metricas(self):
+        with self._lock:
+            return {
+                camara: {
+                    "muestras": datos['muestras'],
+                    "participacion": {f: round(p / (sum(datos['pesos'].values()) or 1.0), 3)
+                                      for f, p in sorted(datos['pesos'].items(), key=lambda x: -x[1])},
+                }
+                for camara, datos in self._camaras.items()
+            }
+
+    # --- Persistencia opcional ---
+    def guardar(self):
+        if not self.archivo:
+            return
+        with self._lock:
+            # Copia de los pesos dentro del lock: json.dump corre fuera y registrar() los modifica
+            instantanea = {c: {'pesos': dict(d['pesos']), 'muestras': d['muestras']} for c, d in self._camaras.items()}
+            self._sin_guardar = 0
+        # Temporal propio de este proceso e hilo (varios workers pueden compartir el archivo)
+        temporal = f"{self.archivo}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(instantanea, f)
+            os.replace(temporal, self.archivo)
+        except Exception as e:
+            print(f"⚠️ No se pudieron guardar las estadísticas de filtros: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    def cargar(self):
+        if not self.archivo or not os.path.exists(self.archivo):
+            return
+        try:
+            with open(self.archivo, encoding="utf-8") as f:
+                for camara, datos in json.load(f).items():
+                    self._camaras[camara] = {'pesos': datos['pesos'], 'muestras': datos['muestras'], 'consultas': 0}
+            print(f"📈 Estadísticas de filtros cargadas ({len(self._camaras)} cámaras)")
+        except Exception as e:
+            print(f"⚠️ Estadísticas de filtros ilegibles, se empieza de cero: {e}")
+
+# Instancia compartida por el proceso web (los workers reciben el orden ya calculado)
+estadisticas_filtros = EstadisticasFiltros()
@@ -0,0 +1,212 @@
+# backend/ocr/generador_sintetico.py
+# Generador de placas sintéticas (solo OpenCV, sin red) para medir el OCR sin fotos reales.
+# Uso:
+#   python ocr/generador_sintetico.py --salida corpus_sintetico --cantidad 500 --semilla 7
+#   python ocr/benchmark.py --dir corpus_sintetico --salida resultados.json
+#
+# Escribe <PLACA>_<n>.jpg y un 'etiquetas.csv' (archivo,placa,patron) que lee ocr/benchmark.py.
+import os
+import sys
+import csv
+import random
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ocr.detector import PATRONES, BLACKLIST
+
+LETRAS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+DIGITOS = "0123456789"
+
+# ==============================================================================
+# 1. ESTILOS DE PLACA (colores BGR y leyendas del marco)
+# ==============================================================================
+AMARILLO = (20, 200, 245)
+BLANCO = (245, 245, 245)
+NEGRO = (20, 20, 20)
+AZUL = (140, 60, 20)
+
+ESTILOS = {
+    # Carro colombiano: amarillo, 6 caracteres en una línea, ciudad abajo
+    'COL_CARRO': {'tamano': (330, 160), 'fondo': AMARILLO, 'tinta': NEGRO, 'lineas': [(0, 6)],
+                  'arriba': None, 'abajo': ['BOGOTA', 'MEDELLIN', 'ENVIGADO', 'SABANETA']},
+    # Moto colombiana: placa pequeña, dos líneas (ABC / 12D)
+    'COL_MOTO':  {'tamano': (200, 170), 'fondo': AMARILLO, 'tinta': NEGRO, 'lineas': [(0, 3), (3, 6)],
+                  'arriba': None, 'abajo': ['BOGOTA', 'MEDELLIN', 'COLOMBIA']},
+    # Auto venezolano: blanca, 7 caracteres, país arriba
+    'VEN_AUTO':  {'tamano': (330, 160), 'fondo': BLANCO, 'tinta': AZUL, 'lineas': [(0, 7)],
+                  'arriba': ['VENEZUELA'], 'abajo': None},
+}
+# Estilo por defecto para patrones nuevos que aún no tengan diseño propio
+ESTILO_GENERICO = {'tamano': (330, 160), 'fondo': BLANCO, 'tinta': NEGRO, 'lineas': None,
+                   'arriba': ['COLOMBIA'], 'abajo': None}
+
+# ==============================================================================
+# 2. TEXTO Y RENDER DE LA PLACA
+# ==============================================================================
+def placa_aleatoria(mascara, rng):
+    """Genera un texto válido para la máscara (L = letra, N = número)."""
+    return "".join(rng.choice(LETRAS if t == 'L' else DIGITOS) for t in mascara)
+
+def _escribir_centrado(img, texto, caja, color, grosor, rng):
+    """Dibuja 'texto' ajustado al ancho/alto de 'caja' = (x, y, ancho, alto)."""
+    x, y, ancho, alto = caja
+    fuente = rng.choice([cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX])
+    (tw, th), _ = cv2.getTextSize(texto, fuente, 1.0, grosor)
+    escala = min(ancho / tw, alto / th) * 0.92
+    (tw, th), _ = cv2.getTextSize(texto, fuente, escala, grosor)
+    origen = (x + (ancho - tw) // 2, y + (alto + th) // 2)
+    cv2.putText(img, texto, origen, fuente, escala, color, grosor, cv2.LINE_AA)
+
+def dibujar_placa(texto, patron, rng):
+    """Renderiza la placa frontal (sin perspectiva) con su marco y leyendas."""
+    estilo = ESTILOS.get(patron, ESTILO_GENERICO)
+    ancho, alto = estilo['tamano']
+    placa = np.full((alto, ancho, 3), estilo['fondo'], np.uint8)
+    cv2.rectangle(placa, (3, 3), (ancho - 4, alto - 4), estilo['tinta'], 4)
+
+    margen_sup = int(alto * 0.18) if estilo['arriba'] else int(alto * 0.08)
+    margen_inf = int(alto * 0.18) if estilo['abajo'] else int(alto * 0.08)
+    if estilo['arriba']:
+        _escribir_centrado(placa, rng.choice(estilo['arriba']), (20, 6, ancho - 40, margen_sup - 8), estilo['tinta'], 1, rng)
+    if estilo['abajo']:
+        _escribir_centrado(placa, rng.choice(estilo['abajo']), (30, alto - margen_inf, ancho - 60, margen_inf - 6), estilo['tinta'], 1, rng)
+
+    lineas = estilo['lineas'] or [(0, len(texto))]
+    alto_linea = (alto - margen_sup - margen_inf) // len(lineas)
+    for i, (ini, fin) in enumerate(lineas):
+        caja = (12, margen_sup + i * alto_linea, ancho - 24, alto_linea)
+        _escribir_centrado(placa, texto[ini:fin], caja, estilo['tinta'], rng.randint(6, 9), rng)
+    return placa
+
+# ==============================================================================
+# 3. ESCENA Y DEGRADACIONES (perspectiva, sombra, desenfoque, ruido)
+# ==============================================================================
+def fondo_escena(ancho, alto, rng):
+    """Fondo tipo parachoques/calle: degradado con rectángulos que imitan la carrocería."""
+    base = rng.randint(40, 180)
+    degradado = np.linspace(base, min(255, base + rng.randint(20, 70)), alto, dtype=np.float32)
+    escena = np.repeat(degradado[:, None], ancho, axis=1)
+    escena = cv2.merge([escena + rng.randint(-15, 15) for _ in range(3)])
+    escena = np.clip(escena, 0, 255).astype(np.uint8)
+    for _ in range(rng.randint(2, 5)):
+        x, y = rng.randint(0, ancho), rng.randint(0, alto)
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        cv2.rectangle(escena, (x, y), (x + rng.randint(60, ancho // 2), y + rng.randint(20, alto // 4)), color, -1)
+    return escena
+
+def pegar_con_perspectiva(escena, placa, rng, ancho_relativo):
+    """Deforma la placa con una homografía aleatoria y la pega en la escena."""
+    alto_e, ancho_e = escena.shape[:2]
+    alto_p, ancho_p = placa.shape[:2]
+    ancho_dest = int(ancho_e * ancho_relativo)
+    alto_dest = int(ancho_dest * alto_p / ancho_p)
+    x0 = rng.randint(int(ancho_e * 0.1), max(int(ancho_e * 0.1) + 1, ancho_e - ancho_dest - int(ancho_e * 0.1)))
+    y0 = rng.randint(int(alto_e * 0.3), max(int(alto_e * 0.3) + 1, alto_e - alto_dest - int(alto_e * 0.05)))
+
+    # Esquinas destino con inclinación y giro leves (cámara de portería no frontal)
+    j = lambda v: int(v * rng.uniform(-0.08, 0.08))
+    destino = np.float32([
+        [x0 + j(ancho_dest), y0 + j(alto_dest)],
+        [x0 + ancho_dest + j(ancho_dest), y0 + j(alto_dest)],
+        [x0 + ancho_dest + j(ancho_dest), y0 + alto_dest + j(alto_dest)],
+        [x0 + j(ancho_dest), y0 + alto_dest + j(alto_dest)],
+    ])
+    origen = np.float32([[0, 0], [ancho_p, 0], [ancho_p, alto_p], [0, alto_p]])
+    matriz = cv2.getPerspectiveTransform(origen, destino)
+    deformada = cv2.warpPerspective(placa, matriz, (ancho_e, alto_e))
+    mascara = cv2.warpPerspective(np.full((alto_p, ancho_p), 255, np.uint8), matriz, (ancho_e, alto_e))
+    escena[mascara > 0] = deformada[mascara > 0]
+    return escena
+
+def aplicar_sombra(img, rng):
+    """Oscurece un polígono aleatorio (sombra de la talanquera o del techo)."""
+    alto, ancho = img.shape[:2]
+    puntos = np.array([[rng.randint(0, ancho), rng.randint(0, alto)] for _ in range(4)], np.int32)
+    capa = img.copy()
+    cv2.fillPoly(capa, [cv2.convexHull(puntos)], (0, 0, 0))
+    opacidad = rng.uniform(0.25, 0.55)
+    return cv2.addWeighted(capa, opacidad, img, 1 - opacidad, 0)
+
+def aplicar_desenfoque(img, rng):
+    if rng.random() < 0.5:
+        k = rng.choice([3, 5, 7])
+        return cv2.GaussianBlur(img, (k, k), 0)
+    # Desenfoque de movimiento horizontal (carro llegando a la barrera)
+    k = rng.randint(5, 13)
+    nucleo = np.zeros((k, k), np.float32)
+    nucleo[k // 2, :] = 1.0 / k
+    return cv2.filter2D(img, -1, nucleo)
+
+def aplicar_ruido(img, rng, sigma):
+    ruido = np.random.default_rng(rng.randint(0, 2**31)).normal(0, sigma, img.shape)
+    return np.clip(img.astype(np.float32) + ruido, 0, 255).astype(np.uint8)
+
+def generar_cuadro(patron, rng, ancho=1280, alto=720, dificultad=0.5):
+    """
+    Retorna (imagen_bgr, placa) de un cuadro sintético para el patrón dado.
+    'dificultad' (0..1) controla la probabilidad e intensidad de las degradaciones.
+    """
+    texto = placa_aleatoria(PATRONES[patron]['mask'], rng)
+    placa = dibujar_placa(texto, patron, rng)
+    escena = fondo_escena(ancho, alto, rng)
+    escena = pegar_con_perspectiva(escena, placa, rng, rng.uniform(0.18, 0.32))
+
+    # Leyendas sueltas del marco/vehículo fuera de la placa (ruido que el detector ignora)
+    if rng.random() < 0.5:
+        palabra = rng.choice(BLACKLIST)
+        cv2.putText(escena, palabra, (rng.randint(0, ancho // 2), rng.randint(30, alto // 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, rng.uniform(0.8, 1.6), (230, 230, 230), 2, cv2.LINE_AA)
+
+    if rng.random() < dificultad:
+        escena = aplicar_sombra(escena, rng)
+    if rng.random() < dificultad:
+        escena = aplicar_desenfoque(escena, rng)
+    escena = aplicar_ruido(escena, rng, sigma=2 + 14 * dificultad * rng.random())
+    return escena, texto
+
+# ==============================================================================
+# 4. CORPUS
+# ==============================================================================
+def generar_corpus(directorio, cantidad, patrones=None, semilla=None, ancho=1280, alto=720,
+                   dificultad=0.5, calidad_jpeg=85):
+    """
+    Escribe 'cantidad' cuadros repartidos entre 'patrones' (por defecto todos los
+    de PATRONES) y su 'etiquetas.csv'. Misma semilla = mismo corpus.
+    """
+    patrones = patrones or list(PATRONES)
+    rng = random.Random(semilla)
+    os.makedirs(directorio, exist_ok=True)
+
+    filas = []
+    for i in range(cantidad):
+        patron = patrones[i % len(patrones)]
+        img, placa = generar_cuadro(patron, rng, ancho, alto, dificultad)
+        nombre = f"{placa}_{i:05d}.jpg"
+        cv2.imwrite(os.path.join(directorio, nombre), img, [cv2.IMWRITE_JPEG_QUALITY, calidad_jpeg])
+        filas.append((nombre, placa, patron))
+
+    with open(os.path.join(directorio, "etiquetas.csv"), "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["archivo", "placa", "patron"])
+        escritor.writerows(filas)
+    print(f"🧪 {len(filas)} cuadros sintéticos en {directorio} ({', '.join(patrones)})")
+    return filas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un corpus etiquetado de placas sintéticas")
+    parser.add_argument("--salida", default="corpus_sintetico")
+    parser.add_argument("--cantidad", type=int, default=100)
+    parser.add_argument("--patrones", nargs="*", choices=list(PATRONES), help="Por defecto todos")
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--ancho", type=int, default=1280)
+    parser.add_argument("--alto", type=int, default=720)
+    parser.add_argument("--dificultad", type=float, default=0.5, help="0 = limpio, 1 = muy degradado")
+    parser.add_argument("--calidad-jpeg", type=int, default=85)
+    args = parser.parse_args()
+
+    generar_corpus(args.salida, args.cantidad, args.patrones, args.semilla,
+                   args.ancho, args.alto, args.dificultad, args.calidad_jpeg)
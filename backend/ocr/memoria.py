@@ -0,0 +1,180 @@
+# backend/ocr/memoria.py
+# Gestor de memoria del modelo OCR en el proceso que lo tiene cargado (worker del pool o,
+# sin pool, el proceso web): presupuesto de RSS, descarga por inactividad, precarga
+# programada antes de las horas pico y recolección de basura solo cuando hace falta.
+import os
+import gc
+import time
+import ctypes
+import datetime
+import threading
+from contextlib import contextmanager
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# Presupuesto de memoria residente por proceso en MB (0 = sin presupuesto)
+OCR_MEMORIA_MAX_MB = float(os.getenv("OCR_MEMORIA_MAX_MB", "0"))
+# Fracción del presupuesto a partir de la cual se corre gc.collect() tras un análisis
+OCR_MEMORIA_UMBRAL_GC = float(os.getenv("OCR_MEMORIA_UMBRAL_GC", "0.85"))
+# Segundos sin uso tras los que se descarga el modelo (0 = nunca)
+OCR_INACTIVIDAD_TTL = float(os.getenv("OCR_INACTIVIDAD_TTL", "0"))
+# Horas locales de precarga antes de los picos, ej: "06:30,11:45,17:00" (vacío = ninguna)
+OCR_PRECARGA_HORAS = [h.strip() for h in os.getenv("OCR_PRECARGA_HORAS", "").split(",") if h.strip()]
+# Minutos tras la hora programada en los que todavía se hace la precarga (reinicios, retrasos)
+OCR_PRECARGA_VENTANA_MIN = int(os.getenv("OCR_PRECARGA_VENTANA_MIN", "10"))
+# Segundos entre revisiones del hilo vigilante
+OCR_MEMORIA_INTERVALO = float(os.getenv("OCR_MEMORIA_INTERVALO", "30"))
+
+# ==============================================================================
+# 2. MEDICIÓN
+# ==============================================================================
+_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_mb():
+    """Memoria residente ACTUAL del proceso en MB (Linux: /proc; otros: pico vía resource)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * _PAGINA / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError):
+        import resource, platform
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(pico / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+def devolver_memoria_al_so():
+    """Tras liberar el modelo, glibc conserva las páginas libres: malloc_trim las devuelve."""
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+# ==============================================================================
+# 3. GESTOR
+# ==============================================================================
+class GestorMemoria:
+    """
+    'descargar' libera el modelo y 'precargar' lo carga (y calienta); ambos los
+    provee ocr.detector. Los análisis se marcan con 'en_uso()' para que el vigilante
+    nunca descargue un modelo que se está usando (sin pool hay varios hilos de Flask).
+    """
+    def __init__(self, descargar, precargar, esta_cargado):
+        self.descargar = descargar
+        self.precargar = precargar
+        self.esta_cargado = esta_cargado
+        self.al_cambiar = None      # Callback opcional (el worker reporta su estado al proceso web)
+        self._lock = threading.Lock()
+        self._activos = 0
+        self._ultimo_uso = time.monotonic()
+        self._precargas_hechas = set()   # (fecha, hora) ya atendidas
+        self._hilo = None
+        self.contadores = {"cargas": 0, "descargas_inactividad": 0, "descargas_presupuesto": 0,
+                           "precargas": 0, "gc_forzados": 0, "gc_liberado_mb": 0.0, "excesos_presupuesto": 0}
+        self.ultimo_rss_mb = None
+
+    # --- Uso del modelo ---
+    @contextmanager
+    def en_uso(self):
+        with self._lock:
+            self._activos += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._activos -= 1
+                self._ultimo_uso = time.monotonic()
+
+    def registrar_carga(self):
+        self.contadores["cargas"] += 1
+        self._ultimo_uso = time.monotonic()
+
+    def despues_de_analisis(self):
+        """
+        Recolección medida: solo se corre gc.collect() si el RSS pasa el umbral del
+        presupuesto. Si aún así se excede y nadie usa el modelo, se descarga (la
+        próxima petición lo recarga). Sin presupuesto no se fuerza nada.
+        """
+        rss = self.ultimo_rss_mb = rss_mb()
+        if not OCR_MEMORIA_MAX_MB or rss < OCR_MEMORIA_MAX_MB * OCR_MEMORIA_UMBRAL_GC:
+            return self._notificar()
+        gc.collect()
+        devolver_memoria_al_so()
+        despues = self.ultimo_rss_mb = rss_mb()
+        self.contadores["gc_forzados"] += 1
+        self.contadores["gc_liberado_mb"] = round(self.contadores["gc_liberado_mb"] + max(0.0, rss - despues), 1)
+        if despues > OCR_MEMORIA_MAX_MB:
+            self.contadores["excesos_presupuesto"] += 1
+            print(f"⚠️ RSS {despues} MB sobre el presupuesto ({OCR_MEMORIA_MAX_MB} MB)")
+            if self._descargar_si_libre():
+                self.contadores["descargas_presupuesto"] += 1
+        self._notificar()
+
+    # --- Descarga / precarga ---
+    def _descargar_si_libre(self):
+        with self._lock:
+            if self._activos or not self.esta_cargado():
+                return False
+            antes = rss_mb()
+            self.descargar()
+        gc.collect()
+        devolver_memoria_al_so()
+        self.ultimo_rss_mb = rss_mb()
+        print(f"💤 Modelo OCR descargado (RSS {antes} -> {self.ultimo_rss_mb} MB)")
+        return True
+
+    def _precarga_pendiente(self, ahora):
+        for hora in OCR_PRECARGA_HORAS:
+            try:
+                hh, mm = (int(x) for x in hora.split(":"))
+            except ValueError:
+                continue
+            inicio = ahora.replace(hour=hh, minute=mm, second=0, microsecond=0)
+            clave = (ahora.date(), hora)
+            if clave not in self._precargas_hechas and inicio <= ahora < inicio + datetime.timedelta(minutes=OCR_PRECARGA_VENTANA_MIN):
+                self._precargas_hechas = {c for c in self._precargas_hechas if c[0] == ahora.date()} | {clave}
+                return hora
+        return None
+
+    def revisar(self, ahora=None):
+        """Una pasada del vigilante: precarga programada y descarga por inactividad."""
+        hora = self._precarga_pendiente(ahora or datetime.datetime.now())
+        if hora and not self.esta_cargado():
+            print(f"⏰ Precarga programada del modelo OCR ({hora})")
+            self.precargar()
+            self.contadores["precargas"] += 1
+            self._ultimo_uso = time.monotonic()
+            self._notificar()
+        elif (OCR_INACTIVIDAD_TTL > 0 and self.esta_cargado()
+              and time.monotonic() - self._ultimo_uso > OCR_INACTIVIDAD_TTL):
+            if self._descargar_si_libre():
+                self.contadores["descargas_inactividad"] += 1
+                self._notificar()
+
+    def _vigilar(self):
+        while True:
+            time.sleep(OCR_MEMORIA_INTERVALO)
+            try:
+                self.revisar()
+            except Exception as e:
+                print(f"❌ Error en el gestor de memoria OCR: {e}")
+
+    def iniciar(self):
+        """Arranca el hilo vigilante (idempotente; solo si hay TTL o precargas configuradas)."""
+        if self._hilo is not None or (OCR_INACTIVIDAD_TTL <= 0 and not OCR_PRECARGA_HORAS):
+            return
+        self._hilo = threading.Thread(target=self._vigilar, name="ocr-memoria", daemon=True)
+        self._hilo.start()
+
+    def _notificar(self):
+        if self.al_cambiar is not None:
+            self.al_cambiar()
+
+    def metricas(self):
+        return {
+            "rss_mb": rss_mb(),
+            "presupuesto_mb": OCR_MEMORIA_MAX_MB or None,
+            "modelo_cargado": bool(self.esta_cargado()),
+            "inactivo_s": round(time.monotonic() - self._ultimo_uso, 1),
+            "inactividad_ttl_s": OCR_INACTIVIDAD_TTL or None,
+            "precarga_horas": OCR_PRECARGA_HORAS,
+            **self.contadores,
+        }
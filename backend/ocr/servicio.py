@@ -0,0 +1,387 @@
+# backend/ocr/servicio.py
+# Capa de servicio OCR: pool de procesos donde cada worker carga EasyOCR una sola vez.
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+
+from ocr.detector import imagen_a_bytes, decodificar_imagen, dimensiones_imagen, UrnaPlacas, FILTROS, ORDEN_CASCADA, OCR_MODO
+from ocr.cache import cache_resultados, hash_perceptual, OCR_CACHE_PIXELES
+from ocr.estadisticas_filtros import estadisticas_filtros
+from ocr.calidad import evaluar_calidad_decodificada, metricas_calidad
+from ocr.memoria import rss_mb
+
+# ==============================================================================
+# 1. CONFIGURACIÓN (Variables de entorno)
+# ==============================================================================
+# OCR_WORKERS = 0 desactiva el pool y ejecuta el OCR en el mismo proceso (modo antiguo)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+# Segundos máximos que una petición espera por su resultado
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "30"))
+# Máximo de cuadros aceptados en una petición en modo ráfaga
+OCR_RAFAGA_MAX = int(os.getenv("OCR_RAFAGA_MAX", "8"))
+# OCR_CALENTAR = 1 carga el modelo y corre una inferencia de prueba al arrancar el proceso
+OCR_CALENTAR = os.getenv("OCR_CALENTAR", "0") == "1"
+# Segundos que se tolera para quedar listo tras el arranque (se reporta si se excede)
+OCR_PRESUPUESTO_ARRANQUE = float(os.getenv("OCR_PRESUPUESTO_ARRANQUE", "120"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_cola_estados = None     # Los workers reportan aquí su ESTADO_MODELO al terminar de cargar
+_estado_workers = {}     # pid -> último estado reportado (incluye 'memoria' del worker)
+_arranque = {'inicio': None, 'fin': None}
+
+# ==============================================================================
+# 2. CÓDIGO QUE CORRE DENTRO DE CADA WORKER
+# ==============================================================================
+def _inicializar_worker(cola_estados=None, calentar=False):
+    """
+    Se ejecuta una sola vez al arrancar cada proceso del pool.
+    Carga el modelo EasyOCR para que ninguna petición pague la carga y, con
+    'calentar', corre además una inferencia de prueba. Reporta su estado al proceso web
+    y, en adelante, cada cambio de memoria (análisis, descarga, precarga).
+    """
+    from ocr.detector import get_reader, calentar_modelo, gestor_memoria
+    print(f"🔧 Worker OCR {os.getpid()} iniciando...")
+    if cola_estados is not None:
+        gestor_memoria.al_cambiar = lambda: cola_estados.put(_estado_proceso())
+    gestor_memoria.iniciar()
+    if calentar:
+        calentar_modelo()
+    else:
+        get_reader()
+    if cola_estados is not None:
+        cola_estados.put(_estado_proceso())
+
+def _estado_proceso():
+    """Estado del modelo y de la memoria de ESTE proceso."""
+    from ocr.detector import ESTADO_MODELO, gestor_memoria
+    return dict(ESTADO_MODELO, memoria=gestor_memoria.metricas())
+
+def _tarea_ping():
+    """Tarea vacía: obliga al pool a lanzar el worker (y su inicializador)."""
+    return os.getpid()
+
+def _tarea_analizar(imagen, filtros=None):
+    """
+    Tarea enviada a la cola del pool: corre el detector con el reader ya cargado.
+    El control de calidad ya se hizo en el proceso web antes de encolar.
+    """
+    from ocr.detector import analizar_placa
+    return analizar_placa(imagen, filtros=filtros, verificar_calidad=False)
+
+# ==============================================================================
+# 3. GESTIÓN DEL POOL (Proceso web)
+# ==============================================================================
+def iniciar_pool():
+    """
+    Crea el pool de workers (idempotente). Usa 'spawn' porque torch no es
+    seguro tras un fork de un proceso con hilos (Flask/Gunicorn).
+    """
+    global _pool, _cola_estados
+    with _pool_lock:
+        if _pool is None and OCR_WORKERS > 0:
+            print(f"⚡ Iniciando pool OCR con {OCR_WORKERS} workers...")
+            contexto = multiprocessing.get_context("spawn")
+            _cola_estados = contexto.Queue()
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=contexto,
+                initializer=_inicializar_worker,
+                initargs=(_cola_estados, OCR_CALENTAR)
+            )
+    return _pool
+
+def detener_pool():
+    """Cierra los workers (útil en tests locales o al apagar el servidor)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            _estado_workers.clear()
+
+def _ejecutar_en_pool(imagen, filtros=None):
+    """
+    Envía la imagen a la cola del pool y espera el resultado. Si el análisis no terminó
+    retorna {'placa': None, 'fallo': 'tiempo' | 'worker'} (distinto de "no hay placa").
+    """
+    pool = iniciar_pool()
+    if pool is None:
+        return _tarea_analizar(imagen, filtros)
+
+    futuro = pool.submit(_tarea_analizar, imagen, filtros)
+    try:
+        resultado = futuro.result(timeout=OCR_TIMEOUT)
+        _recoger_estados()   # Los reportes de memoria viajan junto a cada análisis
+        return resultado
+    except FuturesTimeout:
+        futuro.cancel()
+        print(f"⏱️ OCR superó el tiempo límite ({OCR_TIMEOUT}s)")
+        return {'placa': None, 'fallo': 'tiempo'}
+    except Exception as e:
+        # BrokenProcessPool u otro error del worker: reiniciamos el pool
+        print(f"❌ Error en worker OCR: {e}")
+        detener_pool()
+        return {'placa': None, 'fallo': 'worker'}
+
+def analizar_imagen(imagen, id_punto=None):
+    """
+    Punto de entrada para los controladores. Retorna el detalle del análisis
+    (ver ocr.detector.analizar_placa); si no se pudo leer, 'placa' es None.
+    Antes de ir al pool consulta la caché perceptual de la cámara ('id_punto'):
+    un carro quieto en la barrera no vuelve a pagar EasyOCR. Sin 'id_punto' no se
+    usa la caché.
+    Un cuadro que no pasa el control de calidad se rechaza aquí, sin ir al pool:
+    'placa' None con 'motivo' (código de ocr/calidad.py) y 'calidad'.
+    """
+    # Base64 -> bytes aquí: al worker viaja un 25% menos y el hash usa los mismos bytes
+    datos = imagen_a_bytes(imagen)
+    img, dims = _decodificar_reducida(datos)
+    rechazo = _rechazo_calidad(img, dims)
+    if rechazo is not None:
+        return rechazo
+    valor_hash = hash_perceptual(img)
+
+    camara = str(id_punto) if id_punto is not None else None  # JSON trae int, la URL trae str
+    previo = cache_resultados.buscar(camara, valor_hash)
+    if previo is not None:
+        print(f"♻️ Resultado OCR desde caché ({previo['placa']})")
+        return dict(previo, cache=True)
+
+    # Orden de filtros aprendido para esta cámara (None = todos, orden por defecto)
+    filtros = orden_filtros(camara)
+    resultado = _ejecutar_en_pool(datos, filtros)
+    saltados = [f for f in filtros_base() if f not in filtros] if filtros else []
+    if not resultado.get('placa') and not resultado.get('fallo') and saltados:
+        # Solo los filtros saltados podrían leerla (tras un timeout o un worker caído no se reintenta)
+        resultado = _ejecutar_en_pool(datos, saltados)
+    # Solo guardamos lecturas exitosas: un fallo no debe repetirse al reintentar
+    if resultado.get('placa'):
+        cache_resultados.guardar(camara, valor_hash, resultado)
+        estadisticas_filtros.registrar(camara, resultado.get('filtros_ganadores') or resultado.get('filtro'))
+    return resultado
+
+def _decodificar_reducida(datos):
+    """
+    Única decodificación del cuadro en el proceso web: copia BGR reducida a OCR_CACHE_PIXELES
+    (JPEG se reduce dentro del decodificador) que comparten el control de calidad y el hash.
+    Retorna (img o None, (ancho, alto) del cuadro original).
+    """
+    dims = dimensiones_imagen(datos)
+    img = decodificar_imagen(datos, max_pixeles=OCR_CACHE_PIXELES)
+    if dims is None and img is not None:
+        dims = (img.shape[1], img.shape[0])
+    return img, dims
+
+def _rechazo_calidad(img, dims):
+    """Resultado vacío con el motivo si el cuadro no es apto para OCR; None si lo es."""
+    calidad = evaluar_calidad_decodificada(img, *(dims or (None, None)))
+    if calidad['apta']:
+        return None
+    print(f"🚫 Cuadro rechazado por calidad: {calidad['motivo']} ({calidad['ms']} ms)")
+    return {'placa': None, 'modo': OCR_MODO, 'etapa': None, 'salida_temprana': False,
+            'motivo': calidad['motivo'], 'calidad': calidad}
+
+def filtros_base():
+    """Todos los filtros, en el orden por defecto del modo configurado."""
+    return ORDEN_CASCADA if OCR_MODO == 'cascada' else list(FILTROS)
+
+def orden_filtros(camara):
+    """Filtros a correr para 'camara' según sus victorias históricas (o None)."""
+    return estadisticas_filtros.orden_para(camara, filtros_base())
+
+def analizar_rafaga(imagenes, id_punto=None):
+    """
+    Modo ráfaga: varios cuadros del mismo paso por la barrera se analizan en
+    paralelo en el pool y se vota la placa ponderando por score. En cuanto una
+    placa ya no puede ser alcanzada por los cuadros pendientes, se cancelan y
+    se responde. Retorna el mismo dict que analizar_imagen más 'votos' y 'cuadros'.
+    Los cuadros que no pasan el control de calidad no se envían al pool; si ninguno
+    da placa, 'motivo' es el rechazo más frecuente.
+    """
+    imagenes = list(imagenes)[:OCR_RAFAGA_MAX]
+    camara = str(id_punto) if id_punto is not None else None
+    urna = UrnaPlacas(len(imagenes))
+    filtros = orden_filtros(camara)
+
+    pendientes = []   # (datos, hash) que no estaban en caché
+    rechazos = Counter()
+    for imagen in imagenes:
+        datos = imagen_a_bytes(imagen)
+        img, dims = _decodificar_reducida(datos)
+        rechazo = _rechazo_calidad(img, dims)
+        if rechazo is not None:
+            rechazos[rechazo['motivo']] += 1
+            urna.votar(rechazo)
+            continue
+        valor_hash = hash_perceptual(img)
+        previo = cache_resultados.buscar(camara, valor_hash)
+        if previo is not None:
+            urna.votar(previo)
+        else:
+            pendientes.append((datos, valor_hash))
+
+    pool = iniciar_pool()
+    if pool is None:
+        # Sin pool: secuencial, pero igual cortamos apenas hay mayoría
+        for datos, valor_hash in pendientes:
+            if urna.decidida(): break
+            resultado = _tarea_analizar(datos, filtros)
+            if resultado.get('placa'):
+                cache_resultados.guardar(camara, valor_hash, resultado)
+            urna.votar(resultado)
+    elif pendientes and not urna.decidida():
+        futuros = {pool.submit(_tarea_analizar, datos, filtros): valor_hash for datos, valor_hash in pendientes}
+        try:
+            for futuro in as_completed(futuros, timeout=OCR_TIMEOUT):
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    print(f"❌ Error en worker OCR (ráfaga): {e}")
+                    resultado = {'placa': None}
+                if resultado.get('placa'):
+                    cache_resultados.guardar(camara, futuros[futuro], resultado)
+                urna.votar(resultado)
+                if urna.decidida():
+                    break
+        except FuturesTimeout:
+            print(f"⏱️ Ráfaga OCR superó el tiempo límite ({OCR_TIMEOUT}s)")
+        for futuro in futuros:
+            futuro.cancel()
+        _recoger_estados()
+
+    ganador = urna.resultado()
+    estadisticas_filtros.registrar(camara, ganador.get('filtros_ganadores') or ganador.get('filtro'))
+    ganador['salida_temprana_rafaga'] = urna.cuadros_contados < len(imagenes)
+    ganador['rechazados_calidad'] = sum(rechazos.values())
+    if not ganador.get('placa') and rechazos:
+        ganador['motivo'] = rechazos.most_common(1)[0][0]
+    print(f"🗳️ Ráfaga: {urna.cuadros_contados}/{len(imagenes)} cuadros -> {ganador['placa']} {ganador['votos']}")
+    return ganador
+
+def reconocer_placa(imagen, id_punto=None):
+    """Atajo que retorna solo la placa detectada (o None)."""
+    return analizar_imagen(imagen, id_punto).get('placa')
+
+# ==============================================================================
+# 4. CALENTAMIENTO Y DISPONIBILIDAD (readiness)
+# ==============================================================================
+def _calentar():
+    _arranque['inicio'] = time.monotonic()
+    if OCR_WORKERS > 0:
+        # Un ping por worker: con 'spawn' el pool lanza los procesos bajo demanda
+        pool = iniciar_pool()
+        for futuro in [pool.submit(_tarea_ping) for _ in range(OCR_WORKERS)]:
+            try:
+                futuro.result(timeout=OCR_PRESUPUESTO_ARRANQUE)
+            except Exception as e:
+                print(f"❌ Worker OCR no arrancó: {e}")
+    else:
+        from ocr.detector import calentar_modelo
+        calentar_modelo()
+    _arranque['fin'] = time.monotonic()
+
+    duracion = _arranque['fin'] - _arranque['inicio']
+    if duracion > OCR_PRESUPUESTO_ARRANQUE:
+        print(f"⚠️ Arranque OCR tardó {duracion:.1f}s (presupuesto {OCR_PRESUPUESTO_ARRANQUE}s)")
+    else:
+        print(f"🔥 OCR listo en {duracion:.1f}s")
+
+def iniciar_calentamiento():
+    """
+    Con OCR_CALENTAR=1 carga y calienta el modelo en segundo plano al arrancar,
+    para que el balanceador solo envíe tráfico cuando /api/ocr/listo responda 200.
+    No hace nada dentro de los workers (con 'spawn' re-importan el módulo principal).
+    Sin pool arranca aquí el gestor de memoria (con pool lo arranca cada worker).
+    """
+    if multiprocessing.parent_process() is not None:
+        return
+    if OCR_WORKERS == 0:
+        from ocr.detector import gestor_memoria
+        gestor_memoria.iniciar()
+    if not OCR_CALENTAR:
+        return
+    if _arranque['inicio'] is not None:
+        return
+    threading.Thread(target=_calentar, name="ocr-calentamiento", daemon=True).start()
+
+def _recoger_estados():
+    """Vacía la cola de reportes de los workers (sin bloquear)."""
+    if _cola_estados is None:
+        return
+    while True:
+        try:
+            estado = _cola_estados.get_nowait()
+        except (queue.Empty, OSError, ValueError):
+            return
+        _estado_workers[estado['pid']] = estado
+
+def estado_ocr():
+    """
+    Disponibilidad del OCR. 'listo' es True cuando todos los workers (o el proceso,
+    sin pool) tienen el modelo cargado y, con OCR_CALENTAR, ya corrieron la inferencia
+    de prueba. Sin calentamiento la carga es perezosa y el servicio se da por listo
+    mientras ningún worker haya fallado.
+    """
+    if OCR_WORKERS > 0:
+        _recoger_estados()
+        estados = list(_estado_workers.values())
+    else:
+        from ocr.detector import ESTADO_MODELO
+        estados = [_estado_proceso()] if ESTADO_MODELO['estado'] != 'sin_cargar' else []
+
+    esperado = 'listo' if OCR_CALENTAR else 'cargado'
+    con_error = [e for e in estados if e['estado'] == 'error']
+    # Un worker que ya se calentó sigue contando aunque el gestor haya descargado el modelo
+    calientes = [e for e in estados if e['estado'] in (esperado, 'listo')
+                 or (e['estado'] != 'error' and e.get('calentamiento_ms') is not None)]
+    if con_error:
+        listo = False
+    elif OCR_CALENTAR:
+        listo = len(calientes) >= max(1, OCR_WORKERS)
+    else:
+        listo = True
+
+    transcurrido = None
+    if _arranque['inicio'] is not None:
+        transcurrido = round((_arranque['fin'] or time.monotonic()) - _arranque['inicio'], 2)
+    return {
+        "listo": listo,
+        "calentamiento": OCR_CALENTAR,
+        "workers_esperados": OCR_WORKERS,
+        "workers_listos": len(calientes),
+        "arranque_s": transcurrido,
+        "presupuesto_arranque_s": OCR_PRESUPUESTO_ARRANQUE,
+        "excede_presupuesto": transcurrido is not None and transcurrido > OCR_PRESUPUESTO_ARRANQUE,
+        "errores": [e['error'] for e in con_error],
+        "workers": estados,
+    }
+
+def metricas_ocr():
+    """Estado del servicio OCR para ajuste en producción."""
+    estado = estado_ocr()
+    cargas = [w['carga_ms'] for w in estado['workers'] if w.get('carga_ms') is not None]
+    calentamientos = [w['calentamiento_ms'] for w in estado['workers'] if w.get('calentamiento_ms') is not None]
+    return {
+        "pool": {"workers": OCR_WORKERS, "activo": _pool is not None, "timeout_s": OCR_TIMEOUT,
+                 "rafaga_max": OCR_RAFAGA_MAX},
+        "modelo": {
+            "listo": estado["listo"],
+            "carga_ms_max": max(cargas) if cargas else None,
+            "calentamiento_ms_max": max(calentamientos) if calentamientos else None,
+            "arranque_s": estado["arranque_s"],
+            "excede_presupuesto": estado["excede_presupuesto"],
+        },
+        "cache": cache_resultados.metricas(),
+        "filtros_por_camara": estadisticas_filtros.metricas(),
+        "calidad": metricas_calidad(),
+        "memoria": {
+            "proceso_web_mb": rss_mb(),
+            "workers_mb": {w['pid']: w['memoria']['rss_mb'] for w in estado['workers'] if w.get('memoria')},
+            "modelos_cargados": sum(1 for w in estado['workers'] if w.get('memoria', {}).get('modelo_cargado')),
+        },
+    }
@@ -3,11 +3,12 @@
 # ===========================================================
 import sys
 import os
+import json
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-from flask import Flask, jsonify, request, render_template, send_from_directory, send_file
+from flask import Flask, jsonify, request, render_template, send_from_directory, send_file, Response, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import jwt
@@ -21,10 +22,11 @@ from reportlab.pdfgen import canvas
 # ===========================================================
 # IMPORTACIONES (Estructura Plana para Despliegue)
 # ===========================================================
-from core.db.connection import get_connection
+from core.db.connection import get_connection, metricas_pool
 from models.user_model import verificar_usuario
-from core.auditoria_utils import registrar_auditoria_global 
+from core.auditoria_utils import registrar_auditoria_global, escritor_auditoria
 from core.pico_placa import verificar_pico_placa 
+from ocr.servicio import metricas_ocr, estado_ocr, iniciar_calentamiento
 
 # Controladores
 from core.controller_personas import (
@@ -36,8 +38,13 @@ from core.controller_vehiculos import (
     crear_vehiculo_controller, actualizar_vehiculo_controller
 )
 from core.controller_accesos import (
-    obtener_historial_accesos, procesar_validacion_acceso
+    obtener_historial_accesos, procesar_validacion_acceso,
+    procesar_validacion_binaria, procesar_validacion_asincrona,
+    consultar_trabajo_validacion
 )
+from core.cola_validaciones import esperar_cambio, metricas_cola, ESTADOS_FINALES
+from core.indice_placas import indice_placas
+from core.paginacion import leer_paginacion
 from core.controller_calendario import (
     obtener_eventos_controller, crear_evento_controller,
     actualizar_evento_controller, eliminar_evento_controller,
@@ -79,10 +86,13 @@ STATIC_DIR = os.path.join(BASE_DIR, "frontend", "static")
 app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=STATIC_DIR)
 
 # HABILITAR CORS PARA TODO (Evita errores en Vercel)
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=["X-Siguiente-Cursor"])
 
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "SmartCar_SeguridadUltra_2025")
 
+# Calentamiento opcional del OCR (OCR_CALENTAR=1): en segundo plano, sin bloquear el arranque
+iniciar_calentamiento()
+
 # Middleware JWT
 def token_requerido(f):
     @wraps(f)
@@ -97,6 +107,20 @@ def token_requerido(f):
         return f(*args, **kwargs)
     return decorador
 
+# Historiales paginados (core/paginacion.py): solo con ?limite= o ?cursor= (sin ellos, la
+# lista completa de siempre). El cuerpo sigue siendo la lista de filas y el cursor de la
+# página siguiente va en la cabecera X-Siguiente-Cursor (ausente en la última).
+def respuesta_paginada(consulta, **kwargs):
+    try:
+        llave, limite = leer_paginacion(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filas, siguiente = consulta(llave=llave, limite=limite, **kwargs)
+    resp = jsonify(filas)
+    if siguiente:
+        resp.headers["X-Siguiente-Cursor"] = siguiente
+    return resp, 200
+
 # ===========================================================
 # RUTAS PÚBLICAS & LOGIN
 # ===========================================================
@@ -164,11 +188,11 @@ def api_admin_resumen(): return jsonify(obtener_datos_dashboard())
 
 @app.route("/api/admin/accesos", methods=["GET"])
 @token_requerido
-def api_admin_accesos(): return jsonify(obtener_accesos_detalle())
+def api_admin_accesos(): return respuesta_paginada(obtener_accesos_detalle)
 
 @app.route("/api/admin/auditoria", methods=["GET"])
 @token_requerido
-def api_admin_auditoria(): return jsonify(obtener_historial_auditoria()), 200
+def api_admin_auditoria(): return respuesta_paginada(obtener_historial_auditoria)
 
 # ===========================================================
 # GESTIÓN DE VIGILANTES / USUARIOS (CRUD)
@@ -306,7 +330,7 @@ def obtener_usuario():
 @token_requerido
 def get_historial_accesos():
     filtros = { k: request.args.get(k) for k in ['placa', 'tipo', 'desde', 'hasta'] }
-    return jsonify(obtener_historial_accesos(filtros)), 200
+    return respuesta_paginada(obtener_historial_accesos, filtros=filtros)
 
 @app.route("/api/accesos/validar", methods=["POST"])
 def validar_acceso_ocr():
@@ -314,6 +338,77 @@ def validar_acceso_ocr():
     res, st = procesar_validacion_acceso(request.data, 1)
     return jsonify(res), st
 
+@app.route("/api/accesos/validar/binario", methods=["POST"])
+def validar_acceso_ocr_binario():
+    """
+    Variante sin base64: acepta multipart/form-data (campo 'imagen') o el cuerpo
+    crudo con Content-Type image/jpeg|image/png|application/octet-stream.
+    tipo_acceso e id_punto llegan como campos del formulario o parámetros de la URL.
+    Varios archivos en el multipart activan el modo ráfaga (votación entre cuadros).
+    """
+    tipo_acceso = request.args.get('tipo_acceso')
+    id_punto = request.args.get('id_punto')
+    if request.files:
+        archivos = request.files.getlist('imagen') or list(request.files.values())
+        cuadros = [a.stream.read() for a in archivos]
+        imagen_bytes = cuadros if len(cuadros) > 1 else cuadros[0]
+        tipo_acceso = request.form.get('tipo_acceso', tipo_acceso)
+        id_punto = request.form.get('id_punto', id_punto)
+    elif request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        # Leemos directo del stream, sin que Flask cachee una segunda copia del cuerpo
+        imagen_bytes = request.stream.read()
+    else:
+        return jsonify({"error": "Use multipart/form-data o un cuerpo image/jpeg"}), 415
+
+    res, st = procesar_validacion_binaria(imagen_bytes, tipo_acceso, 1, id_punto)
+    return jsonify(res), st
+
+@app.route("/api/accesos/validar/async", methods=["POST"])
+def validar_acceso_ocr_async():
+    """Encola la validación y responde 202 con el id del trabajo (429 si la cola está llena)."""
+    res, st = procesar_validacion_asincrona(request.data, 1)
+    return jsonify(res), st
+
+@app.route("/api/accesos/trabajos/<id_trabajo>", methods=["GET"])
+def consultar_trabajo(id_trabajo):
+    res, st = consultar_trabajo_validacion(id_trabajo)
+    return jsonify(res), st
+
+@app.route("/api/accesos/trabajos/<id_trabajo>/stream", methods=["GET"])
+def stream_trabajo(id_trabajo):
+    """Server-Sent Events: un evento por cambio de estado hasta 'terminado' o 'error'."""
+    def eventos():
+        version = -1
+        while True:
+            trabajo = esperar_cambio(id_trabajo, version, timeout=15)
+            if trabajo is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Trabajo no encontrado o vencido'})}\n\n"
+                return
+            if trabajo["version"] == version:
+                yield ": ping\n\n"  # Mantiene viva la conexión a través de proxies
+                continue
+            version = trabajo["version"]
+            yield f"event: {trabajo['estado']}\ndata: {json.dumps(trabajo, ensure_ascii=False)}\n\n"
+            if trabajo["estado"] in ESTADOS_FINALES:
+                return
+    return Response(stream_with_context(eventos()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/ocr/metricas", methods=["GET"])
+def api_ocr_metricas():
+    return jsonify(dict(metricas_ocr(), cola_validaciones=metricas_cola(),
+                        indice_placas=indice_placas.metricas())), 200
+
+@app.route("/api/db/metricas", methods=["GET"])
+def api_db_metricas():
+    return jsonify({"pool": metricas_pool(), "auditoria": escritor_auditoria.metricas()}), 200
+
+@app.route("/api/ocr/listo", methods=["GET"])
+def api_ocr_listo():
+    """Sonda de disponibilidad para el balanceador: 503 hasta que el OCR esté caliente."""
+    estado = estado_ocr()
+    return jsonify(estado), 200 if estado["listo"] else 503
+
 @app.route("/api/admin/alertas", methods=["GET"])
 @token_requerido
 def get_alertas(): return jsonify(obtener_alertas_controller()), 200